@@ -12,12 +12,24 @@ Key Features:
 - User-specific conversation management
 - Message history persistence
 - Authentication integration for secure access
+- Optional semantic cache for repeated restaurant questions
+- Resumable reply streams (Last-Event-ID replay, across workers with shared state)
+- Admission control for concurrent reply streams
+- Full-text search over the user's message history
+- Top restaurant searches per location
+- Stored Yelp result snapshots served with bot messages
+- Fast JSON serialization for conversation payloads
+- Conditional GET (strong ETags, 304) for conversation history and the sidebar
+- Per-user SSE channel of conversation list deltas
+- Bulk conversation deletion (chunked background job for large histories)
+- Archived conversations read back transparently from their archive file
+- Database work offloaded to the bounded worker pool, off the event loop
 
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Query, BackgroundTasks
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload, joinedload
 from sqlalchemy import func, Integer, cast
 from typing import List, Optional
 from ..models.message import (
@@ -25,29 +37,79 @@ from ..models.message import (
     MessageCreate, 
     MessageUpdate,
     ConversationCreate,
-    ConversationWithMessages
+    ConversationWithMessages,
+    BulkDeleteRequest
+)
+from ..models.database_models import (
+    Message as MessageModel,
+    Conversation as ConversationModel,
+    User as UserModel,
+    RestaurantSearch as RestaurantSearchModel,
+    ConversationArchive
 )
-from ..models.database_models import Message as MessageModel, Conversation as ConversationModel, User as UserModel
 from ..core.database import get_db, SessionLocal
+from ..core.responses import FastJSONResponse, REVALIDATE, strong_etag, etag_matches, not_modified
 from ..services.chat_service import ChatService
+from ..services.response_cache import response_cache
+from ..services.stream_registry import stream_registry
+from ..services.admission import admission, AdmissionRejected
+from ..services.search import search_messages
+from ..services.yelp_snapshots import yelp_snapshots
+from ..services.conversation_events import conversation_events, conversation_delta
+from ..services.bulk_delete import bulk_deleter
+from ..services.retention import retention, message_payload
 from ..auth.oauth import get_current_user
+from ..core.offload import run_sync
 
 import json
+import time
+import anyio
 
 router = APIRouter()
 chat_service = ChatService()
 
-@router.get("/conversations/{conversation_id}")
-async def get_conversation(
-    conversation_id: int,
-    current_user: UserModel = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
+def conversation_etag(db: Session, conversation_id: int, user_id: str) -> Optional[str]:
+    """ETag of one conversation's history, or None if the user has no such conversation"""
+    row = db.query(
+        ConversationModel.updated_at,
+        ConversationModel.created_at,
+        func.max(MessageModel.id),
+        ConversationArchive.path,
+        ConversationArchive.offset
+    )\
+        .outerjoin(MessageModel, MessageModel.conversation_id == ConversationModel.id)\
+        .outerjoin(ConversationArchive, ConversationArchive.conversation_id == ConversationModel.id)\
+        .filter(ConversationModel.id == conversation_id, ConversationModel.user_id == user_id)\
+        .group_by(ConversationModel.id, ConversationArchive.path, ConversationArchive.offset)\
+        .first()
+    if row is None:
+        return None
+    # Snapshots turn stale with time alone; a new epoch forces one full reload (and refresh)
+    epoch = int(time.time() // yelp_snapshots.max_age_seconds) if yelp_snapshots.max_age_seconds > 0 else 0
+    return strong_etag("conversation", conversation_id, user_id, *row, epoch)
+
+def conversations_etag(db: Session, user_id: str) -> str:
+    """ETag of the sidebar: changes when any of the user's conversations or messages does"""
+    conversations = db.query(
+        func.count(ConversationModel.id),
+        func.max(ConversationModel.id),
+        func.max(ConversationModel.updated_at),
+        func.max(ConversationModel.created_at)
+    ).filter(ConversationModel.user_id == user_id).one()
+    latest_message = db.query(func.max(MessageModel.id))\
+        .join(ConversationModel, ConversationModel.id == MessageModel.conversation_id)\
+        .filter(ConversationModel.user_id == user_id)\
+        .scalar()
+    return strong_etag("conversations", user_id, *conversations, latest_message)
+
+def load_conversation_payload(db: Session, conversation_id: int, user_id: str):
+    """A conversation with its messages, plus the bot messages whose Yelp snapshots need a refresh"""
     conversation = (
         db.query(ConversationModel)
+        .options(selectinload(ConversationModel.messages).selectinload(MessageModel.snapshot))
         .filter(
             ConversationModel.id == conversation_id,
-            ConversationModel.user_id == current_user.id
+            ConversationModel.user_id == user_id
         )
         .first()
     )
@@ -56,17 +118,28 @@ async def get_conversation(
         raise HTTPException(status_code=404, detail="Conversation not found")
     
     # Simply convert messages to dict, treating restaurant_search just like any other field
-    messages = [{
-        "id": msg.id,
-        "content": msg.content,
-        "sender": msg.sender,
-        "timestamp": msg.timestamp,
-        "is_edited": msg.is_edited,
-        "conversation_id": msg.conversation_id,
-        "restaurant_search": msg.load_restaurant_search()  # Simple load
-    } for msg in conversation.messages]
-    
-    return {
+    messages = []
+    if conversation.archive is not None:
+        # Older messages were moved to the archive; newer ones (if any) follow them
+        messages = retention.load(conversation_id)
+    stale = []
+    for msg in conversation.messages:
+        restaurant_search = msg.load_restaurant_search()
+        messages.append({
+            "id": msg.id,
+            "content": msg.content,
+            "sender": msg.sender,
+            "timestamp": msg.timestamp,
+            "is_edited": msg.is_edited,
+            "conversation_id": msg.conversation_id,
+            "restaurant_search": restaurant_search,
+            # Stored businesses, so the client doesn't re-run the search
+            "restaurant_snapshot": yelp_snapshots.serialize(msg.snapshot)
+        })
+        if yelp_snapshots.needs_refresh(msg, restaurant_search):
+            stale.append((msg.id, restaurant_search))
+
+    payload = {
         "id": conversation.id,
         "title": conversation.title,
         "created_at": conversation.created_at,
@@ -76,44 +149,51 @@ async def get_conversation(
         "user_id": conversation.user_id,
         "messages": messages
     }
+    return payload, stale
 
-@router.get("/conversations")
-async def get_conversations(
+@router.get("/conversations/{conversation_id}", response_class=FastJSONResponse)
+async def get_conversation(
+    conversation_id: int,
+    background_tasks: BackgroundTasks,
+    request: Request,
     current_user: UserModel = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all conversations for the user"""
-    print("\n=== LOADING ALL CONVERSATIONS ===")
-    
+    user_id = current_user.id
+    etag = await run_sync(conversation_etag, db, conversation_id, user_id)
+    if etag is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    payload, stale = await run_sync(load_conversation_payload, db, conversation_id, user_id)
+    if stale:
+        # Served as-is now; the next load gets the refreshed snapshots
+        print(f"Refreshing {len(stale)} Yelp snapshots for conversation {conversation_id}")
+        background_tasks.add_task(yelp_snapshots.refresh_many, stale)
+
+    return FastJSONResponse(payload, headers={"ETag": etag, "Cache-Control": REVALIDATE})
+
+def list_conversations(db: Session, user_id: str) -> List[dict]:
+    """All of the user's conversations with their hot messages, newest first.
+
+    Archived messages are left out (reading every archive would make each page
+    load cost as much as the user's whole history); get_conversation merges
+    them in, and the client loads the conversation it shows through it.
+    """
+    # Messages (and their searches) for all conversations in one query each, not one per conversation
     conversations = (
         db.query(ConversationModel)
-        .filter(ConversationModel.user_id == current_user.id)
+        .options(selectinload(ConversationModel.messages).joinedload(MessageModel.snapshot))
+        .filter(ConversationModel.user_id == user_id)
         .order_by(ConversationModel.created_at.desc())
         .all()
     )
     
     result = []
     for conv in conversations:
-        messages = []
-        for msg in conv.messages:
-            # Print raw data for debugging
-            print(f"\nMessage {msg.id}:")
-            print(f"Content type: {msg.sender}")
-            print(f"Raw restaurant_search: {msg.restaurant_search}")
-            
-            message_dict = {
-                "id": msg.id,
-                "content": msg.content,
-                "sender": msg.sender,
-                "timestamp": msg.timestamp,
-                "is_edited": msg.is_edited,
-                "conversation_id": msg.conversation_id,
-                "restaurant_search": msg.load_restaurant_search()
-            }
-            
-            # Print processed data
-            print(f"Processed restaurant_search: {message_dict['restaurant_search']}")
-            messages.append(message_dict)
+        # Snapshots (joined into the messages query) included, so the conversation shown on page load doesn't re-run its searches
+        messages = [message_payload(msg) for msg in conv.messages]
             
         conv_dict = {
             "id": conv.id,
@@ -126,96 +206,168 @@ async def get_conversations(
             "messages": messages
         }
         result.append(conv_dict)
-    
     return result
 
+@router.get("/conversations", response_class=FastJSONResponse)
+async def get_conversations(
+    request: Request,
+    current_user: UserModel = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get all conversations for the user"""
+    print("\n=== LOADING ALL CONVERSATIONS ===")
 
-@router.post("/new-conversation")
-async def create_new_conversation(
+    user_id = current_user.id
+    etag = await run_sync(conversations_etag, db, user_id)
+    if etag_matches(request, etag):
+        print("Conversations unchanged, 304")
+        return not_modified(etag)
+    
+    result = await run_sync(list_conversations, db, user_id)
+    return FastJSONResponse(result, headers={"ETag": etag, "Cache-Control": REVALIDATE})
+
+@router.get("/events")
+async def conversation_event_stream(
+    request: Request,
+    current_user: UserModel = Depends(get_current_user)
+):
+    """Live conversation list changes for the user's sidebar (SSE).
+
+    Events: created, updated, activated (all others become inactive) and
+    deleted. Fetch the list after the first `ready` event to miss nothing.
+    """
+    events = conversation_events.stream(current_user.id, is_disconnected=request.is_disconnected)
+    return StreamingResponse(events, media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.get("/search")
+async def search_conversations(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
     current_user: UserModel = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Create a new conversation"""
-    try:
-        print("\n=== BEFORE NEW CONVERSATION ===")
-        existing_convs = db.query(ConversationModel).filter(ConversationModel.user_id == current_user.id).all()
-        for conv in existing_convs:
-            print(f"Existing conversation {conv.id}: is_new={conv.is_new}, is_active={conv.is_active}")
+    """Search the user's messages and restaurant searches, best matches first"""
+    result = await run_sync(search_messages, db, current_user.id, q, limit=limit, offset=offset)
+    print(f"Search '{q}': {result['total']} matches in {result['took_ms']} ms")
+    return result
 
-        # First check for any existing new conversations
-        existing_new = db.query(ConversationModel)\
-            .filter(
-                ConversationModel.user_id == current_user.id,
-                ConversationModel.is_new == True
-            )\
-            .first()
+@router.get("/restaurant-searches/top")
+async def top_restaurant_searches(
+    location: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=100),
+    current_user: UserModel = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Most frequent search terms per location in the user's conversations"""
+    count = func.count(RestaurantSearchModel.id).label("count")
+    query = db.query(RestaurantSearchModel.location, RestaurantSearchModel.term, count)\
+        .join(MessageModel, MessageModel.id == RestaurantSearchModel.message_id)\
+        .join(ConversationModel, ConversationModel.id == MessageModel.conversation_id)\
+        .filter(ConversationModel.user_id == current_user.id)
+    if location:
+        query = query.filter(RestaurantSearchModel.location == location)
+
+    rows = await run_sync(
+        query.group_by(RestaurantSearchModel.location, RestaurantSearchModel.term)
+        .order_by(count.desc(), RestaurantSearchModel.location, RestaurantSearchModel.term)
+        .limit(limit)
+        .all
+    )
+    return [{"location": row.location, "term": row.term, "count": row.count} for row in rows]
 
-        if existing_new:
-            print(f"Found existing new conversation: {existing_new.id}. Redirecting there.")
-            # Deactivate all other conversations
-            db.query(ConversationModel)\
-                .filter(
-                    ConversationModel.user_id == current_user.id,
-                    ConversationModel.is_active == True
-                )\
-                .update({ConversationModel.is_active: False}, synchronize_session='fetch')
-            
-            # Activate the existing new conversation
-            existing_new.is_active = True
-            db.commit()
-
-            return {
-                "id": existing_new.id,
-                "title": existing_new.title,
-                "created_at": existing_new.created_at.isoformat(),
-                "is_active": True,
-                "is_new": True,
-                "messages": []
-            }
-
-        print("No existing new conversation found. Creating new one.")
-
-        # Deactivate all existing conversations
+def open_new_conversation(db: Session, user_id: str):
+    """Activate the user's unused new conversation, or create one; returns (response, event, event data)"""
+    # First check for any existing new conversations
+    existing_new = db.query(ConversationModel)\
+        .filter(
+            ConversationModel.user_id == user_id,
+            ConversationModel.is_new == True
+        )\
+        .first()
+
+    if existing_new:
+        print(f"Found existing new conversation: {existing_new.id}. Redirecting there.")
+        response = {
+            "id": existing_new.id,
+            "title": existing_new.title,
+            "created_at": existing_new.created_at.isoformat(),
+            "is_active": True,
+            "is_new": True,
+            "messages": []
+        }
+        # Deactivate all other conversations
         db.query(ConversationModel)\
             .filter(
-                ConversationModel.user_id == current_user.id,
-                ConversationModel.is_active == True
+                ConversationModel.user_id == user_id,
+                ConversationModel.is_active == True,
+                ConversationModel.id != existing_new.id
             )\
-            .update({ConversationModel.is_active: False}, synchronize_session='fetch')
-
-        # Create new conversation
-        new_conversation = ConversationModel(
-            title="New Conversation",
-            is_active=True,
-            is_new=True,
-            user_id=current_user.id
-        )
-        db.add(new_conversation)
+            .update({ConversationModel.is_active: False}, synchronize_session=False)
+        
+        # Activate the existing new conversation
+        existing_new.is_active = True
         db.commit()
-        db.refresh(new_conversation)
+        return response, "activated", {"id": response["id"]}
 
-        print("\n=== AFTER NEW CONVERSATION ===")
-        all_convs = db.query(ConversationModel).filter(ConversationModel.user_id == current_user.id).all()
-        for conv in all_convs:
-            print(f"Conversation {conv.id}: is_new={conv.is_new}, is_active={conv.is_active}")
+    print("No existing new conversation found. Creating new one.")
 
-        return {
-            "id": new_conversation.id,
-            "title": new_conversation.title,
-            "is_new": new_conversation.is_new,
-            "is_active": new_conversation.is_active,
-            "created_at": new_conversation.created_at.isoformat(),
-            "messages": []
-        }
+    # Deactivate all existing conversations
+    db.query(ConversationModel)\
+        .filter(
+            ConversationModel.user_id == user_id,
+            ConversationModel.is_active == True
+        )\
+        .update({ConversationModel.is_active: False}, synchronize_session=False)
+
+    # Create new conversation
+    new_conversation = ConversationModel(
+        title="New Conversation",
+        is_active=True,
+        is_new=True,
+        user_id=user_id
+    )
+    db.add(new_conversation)
+    # The INSERT returns the generated id and created_at, so nothing is re-read after the commit
+    db.flush()
+    delta = conversation_delta(new_conversation)
+    db.commit()
+    print(f"Created conversation {delta['id']}")
+
+    response = {
+        "id": delta["id"],
+        "title": delta["title"],
+        "is_new": delta["is_new"],
+        "is_active": delta["is_active"],
+        "created_at": delta["created_at"].isoformat(),
+        "messages": []
+    }
+    return response, "created", delta
 
+@router.post("/new-conversation")
+async def create_new_conversation(
+    current_user: UserModel = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Create a new conversation"""
+    # Read once: the commit would expire current_user and cost another SELECT
+    user_id = current_user.id
+    try:
+        print("\n=== NEW CONVERSATION ===")
+        response, event, data = await run_sync(open_new_conversation, db, user_id)
     except Exception as e:
-        db.rollback()
+        await run_sync(db.rollback)
         print(f"Error creating conversation: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Failed to create conversation: {str(e)}"
         )
 
+    await conversation_events.publish(user_id, event, data)
+    if event == "created":
+        chat_service.prepare_conversation(response["id"])
+    return response
+
 
 @router.post("/conversations/{conversation_id}/activate")
 async def activate_conversation(
@@ -224,12 +376,14 @@ async def activate_conversation(
     db: Session = Depends(get_db)
 ):
     """Set a conversation as active and deactivate others"""
-    try:
+    user_id = current_user.id
+
+    def activate():
         # Verify conversation belongs to user
         conversation = db.query(ConversationModel)\
                         .filter(
                             ConversationModel.id == conversation_id,
-                            ConversationModel.user_id == current_user.id
+                            ConversationModel.user_id == user_id
                         )\
                         .first()
         if not conversation:
@@ -238,7 +392,7 @@ async def activate_conversation(
         # Deactivate all user's conversations
         db.query(ConversationModel)\
           .filter(
-              ConversationModel.user_id == current_user.id,
+              ConversationModel.user_id == user_id,
               ConversationModel.is_active == True
           )\
           .update({ConversationModel.is_active: False})
@@ -246,17 +400,18 @@ async def activate_conversation(
         # Activate the selected conversation
         conversation.is_active = True
         db.commit()
+        return {"id": conversation.id, "is_new": conversation.is_new, "is_active": True}
+
+    try:
+        activated = await run_sync(activate)
+        await conversation_events.publish(user_id, "activated", {"id": activated["id"]})
         
         return {
             "status": "success",
-            "conversation": {
-                "id": conversation.id,
-                "is_new": conversation.is_new,
-                "is_active": True
-            }
+            "conversation": activated
         }
     except Exception as e:
-        db.rollback()
+        await run_sync(db.rollback)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/conversations/{conversation_id}")
@@ -266,134 +421,251 @@ async def delete_conversation(
     db: Session = Depends(get_db)
 ):
     """Delete a conversation and all its messages"""
+    user_id = current_user.id
+
+    def delete():
+        conversation = (
+            db.query(ConversationModel)
+            .filter(
+                ConversationModel.id == conversation_id,
+                ConversationModel.user_id == user_id
+            )
+            .first()
+        )
+        if not conversation:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        
+        db.delete(conversation)
+        db.commit()
+
+    await run_sync(delete)
+    await conversation_events.publish(user_id, "deleted", {"id": conversation_id})
+    return {"status": "success"}
+
+@router.post("/conversations/bulk-delete")
+async def bulk_delete_conversations(
+    body: BulkDeleteRequest,
+    current_user: UserModel = Depends(get_current_user)
+):
+    """Delete several (or all) conversations; large histories are deleted by a background job"""
+    if not body.all and not body.conversation_ids:
+        raise HTTPException(status_code=400, detail="Pass conversation_ids or all=true")
+
+    conversation_ids = await run_sync(
+        bulk_deleter.resolve, current_user.id, None if body.all else body.conversation_ids
+    )
+    total_messages = await run_sync(bulk_deleter.count_messages, conversation_ids)
+    if total_messages <= bulk_deleter.inline_limit:
+        deleted = await bulk_deleter.delete_now(current_user.id, conversation_ids)
+        return {"status": "deleted", "conversations": deleted, "messages": total_messages}
+
+    job = bulk_deleter.start(current_user.id, conversation_ids, total_messages)
+    return FastJSONResponse(job.to_dict(), status_code=202)
+
+@router.get("/conversations/bulk-delete/{job_id}")
+async def get_bulk_delete_job(
+    job_id: str,
+    current_user: UserModel = Depends(get_current_user)
+):
+    """Progress of a background bulk delete"""
+    job = bulk_deleter.get(current_user.id, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+def owns_conversation(db: Session, conversation_id: int, user_id: str) -> bool:
+    """Whether the conversation exists and belongs to the user (one indexed lookup)"""
+    return db.query(ConversationModel.id).filter(
+        ConversationModel.id == conversation_id,
+        ConversationModel.user_id == user_id
+    ).first() is not None
+
+def start_reply(db: Session, conversation_id: int, user_id: str, content: str):
+    """Store the user's message and an empty bot reply, naming the conversation on its first message.
+
+    Returns (conversation_id, thread_id, user message id, bot message id,
+    conversation_update for the client or None, sidebar delta).
+    """
+    conversation_update = None
+
+    # Get conversation first
     conversation = (
         db.query(ConversationModel)
         .filter(
             ConversationModel.id == conversation_id,
-            ConversationModel.user_id == current_user.id
+            ConversationModel.user_id == user_id
         )
         .first()
     )
+            
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    db.delete(conversation)
+    thread_id = conversation.thread_id
+    
+    print(f"Processing message for conversation {conversation_id}")
+    
+    # Create user message
+    db_message = MessageModel(
+        content=content,
+        sender="user",
+        conversation_id=conversation_id
+    )
+    db.add(db_message)
+    
+    # Create bot message placeholder
+    bot_message = MessageModel(
+        content="",
+        sender="bot",
+        conversation_id=conversation_id,
+        restaurant_search=None
+    )
+    db.add(bot_message)  # Fixed: was adding db_message twice
+    
+    # If this is a new conversation, update its title immediately
+    if conversation.is_new:
+        # Find the highest conversation number
+        existing_numbers = []
+        all_conversations = db.query(ConversationModel)\
+            .filter(
+                ConversationModel.user_id == user_id,
+                ConversationModel.is_new == False
+            )\
+            .all()
+        
+        for conv in all_conversations:
+            if conv.title.startswith("Conversation "):
+                try:
+                    num = int(conv.title.split(" ")[1])
+                    existing_numbers.append(num)
+                except (ValueError, IndexError):
+                    continue
+        
+        # Use the next available number
+        next_number = 1
+        if existing_numbers:
+            next_number = max(existing_numbers) + 1
+        
+        # Update conversation
+        new_title = f"Conversation {next_number}"
+        conversation.title = new_title
+        conversation.is_new = False
+        conversation_update = {
+            'id': conversation_id,
+            'title': new_title,
+            'is_new': False
+        }
+    
+    # Commit all changes before proceeding
+    ConversationModel.touch(db, conversation_id)
     db.commit()
-    return {"status": "success"}
+    db.refresh(db_message)
+    db.refresh(bot_message)
+    db.refresh(conversation)
+
+    # Renamed on the first message; otherwise just newer
+    fields = ("title", "is_new", "updated_at") if conversation_update else ("updated_at",)
+    delta = conversation_delta(conversation, *fields)
+    return conversation_id, thread_id, db_message.id, bot_message.id, conversation_update, delta
+
+def save_bot_reply(bot_msg_id: int, conversation_id: int, content: Optional[str] = None, restaurant_search: Optional[dict] = None) -> Optional[str]:
+    """Write (part of) a bot reply in its own session; returns the stored content"""
+    with SessionLocal() as db:
+        bot_msg = db.query(MessageModel).get(bot_msg_id)
+        if not bot_msg:
+            return None
+        if content is not None:
+            bot_msg.content = content
+        if restaurant_search is not None:
+            bot_msg.save_restaurant_search(restaurant_search)
+        ConversationModel.touch(db, conversation_id)
+        db.commit()
+        return bot_msg.content
+
+def save_cached_reply(bot_msg_id: int, conversation_id: int, content: str, restaurant_search: Optional[dict]) -> bool:
+    """Store a reply from the response cache; False if the conversation has an Assistants thread by now,
+    since the thread would never see the turn"""
+    with SessionLocal() as db:
+        thread_id = db.query(ConversationModel.thread_id).filter(ConversationModel.id == conversation_id).scalar()
+    if thread_id:
+        return False
+    save_bot_reply(bot_msg_id, conversation_id, content=content, restaurant_search=restaurant_search)
+    return True
 
 @router.post("/stream")
 async def create_streaming_message(
     message: MessageCreate,
+    request: Request,
     current_user: UserModel = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Stream message responses"""
+    # Unknown or foreign conversations get a 404 without taking an admission slot
+    if not await run_sync(owns_conversation, db, message.conversation_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    # Held for the whole reply, including time spent after a client disconnect
     try:
-        print(f"\n=== STREAM START ===")
-        conversation_update = None
-        
-        # Get conversation first
-        conversation = (
-            db.query(ConversationModel)
-            .filter(
-                ConversationModel.id == message.conversation_id,
-                ConversationModel.user_id == current_user.id
-            )
-            .first()
-        )
-                
-        if not conversation:
-            raise HTTPException(status_code=404, detail="Conversation not found")
-        
-        # Store necessary values
-        conversation_id = conversation.id
-        thread_id = conversation.thread_id
-        
-        print(f"Processing message for conversation {conversation_id}")
-        
-        # Create user message
-        db_message = MessageModel(
-            content=message.content,
-            sender="user",
-            conversation_id=conversation_id
+        permit = await admission.acquire(current_user.id, message.conversation_id)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many concurrent replies: {e.reason}",
+            headers={"Retry-After": str(e.retry_after)}
         )
-        db.add(db_message)
-        
-        # Create bot message placeholder
-        bot_message = MessageModel(
-            content="",
-            sender="bot",
-            conversation_id=conversation_id,
-            restaurant_search=None
+
+    try:
+        print(f"\n=== STREAM START ===")
+        user_id = current_user.id
+        conversation_id, thread_id, user_msg_id, bot_msg_id, conversation_update, delta = await run_sync(
+            start_reply, db, message.conversation_id, user_id, message.content
         )
-        db.add(bot_message)  # Fixed: was adding db_message twice
-        
-        # If this is a new conversation, update its title immediately
-        if conversation.is_new:
-            # Find the highest conversation number
-            existing_numbers = []
-            all_conversations = db.query(ConversationModel)\
-                .filter(
-                    ConversationModel.user_id == current_user.id,
-                    ConversationModel.is_new == False
-                )\
-                .all()
-            
-            for conv in all_conversations:
-                if conv.title.startswith("Conversation "):
-                    try:
-                        num = int(conv.title.split(" ")[1])
-                        existing_numbers.append(num)
-                    except (ValueError, IndexError):
-                        continue
-            
-            # Use the next available number
-            next_number = 1
-            if existing_numbers:
-                next_number = max(existing_numbers) + 1
-            
-            # Update conversation
-            new_title = f"Conversation {next_number}"
-            conversation.title = new_title
-            conversation.is_new = False
-            conversation_update = {
-                'id': conversation_id,
-                'title': new_title,
-                'is_new': False
-            }
-        
-        # Commit all changes before proceeding
-        db.commit()
-        db.refresh(db_message)
-        db.refresh(bot_message)
-        db.refresh(conversation)
-        
-        user_msg_id = db_message.id
-        bot_msg_id = bot_message.id
+        await conversation_events.publish(user_id, "updated", delta)
         
         print(f"Created messages - User: {user_msg_id}, Bot: {bot_msg_id}")
 
-        async def generate():
-            nonlocal conversation_update
+        reply_stream = stream_registry.create(bot_msg_id, user_id)
+
+        async def produce():
+            response = None
+            reply_saved = False
+            restaurant_search_data = None
+            accumulated_content = []
             try:
                 # Send initial IDs
-                yield f"data: {json.dumps({'user_message_id': user_msg_id})}\n\n"
-                yield f"data: {json.dumps({'bot_message_id': bot_msg_id})}\n\n"
+                reply_stream.publish({'user_message_id': user_msg_id})
+                reply_stream.publish({'bot_message_id': bot_msg_id})
                 
                 # Send conversation update immediately if needed
                 if conversation_update:
-                    yield f"data: {json.dumps({'conversation_update': conversation_update})}\n\n"
-                
-                restaurant_search_data = None
-                accumulated_content = []
-                
-                # Get the streaming response object
-                response = await chat_service.get_streaming_response(
-                    conversation_id=conversation_id,
-                    thread_id=thread_id,
-                    message=message.content,
-                    db=db
-                )
+                    reply_stream.publish({'conversation_update': conversation_update})
+
+                # Only without a thread: an Assistants thread would be missing this turn on the next run.
+                # Earlier turns are replayed into the conversation's first thread instead.
+                cached_reply = None if thread_id else response_cache.lookup(message.content, scope=user_id)
+                if cached_reply and await run_sync(
+                    save_cached_reply, bot_msg_id, conversation_id,
+                    cached_reply.content, cached_reply.restaurant_search
+                ):
+                    print(f"Serving cached reply for: {message.content}")
+                    reply_saved = True
+                    if cached_reply.restaurant_search:
+                        reply_stream.publish({'restaurant_search': cached_reply.restaurant_search})
+                    reply_stream.publish({'content': cached_reply.content})
+                    if cached_reply.restaurant_search:
+                        yelp_snapshots.schedule(bot_msg_id, cached_reply.restaurant_search)
+
+                    reply_stream.publish("[DONE]")
+                    return
+
+                with SessionLocal() as reply_db:
+                    # Get the streaming response object
+                    response = await chat_service.get_streaming_response(
+                        conversation_id=conversation_id,
+                        thread_id=thread_id,
+                        message=message.content,
+                        db=reply_db
+                    )
                 
                 # Process the response stream
                 async for chunk in response.body_iterator:
@@ -410,54 +682,131 @@ async def create_streaming_message(
                                 print(f"\n=== SAVING RESTAURANT SEARCH ===")
                                 print(f"Data: {restaurant_search_data}")
                                 
-                                with SessionLocal() as update_db:
-                                    bot_msg = update_db.query(MessageModel).get(bot_msg_id)
-                                    if bot_msg:
-                                        bot_msg.save_restaurant_search(restaurant_search_data)
-                                        update_db.commit()
+                                await run_sync(save_bot_reply, bot_msg_id, conversation_id, restaurant_search=restaurant_search_data)
                                 
-                                yield chunk
+                                reply_stream.publish({'restaurant_search': restaurant_search_data})
 
                             # Handle content
                             if 'content' in data:
                                 accumulated_content.append(data['content'])
-                                yield chunk
+                                reply_stream.publish({'content': data['content']})
 
                         except json.JSONDecodeError as e:
                             print(f"Error decoding chunk: {e}")
-                            
-                    else:
-                        yield chunk
 
                     if chunk.startswith('data: [DONE]'):
-                        with SessionLocal() as final_db:
-                            bot_msg = final_db.query(MessageModel).get(bot_msg_id)
-                            if bot_msg:
-                                if accumulated_content:
-                                    bot_msg.content = ''.join(accumulated_content).strip()
-                                if restaurant_search_data:
-                                    bot_msg.save_restaurant_search(restaurant_search_data)
-                                final_db.commit()
-                                
-                                # Final verification
-                                final_db.refresh(bot_msg)
-                                print(f"\n=== FINAL MESSAGE STATE ===")
-                                print(f"Content length: {len(bot_msg.content)}")
-                                print(f"Restaurant search data: {bot_msg.restaurant_search}")
+                        saved_content = await run_sync(
+                            save_bot_reply, bot_msg_id, conversation_id,
+                            content=''.join(accumulated_content).strip() if accumulated_content else None,
+                            restaurant_search=restaurant_search_data
+                        )
+                        if saved_content is not None:
+                            # Scoped to this user: the reply may draw on anything they told the assistant
+                            if restaurant_search_data:
+                                response_cache.store(message.content, saved_content, restaurant_search_data, scope=user_id)
+                            print(f"\n=== FINAL MESSAGE STATE ===")
+                            print(f"Content length: {len(saved_content)}")
+                            print(f"Restaurant search data: {restaurant_search_data}")
+                        reply_saved = True
+                        if restaurant_search_data:
+                            yelp_snapshots.schedule(bot_msg_id, restaurant_search_data)
                 
-                yield "data: [DONE]\n\n"
+                reply_stream.publish("[DONE]")
 
             except Exception as e:
                 print(f"Stream error: {e}")
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
-                yield "data: [DONE]\n\n"
-
-        return StreamingResponse(generate(), media_type="text/event-stream")
+                reply_stream.publish({'error': str(e)})
+                reply_stream.publish("[DONE]")
+
+            finally:
+                try:
+                    if not reply_saved:
+                        # Nobody reattached (or the stream failed): stop upstream work now
+                        # and keep whatever part of the reply already arrived
+                        with anyio.CancelScope(shield=True):
+                            if response is not None:
+                                await response.body_iterator.aclose()
+                            await run_sync(
+                                save_bot_reply, bot_msg_id, conversation_id,
+                                content=''.join(accumulated_content).strip(), restaurant_search=restaurant_search_data
+                            )
+                        print(f"Saved partial reply for message {bot_msg_id} ({len(accumulated_content)} chunks)")
+                finally:
+                    # Free the slot only once upstream work has stopped
+                    permit.release()
+
+        # Generation runs on its own; this response (and any resume) just follows it
+        stream_registry.start(reply_stream, produce())
+        events = stream_registry.attach(reply_stream, is_disconnected=request.is_disconnected)
+        return StreamingResponse(events, media_type="text/event-stream")
 
     except Exception as e:
+        permit.release()
         print(f"Endpoint error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/stream/{message_id}/resume")
+async def resume_streaming_message(
+    message_id: int,
+    request: Request,
+    last_event_id: Optional[int] = None,
+    current_user: UserModel = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Resume a bot reply stream after a dropped connection.
+
+    Replays events after the Last-Event-ID header (or last_event_id query
+    parameter) and then follows the live reply. No new assistant run is started.
+    """
+    header = request.headers.get("last-event-id")
+    try:
+        cursor = int(header) if header else (last_event_id or 0)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+    reply_stream = stream_registry.get(message_id)
+    if reply_stream and reply_stream.user_id == current_user.id:
+        print(f"Resuming reply {message_id} after event {cursor}")
+        events = stream_registry.attach(reply_stream, cursor, is_disconnected=request.is_disconnected)
+        return StreamingResponse(events, media_type="text/event-stream")
+
+    # Started on another worker: follow it through shared state
+    remote = await stream_registry.find_remote(message_id)
+    if remote and remote.get("user_id") == current_user.id and not remote.get("done"):
+        print(f"Resuming remote reply {message_id} after event {cursor}")
+        events = stream_registry.attach_remote(message_id, cursor, is_disconnected=request.is_disconnected)
+        return StreamingResponse(events, media_type="text/event-stream")
+
+    user_id = current_user.id
+
+    def stored_snapshot():
+        # The reply is no longer in flight, so the stored message is the final state
+        bot_message = db.query(MessageModel)\
+            .join(ConversationModel)\
+            .filter(
+                MessageModel.id == message_id,
+                MessageModel.sender == "bot",
+                ConversationModel.user_id == user_id
+            )\
+            .first()
+        if bot_message is None:
+            raise HTTPException(status_code=404, detail="Message not found")
+
+        return {
+            "message_id": bot_message.id,
+            "content": bot_message.content,
+            "restaurant_search": bot_message.load_restaurant_search(),
+            "done": True
+        }
+
+    snapshot = await run_sync(stored_snapshot)
+
+    async def stored_reply():
+        yield f"data: {json.dumps({'resume_snapshot': snapshot})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stored_reply(), media_type="text/event-stream")
+
 @router.put("/{message_id}", response_model=MessageSchema)
 async def update_message(
     message_id: int,
@@ -466,23 +815,31 @@ async def update_message(
     db: Session = Depends(get_db)
 ):
     """Update a message"""
-    db_message = db.query(MessageModel)\
-        .join(ConversationModel)\
-        .filter(
-            MessageModel.id == message_id,
-            ConversationModel.user_id == current_user.id
-        )\
-        .first()
+    user_id = current_user.id
 
-    if db_message is None:
-        raise HTTPException(status_code=404, detail="Message not found")
-    if db_message.sender != "user":
-        raise HTTPException(status_code=400, detail="Can only edit user messages")
-    
-    db_message.content = message.content
-    db_message.is_edited = True
-    db.commit()
-    db.refresh(db_message)
+    def update():
+        db_message = db.query(MessageModel)\
+            .join(ConversationModel)\
+            .filter(
+                MessageModel.id == message_id,
+                ConversationModel.user_id == user_id
+            )\
+            .first()
+
+        if db_message is None:
+            raise HTTPException(status_code=404, detail="Message not found")
+        if db_message.sender != "user":
+            raise HTTPException(status_code=400, detail="Can only edit user messages")
+        
+        db_message.content = message.content
+        db_message.is_edited = True
+        ConversationModel.touch(db, db_message.conversation_id)
+        db.commit()
+        db.refresh(db_message)
+        return db_message, conversation_delta(db_message.conversation, "updated_at")
+
+    db_message, delta = await run_sync(update)
+    await conversation_events.publish(user_id, "updated", delta)
     return db_message
 
 @router.delete("/{message_id}")
@@ -492,19 +849,28 @@ async def delete_message(
     db: Session = Depends(get_db)
 ):
     """Delete a message"""
-    db_message = db.query(MessageModel)\
-        .join(ConversationModel)\
-        .filter(
-            MessageModel.id == message_id,
-            ConversationModel.user_id == current_user.id
-        )\
-        .first()
+    user_id = current_user.id
 
-    if db_message is None:
-        raise HTTPException(status_code=404, detail="Message not found")
-    if db_message.sender != "user":
-        raise HTTPException(status_code=400, detail="Can only delete user messages")
-    
-    db.delete(db_message)
-    db.commit()
-    return {"status": "success"}
\ No newline at end of file
+    def delete():
+        db_message = db.query(MessageModel)\
+            .join(ConversationModel)\
+            .filter(
+                MessageModel.id == message_id,
+                ConversationModel.user_id == user_id
+            )\
+            .first()
+
+        if db_message is None:
+            raise HTTPException(status_code=404, detail="Message not found")
+        if db_message.sender != "user":
+            raise HTTPException(status_code=400, detail="Can only delete user messages")
+        
+        conversation = db_message.conversation
+        ConversationModel.touch(db, conversation.id)
+        db.delete(db_message)
+        db.commit()
+        return conversation_delta(conversation, "updated_at")
+
+    delta = await run_sync(delete)
+    await conversation_events.publish(user_id, "updated", delta)
+    return {"status": "success"}
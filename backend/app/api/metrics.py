@@ -0,0 +1,57 @@
+"""
+metrics.py
+
+FastAPI router exposing in-process metrics.
+
+Key Features:
+- JSON snapshot of counters, gauges and collector stats
+- Admin-only sampling profiler (collapsed stacks, loop lag, blocking calls)
+
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from ..core.metrics import metrics
+from ..core.profiler import profiler, PROFILER_INTERVAL_MS, BLOCKING_THRESHOLD_MS
+from ..auth.oauth import get_admin_user
+from ..models.database_models import User as UserModel
+
+router = APIRouter()
+
+@router.get("")
+async def get_metrics():
+    """Current metrics for this worker process"""
+    return metrics.snapshot()
+
+@router.get("/profile")
+async def profile_worker(
+    seconds: float = Query(10, gt=0),
+    interval_ms: float = Query(PROFILER_INTERVAL_MS, ge=1, le=1000),
+    blocking_ms: float = Query(BLOCKING_THRESHOLD_MS, ge=1),
+    include_idle: bool = False,
+    format: str = Query("collapsed", pattern="^(collapsed|json)$"),
+    admin: UserModel = Depends(get_admin_user)
+):
+    """Sample this worker's stacks for a while.
+
+    `collapsed` returns a flamegraph-ready file (loop lag and blocking
+    counts in X-Loop-Lag-* / X-Blocking-Calls headers); `json` returns the
+    full report including each blocking call's stack.
+    """
+    if profiler.busy:
+        raise HTTPException(status_code=409, detail="A profile is already running on this worker")
+    print(f"Profile requested by {admin.email}")
+    session = await profiler.profile(
+        seconds, interval_ms=interval_ms, blocking_threshold_ms=blocking_ms, include_idle=include_idle
+    )
+    if format == "json":
+        return session.report()
+
+    lag = session.loop_lag()
+    return PlainTextResponse(session.collapsed(), headers={
+        "X-Profile-Samples": str(session.samples),
+        "X-Loop-Lag-P99-Ms": str(lag["p99_ms"]),
+        "X-Loop-Lag-Max-Ms": str(lag["max_ms"]),
+        "X-Blocking-Calls": str(len(session.blocking)),
+    })
@@ -3,140 +3,39 @@ yelp.py
 
 FastAPI router managing all Yelp API integrations.
 Handles restaurant searches, business details, and data formatting.
+Upstream calls go through services/yelp_client.py.
 
 Key Features:
 - Restaurant search with multiple parameters
 - Business details retrieval
 - Image proxy handling for CORS
-- Search result filtering and sorting
 - Error handling for API failures
-- Request retrying for reliability
-- Data caching for performance
+- Fast JSON serialization of proxied responses
+- ETags on proxied responses (304 when the client already has them)
+- Batch lookups: details and reviews for many cards in one round trip (JSON or NDJSON)
 
 """
 
-from fastapi import APIRouter, HTTPException, Response
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from typing import Optional, List
+import asyncio
 import httpx
 import os
 from urllib.parse import unquote
+from ..core.responses import FastJSONResponse, conditional_json, dumps
+from ..models.yelp import BusinessBatchRequest
+from ..services.yelp_client import build_search_params, fetch_businesses_with_retry, make_yelp_request
 
 router = APIRouter()
 
-YELP_API_KEY=os.getenv("YELP_API_KEY")
+# Batch lookups: IDs per request, and upstream calls in flight per request
+YELP_BATCH_MAX_IDS = int(os.getenv("YELP_BATCH_MAX_IDS", "20"))
+YELP_BATCH_CONCURRENCY = int(os.getenv("YELP_BATCH_CONCURRENCY", "6"))
 
-YELP_API_BASE_URL = "https://api.yelp.com/v3"
-
-def convert_price_to_yelp_format(price: str) -> str:
-    """Convert dollar signs to Yelp's number format"""
-    if not price:
-        return None
-    
-    # Map dollar signs to numbers
-    price_map = {
-        "$": "1",
-        "$$": "2",
-        "$$$": "3",
-        "$$$$": "4"
-    }
-    return price_map.get(price)
-
-async def make_yelp_request(path: str, params: dict = None):
-    """Make a request to Yelp API"""
-    headers = {
-        "Authorization": f"Bearer {YELP_API_KEY}",
-        "Accept": "application/json",
-    }
-    
-    url = f"{YELP_API_BASE_URL}{path}"
-    print(f"\n=== YELP API REQUEST ===")
-    print(f"URL: {url}")
-    print(f"Params: {params}")
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                url,
-                headers=headers,
-                params=params,
-                timeout=30.0
-            )
-            
-            print(f"Response Status: {response.status_code}")
-            if response.status_code != 200:
-                print(f"Error Response: {response.text}")
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Yelp API error: {response.text}"
-                )
-            
-            return response.json()
-            
-        except httpx.TimeoutException:
-            print("Request timed out")
-            raise HTTPException(
-                status_code=504,
-                detail="Request to Yelp API timed out"
-            )
-        except httpx.RequestError as e:
-            print(f"Request error: {str(e)}")
-            raise HTTPException(
-                status_code=502,
-                detail=f"Error making request to Yelp API: {str(e)}"
-            )
-        except Exception as e:
-            print(f"Unexpected error: {str(e)}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Unexpected error: {str(e)}"
-            )
-
-async def fetch_businesses_with_retry(params: dict, desired_count: int) -> dict:
-    """Fetch businesses with retries and pagination until we get enough valid results"""
-    all_businesses = []
-    offset = 0
-    max_attempts = 3  # Limit the number of pagination attempts
-    
-    while len(all_businesses) < desired_count and max_attempts > 0:
-        try:
-            # Update offset in params
-            current_params = {**params, 'offset': offset}
-            print(f"Fetching businesses with params: {current_params}")
-            
-            response = await make_yelp_request("/businesses/search", current_params)
-            
-            if not response or 'businesses' not in response:
-                break
-                
-            # Filter valid businesses
-            valid_businesses = [
-                b for b in response['businesses']
-                if b.get('review_count', 0) > 0  # Has reviews
-                and b.get('rating') is not None  # Has rating
-                and b.get('name')  # Has name
-                and b not in all_businesses  # No duplicates
-            ]
-            
-            all_businesses.extend(valid_businesses)
-            
-            # If we didn't get any valid businesses or there are no more results
-            if not valid_businesses or not response['businesses']:
-                break
-                
-            offset += len(response['businesses'])
-            max_attempts -= 1
-            
-        except Exception as e:
-            print(f"Error in fetch attempt: {str(e)}")
-            break
-    
-    return {
-        'businesses': all_businesses[:desired_count],
-        'total': len(all_businesses)
-    }
-
-@router.get("/businesses/search")
+@router.get("/businesses/search", response_class=FastJSONResponse)
 async def search_businesses(
+    request: Request,
     term: Optional[str] = None,
     location: Optional[str] = None,
     price: Optional[str] = None,
@@ -161,23 +60,7 @@ async def search_businesses(
             )
             
         desired_count = k or limit
-        
-        # Build base parameters
-        params = {
-            "term": term,
-            "location": location,
-            "sort_by": sort_by,
-            "limit": min(desired_count * 3, 50),  # Triple the requested amount, max 50
-        }
-
-        # Add price if specified
-        if price:
-            yelp_price = convert_price_to_yelp_format(price)
-            if yelp_price:
-                params["price"] = yelp_price
-
-        # Remove None values
-        params = {k: v for k, v in params.items() if v is not None}
+        params = build_search_params(term, location, price, sort_by, desired_count)
         
         # Fetch businesses with retry logic
         data = await fetch_businesses_with_retry(params, desired_count)
@@ -188,7 +71,7 @@ async def search_businesses(
         if len(data['businesses']) < desired_count:
             print(f"Warning: Only found {len(data['businesses'])} valid businesses, wanted {desired_count}")
         
-        return data
+        return conditional_json(request, data)
         
     except HTTPException:
         raise
@@ -199,14 +82,16 @@ async def search_businesses(
             detail=f"Failed to fetch businesses: {str(e)}"
         )
 
-@router.get("/businesses/{business_id}")
-async def get_business(business_id: str):
+@router.get("/businesses/{business_id}", response_class=FastJSONResponse)
+async def get_business(business_id: str, request: Request):
     """Proxy endpoint for getting business details"""
     print(f"\n=== BUSINESS DETAILS REQUEST ===")
     print(f"Business ID: {business_id}")
     
     try:
-        return await make_yelp_request(f"/businesses/{business_id}")
+        return conditional_json(request, await make_yelp_request(f"/businesses/{business_id}"))
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in get_business: {str(e)}")
         raise HTTPException(
@@ -214,14 +99,16 @@ async def get_business(business_id: str):
             detail=f"Failed to fetch business details: {str(e)}"
         )
 
-@router.get("/businesses/{business_id}/reviews")
-async def get_business_reviews(business_id: str):
+@router.get("/businesses/{business_id}/reviews", response_class=FastJSONResponse)
+async def get_business_reviews(business_id: str, request: Request):
     """Proxy endpoint for getting business reviews"""
     print(f"\n=== BUSINESS REVIEWS REQUEST ===")
     print(f"Business ID: {business_id}")
     
     try:
-        return await make_yelp_request(f"/businesses/{business_id}/reviews")
+        return conditional_json(request, await make_yelp_request(f"/businesses/{business_id}/reviews"))
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in get_business_reviews: {str(e)}")
         raise HTTPException(
@@ -229,6 +116,59 @@ async def get_business_reviews(business_id: str):
             detail=f"Failed to fetch business reviews: {str(e)}"
         )
 
+async def lookup_business(business_id: str, semaphore: asyncio.Semaphore, reviews: bool = True) -> dict:
+    """Details (and reviews) for one business; a failed part is reported in the item, not raised"""
+    async def fetch(path: str):
+        async with semaphore:
+            return await make_yelp_request(path)
+
+    parts = {"details": fetch(f"/businesses/{business_id}")}
+    if reviews:
+        parts["reviews"] = fetch(f"/businesses/{business_id}/reviews")
+    results = await asyncio.gather(*parts.values(), return_exceptions=True)
+
+    item = {"id": business_id}
+    for name, result in zip(parts, results):
+        if isinstance(result, HTTPException):
+            item[name] = None
+            item.setdefault("errors", {})[name] = {"status": result.status_code, "detail": result.detail}
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            item[name] = result
+    return item
+
+@router.post("/businesses/batch", response_class=FastJSONResponse)
+async def get_businesses_batch(body: BusinessBatchRequest, request: Request):
+    """Details and reviews for several businesses; streamed as NDJSON when the client accepts it"""
+    business_ids = list(dict.fromkeys(body.ids))
+    print(f"\n=== BUSINESS BATCH REQUEST ===")
+    print(f"Business IDs: {business_ids}")
+
+    if not business_ids:
+        raise HTTPException(status_code=400, detail="Pass at least one business ID")
+    if len(business_ids) > YELP_BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {YELP_BATCH_MAX_IDS} business IDs per batch")
+
+    # Bounded per batch; concurrent batches (and cards) for the same business share one fetch via the cache
+    semaphore = asyncio.Semaphore(YELP_BATCH_CONCURRENCY)
+
+    if "application/x-ndjson" in request.headers.get("accept", ""):
+        async def lines():
+            tasks = [asyncio.ensure_future(lookup_business(b, semaphore, body.reviews)) for b in business_ids]
+            try:
+                # One line per business, in the order they finish
+                for done in asyncio.as_completed(tasks):
+                    yield dumps(await done) + b"\n"
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    items = await asyncio.gather(*(lookup_business(b, semaphore, body.reviews) for b in business_ids))
+    return FastJSONResponse({"businesses": items})
+
 @router.get("/images/{encoded_url:path}")
 async def proxy_image(encoded_url: str):
     """Proxy for Yelp images to handle CORS"""
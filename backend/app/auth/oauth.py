@@ -11,43 +11,89 @@ Key Features:
 - User session management
 - Error handling for invalid tokens
 - Integration with database user model
+- Verified token cache shared between workers
+- Configurable certificate URL (GOOGLE_CERTS_URL)
+- Admin check for operational endpoints (ADMIN_EMAILS)
 
 """
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2AuthorizationCodeBearer
 from google.oauth2 import id_token
+from google.auth import exceptions
 from google.auth.transport import requests
 from sqlalchemy.orm import Session
+import hashlib
 import os
+import time
 
 from ..core.database import get_db
 from ..models.database_models import User
+from ..core.shared_state import shared_state
+from ..core.offload import run_sync
 
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 if not GOOGLE_CLIENT_ID:
     raise ValueError("GOOGLE_CLIENT_ID environment variable is not set")
 
+# Where Google's signing certificates are fetched from (overridable for local benchmarks)
+GOOGLE_CERTS_URL = os.getenv("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs")
+
+# Upper bound for caching a verified token; never past the token's own expiry
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "300"))
+
 oauth2_scheme = OAuth2AuthorizationCodeBearer(
     authorizationUrl="https://accounts.google.com/o/oauth2/v2/auth",
     tokenUrl="https://oauth2.googleapis.com/token",
 )
 
+# Comma-separated emails allowed to use admin endpoints (profiling)
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
+
+# Issuers Google signs ID tokens as (what id_token.verify_oauth2_token accepts)
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+# One HTTP session for certificate fetches, so connections are reused
+google_request = requests.Request()
+
+def verify_google_token(token: str) -> dict:
+    """Check a Google ID token's signature, audience, expiry and issuer"""
+    idinfo = id_token.verify_token(
+        token,
+        google_request,
+        audience=GOOGLE_CLIENT_ID,
+        certs_url=GOOGLE_CERTS_URL,
+        clock_skew_in_seconds=60
+    )
+    if idinfo.get("iss") not in GOOGLE_ISSUERS:
+        raise exceptions.GoogleAuthError(
+            f"Wrong issuer. 'iss' should be one of the following: {GOOGLE_ISSUERS}"
+        )
+    return idinfo
+
+async def verify_token(token: str) -> dict:
+    """Verify a Google ID token, reusing a recent verification from any worker"""
+    # Only a hash of the token is used as the key
+    key = f"token:{hashlib.sha256(token.encode()).hexdigest()}"
+    cached = await shared_state.get_json(key)
+    if cached is not None:
+        return cached
+
+    # Fetches certificates and checks an RSA signature: kept off the event loop
+    idinfo = await run_sync(verify_google_token, token)
+
+    ttl = min(TOKEN_CACHE_TTL_SECONDS, idinfo.get('exp', 0) - time.time())
+    if ttl > 0:
+        await shared_state.set_json(key, idinfo, ttl=ttl)
+    return idinfo
+
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     try:
         # Verify Google token
-        idinfo = id_token.verify_oauth2_token(
-            token, 
-            requests.Request(), 
-            GOOGLE_CLIENT_ID,
-            clock_skew_in_seconds=60
-        )
-
-        if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
-            raise ValueError('Wrong issuer.')
+        idinfo = await verify_token(token)
 
         # Get user from database
-        user = db.query(User).filter(User.id == idinfo['sub']).first()
+        user = await run_sync(db.query(User).filter(User.id == idinfo['sub']).first)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -62,4 +108,12 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
-        )
\ No newline at end of file
+        )
+
+async def get_admin_user(current_user: User = Depends(get_current_user)):
+    if (current_user.email or "").lower() not in ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
+    return current_user
@@ -0,0 +1,207 @@
+"""
+compression.py
+
+Negotiated response compression.
+Compresses JSON and text responses for clients that accept it, so large
+conversation histories and Yelp results cost fewer bytes on the wire.
+
+Key Features:
+- Accept-Encoding negotiation with q-values (brotli preferred, then gzip)
+- Size threshold below which responses are sent as-is
+- Reply streams (text/event-stream) are never compressed
+- Other streamed responses are flushed chunk by chunk
+- Encoding-specific strong ETags ("<tag>-gzip"), so caches never mix encodings
+- Bytes before and after compression in metrics
+
+"""
+
+import os
+import zlib
+from typing import Optional, List
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from .metrics import metrics
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip is offered without it
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/javascript", "text/")
+# SSE must reach the client event by event, untouched by buffering proxies
+EXCLUDED_TYPES = ("text/event-stream",)
+
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level: int = COMPRESSION_GZIP_LEVEL):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+class BrotliEncoder:
+    name = "br"
+
+    def __init__(self, quality: int = COMPRESSION_BROTLI_QUALITY):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+def available_encodings() -> List[str]:
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+def negotiate(accept_encoding: str, available: Optional[List[str]] = None) -> Optional[str]:
+    """Best encoding the client accepts (server preference breaks ties), or None for identity"""
+    available = available or available_encodings()
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+def create_encoder(name: str):
+    return BrotliEncoder() if name == "br" else GzipEncoder()
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    # '"abc"' -> '"abc-gzip"'; weak tags keep their W/ prefix
+    if etag.endswith('"'):
+        return f'{etag[:-1]}-{encoding}"'
+    return etag
+
+def strip_encoding(etag: str) -> str:
+    """Undo encoded_etag, so If-None-Match can be compared with the plain tag"""
+    for encoding in ("gzip", "br"):
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+def is_compressible(headers: Headers) -> bool:
+    content_type = headers.get("content-type", "")
+    if "content-encoding" in headers or content_type.startswith(EXCLUDED_TYPES):
+        return False
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses for clients that accept gzip or brotli"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        responder = CompressionResponder(send, encoding, self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+class CompressionResponder:
+    """Holds back the response start until the first body chunk shows how to send it"""
+
+    def __init__(self, send, encoding: str, minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start_message = None
+        self.mode = None  # "identity", "buffered" or "streaming" once decided
+        self.encoder = None
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body" or self.mode == "identity":
+            return await self._send(message)
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.mode is None:
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            status = self.start_message["status"]
+            if status < 200 or status in (204, 304) or not is_compressible(headers):
+                self.mode = "identity"
+                await self._send(self.start_message)
+                return await self._send(message)
+
+            headers.add_vary_header("Accept-Encoding")
+            if not more_body and len(body) < self.minimum_size:
+                self.mode = "identity"
+                await self._send(self.start_message)
+                return await self._send(message)
+
+            self.encoder = create_encoder(self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            if "etag" in headers:
+                headers["ETag"] = encoded_etag(headers["etag"], self.encoding)
+
+            if not more_body:
+                self.mode = "buffered"
+                compressed = self.encoder.compress(body) + self.encoder.finish()
+                headers["Content-Length"] = str(len(compressed))
+                record(len(body), len(compressed))
+                await self._send(self.start_message)
+                return await self._send({"type": "http.response.body", "body": compressed})
+
+            self.mode = "streaming"
+            del headers["Content-Length"]
+            await self._send(self.start_message)
+
+        # Streaming: flush every chunk so the client isn't kept waiting on the compressor
+        chunk = self.encoder.compress(body)
+        chunk += self.encoder.flush() if more_body else self.encoder.finish()
+        record(len(body), len(chunk))
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+def record(bytes_in: int, bytes_out: int):
+    metrics.inc("compression.bytes_in", bytes_in)
+    metrics.inc("compression.bytes_out", bytes_out)
+
+def compression_stats():
+    bytes_in = metrics.get("compression.bytes_in")
+    bytes_out = metrics.get("compression.bytes_out")
+    return {
+        "encodings": available_encodings(),
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+        "saved_ratio": round(1 - bytes_out / bytes_in, 3) if bytes_in else 0.0,
+    }
+
+metrics.register_collector("compression", compression_stats)
@@ -0,0 +1,60 @@
+"""
+metrics.py
+
+Minimal in-process metrics registry.
+Collects counters, gauges and computed stats for the metrics endpoint.
+
+Key Features:
+- Thread-safe counters and gauges
+- Collectors for derived stats (hit rates, queue depths)
+- Snapshot for JSON export
+
+"""
+
+import threading
+from typing import Callable, Dict, Any
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def inc(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def get(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, self._gauges.get(name, 0))
+
+    def register_collector(self, name: str, collector: Callable[[], Dict[str, Any]]):
+        """Register a function whose result is included in every snapshot"""
+        with self._lock:
+            self._collectors[name] = collector
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            result = {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+            }
+            collectors = dict(self._collectors)
+        for name, collector in collectors.items():
+            try:
+                result[name] = collector()
+            except Exception as e:
+                result[name] = {"error": str(e)}
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+
+metrics = Metrics()
@@ -0,0 +1,182 @@
+"""
+migrations.py
+
+Lightweight schema and data migrations.
+create_all only creates missing tables, so changes to existing tables and
+data backfills are applied here, once each, in version order.
+
+Key Features:
+- schema_migrations table recording applied versions
+- Each migration runs in its own transaction (DDL included on SQLite)
+- Batched backfills that keep memory flat on large databases
+- SQLite table rebuilds for constraint changes ALTER TABLE can't make
+
+"""
+
+import json
+from contextlib import contextmanager
+from sqlalchemy import text, MetaData, Table
+from sqlalchemy.engine import Engine, Connection
+from sqlalchemy.schema import CreateTable
+
+from .database import Base
+
+BATCH_SIZE = 500
+
+def backfill_restaurant_searches(conn: Connection):
+    """Move restaurant_search JSON text into the restaurant_searches table"""
+    last_id = 0
+    moved = 0
+    while True:
+        rows = conn.execute(
+            text("SELECT id, restaurant_search FROM messages "
+                 "WHERE restaurant_search IS NOT NULL AND id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": BATCH_SIZE}
+        ).all()
+        if not rows:
+            break
+
+        searches = []
+        for message_id, raw in rows:
+            try:
+                data = json.loads(raw)
+            except (TypeError, ValueError):
+                data = None
+            if isinstance(data, dict):
+                k = data.get("k")
+                searches.append({
+                    "message_id": message_id,
+                    "term": data.get("term"),
+                    "location": data.get("location"),
+                    "price": data.get("price"),
+                    "k": int(k) if isinstance(k, (int, float)) or (isinstance(k, str) and k.isdigit()) else None,
+                    "sort_by": data.get("sort_by"),
+                })
+
+        if searches:
+            conn.execute(
+                text("INSERT INTO restaurant_searches (message_id, term, location, price, k, sort_by) "
+                     "SELECT :message_id, :term, :location, :price, :k, :sort_by "
+                     "WHERE NOT EXISTS (SELECT 1 FROM restaurant_searches WHERE message_id = :message_id)"),
+                searches
+            )
+        last_id = rows[-1][0]
+        conn.execute(
+            text("UPDATE messages SET restaurant_search = NULL WHERE restaurant_search IS NOT NULL AND id <= :last_id"),
+            {"last_id": last_id}
+        )
+        moved += len(searches)
+    print(f"Moved {moved} restaurant searches to restaurant_searches")
+
+def rebuild_sqlite_table(conn: Connection, table: Table):
+    """Recreate a table with its current model definition, keeping rows, indexes and triggers.
+
+    The create-copy-drop-rename order from the SQLite docs; foreign keys must be off.
+    """
+    name = table.name
+    saved = conn.execute(
+        text("SELECT type, name, sql FROM sqlite_master "
+             "WHERE tbl_name = :name AND type IN ('index', 'trigger') AND sql IS NOT NULL"),
+        {"name": name}
+    ).all()
+    old_columns = {row[1] for row in conn.execute(text(f"PRAGMA table_info({name})"))}
+    columns = ", ".join(column.name for column in table.columns if column.name in old_columns)
+
+    # Copy the whole schema so the new table's foreign keys resolve
+    metadata = MetaData()
+    for other in table.metadata.sorted_tables:
+        other.to_metadata(metadata)
+    new_table = table.to_metadata(metadata, name=f"{name}_new")
+    new_table.indexes.clear()
+    conn.execute(CreateTable(new_table))
+    conn.execute(text(f"INSERT INTO {name}_new ({columns}) SELECT {columns} FROM {name}"))
+    conn.execute(text(f"DROP TABLE {name}"))
+    conn.execute(text(f"ALTER TABLE {name}_new RENAME TO {name}"))
+
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+    for kind, object_name, sql in saved:
+        if kind == "index":
+            conn.execute(text(sql.replace("CREATE INDEX", "CREATE INDEX IF NOT EXISTS", 1)))
+        else:
+            conn.execute(text(sql))
+
+# Child tables whose rows go with their conversation
+CASCADE_FOREIGN_KEYS = [
+    ("messages", "conversation_id", "conversations"),
+    ("conversation_summaries", "conversation_id", "conversations"),
+]
+
+def add_cascade_deletes(conn: Connection):
+    """Add ON DELETE CASCADE to foreign keys created before it was declared"""
+    for table, column, parent in CASCADE_FOREIGN_KEYS:
+        if conn.dialect.name == "sqlite":
+            keys = conn.execute(text(f"PRAGMA foreign_key_list({table})")).mappings().all()
+            if any(key["from"] == column and key["on_delete"] == "CASCADE" for key in keys):
+                continue
+            rebuild_sqlite_table(conn, Base.metadata.tables[table])
+        elif conn.dialect.name == "postgresql":
+            conn.execute(text(
+                f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_{column}_fkey, "
+                f"ADD CONSTRAINT {table}_{column}_fkey FOREIGN KEY ({column}) REFERENCES {parent} (id) ON DELETE CASCADE"
+            ))
+        print(f"Added ON DELETE CASCADE to {table}.{column}")
+
+# (version, name, function taking a Connection); append only
+MIGRATIONS = [
+    (1, "restaurant_searches", backfill_restaurant_searches),
+    (2, "cascade_deletes", add_cascade_deletes),
+]
+
+@contextmanager
+def migration_transaction(engine: Engine):
+    """One transaction per migration.
+
+    On SQLite, foreign keys are switched off (table rebuilds need it, and the
+    pragma is ignored inside a transaction) and BEGIN is issued explicitly so
+    DDL is part of the transaction too.
+    """
+    if engine.dialect.name != "sqlite":
+        with engine.begin() as conn:
+            yield conn
+        return
+
+    with engine.connect() as conn:
+        driver_connection = conn.connection.driver_connection
+        isolation_level = driver_connection.isolation_level
+        driver_connection.isolation_level = None
+        try:
+            conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+            conn.exec_driver_sql("BEGIN")
+            try:
+                yield conn
+                violations = conn.exec_driver_sql("PRAGMA foreign_key_check").all()
+                if violations:
+                    # Orphans from before foreign keys were enforced; reported, not fatal
+                    print(f"Warning: {len(violations)} rows reference missing parents, e.g. {tuple(violations[0])}")
+                conn.exec_driver_sql("COMMIT")
+            except BaseException:
+                conn.exec_driver_sql("ROLLBACK")
+                raise
+        finally:
+            conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+            driver_connection.isolation_level = isolation_level
+
+def run_migrations(engine: Engine, migrations=MIGRATIONS):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        ))
+        applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+    for version, name, migrate in migrations:
+        if version in applied:
+            continue
+        with migration_transaction(engine) as conn:
+            migrate(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+                {"version": version, "name": name}
+            )
+        print(f"Applied migration {version}: {name}")
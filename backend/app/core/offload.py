@@ -0,0 +1,72 @@
+"""
+offload.py
+
+Bounded thread pool for blocking calls made from async code.
+Token verification (certificate fetch and RSA check), SQLAlchemy sessions and
+the sync OpenAI client all block; run through run_sync they leave the event
+loop free for other requests. Until those paths are natively async, this is
+the one place that decides how many of them run at once.
+
+Key Features:
+- OFFLOAD_THREADS worker threads, separate from Starlette's default pool
+- Context (request deadline, query tracking) carried into the worker thread
+- Pool stats (busy threads, queued calls) in metrics
+
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from .metrics import metrics
+
+OFFLOAD_THREADS = int(os.getenv("OFFLOAD_THREADS", "16"))
+
+class Offloader:
+    def __init__(self, max_workers: int = OFFLOAD_THREADS):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="offload")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+
+    def _run(self, fn: Callable, context: contextvars.Context):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            return context.run(fn)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    async def run_sync(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking call in the pool and wait for its result"""
+        with self._lock:
+            self._queued += 1
+        future = self._executor.submit(self._run, functools.partial(fn, *args, **kwargs), contextvars.copy_context())
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # A call that hasn't started is dropped; one that has runs to completion unseen
+            if future.cancel():
+                with self._lock:
+                    self._queued -= 1
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "threads": self.max_workers,
+                "running": self._running,
+                "queued": self._queued,
+            }
+
+offloader = Offloader()
+run_sync = offloader.run_sync
+
+metrics.register_collector("offload", offloader.stats)
@@ -0,0 +1,239 @@
+"""
+profiler.py
+
+On-demand sampling profiler for a live worker.
+A background thread samples every thread's Python stack at a fixed interval
+and folds the samples into collapsed stacks (one "frame;frame;frame count"
+line per distinct stack), the input format of flamegraph.pl and speedscope.
+While it runs, a heartbeat task on the event loop measures scheduling lag,
+and the sampler records what the loop thread was doing whenever the
+heartbeat stalls past a threshold.
+
+Key Features:
+- No instrumentation: sys._current_frames() polling, nothing to install
+- Idle threads (waiting on selectors, locks, queues) left out by default
+- Event loop lag (mean, p99, max) over the profiling window
+- Blocking calls: the loop thread's stack whenever it stops ticking for too long
+- One session at a time per worker
+- Always-on loop watchdog in debug mode: every stall over a threshold, with its stack
+
+"""
+
+import asyncio
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, Any, List, Optional
+
+from .metrics import metrics
+
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "5"))
+# A loop that hasn't ticked for this long is reported as blocked
+BLOCKING_THRESHOLD_MS = float(os.getenv("BLOCKING_THRESHOLD_MS", "100"))
+
+# Watchdog: on in debug mode unless set explicitly
+LOOP_WATCHDOG_ENABLED = os.getenv("LOOP_WATCHDOG_ENABLED", os.getenv("DEBUG", "false")).lower() in ("1", "true", "yes")
+LOOP_STALL_THRESHOLD_MS = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "100"))
+
+# Leaf functions of threads that are waiting rather than working
+IDLE_LEAVES = {"select", "poll", "wait", "_worker", "_wait_for_tstate_lock", "accept", "get", "sleep"}
+
+def frame_stack(frame) -> List[str]:
+    """Frames of a stack from the outermost call to the innermost"""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+def is_idle(stack: List[str]) -> bool:
+    return bool(stack) and stack[-1].split(" ", 1)[0] in IDLE_LEAVES
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+class ProfileSession:
+    """One profiling run: stack samples, loop lag and blocking episodes"""
+
+    def __init__(self, seconds: float, interval_ms: float = PROFILER_INTERVAL_MS,
+                 blocking_threshold_ms: float = BLOCKING_THRESHOLD_MS, include_idle: bool = False):
+        self.seconds = seconds
+        self.interval = interval_ms / 1000
+        self.blocking_threshold = blocking_threshold_ms / 1000
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.lags: List[float] = []
+        self.blocking: List[Dict[str, Any]] = []
+        self._beat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._done = threading.Event()
+
+    async def run(self) -> "ProfileSession":
+        """Profile for `seconds`; the sampler is a thread, so it keeps sampling while the loop is blocked"""
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            await asyncio.to_thread(self._sample_until_done)
+        finally:
+            self._done.set()
+            heartbeat.cancel()
+        return self
+
+    async def _heartbeat(self):
+        tick = min(self.interval * 2, 0.05)
+        while not self._done.is_set():
+            start = time.monotonic()
+            await asyncio.sleep(tick)
+            now = time.monotonic()
+            self.lags.append(max(0.0, now - start - tick))
+            self._beat = now
+
+    def _sample_until_done(self):
+        me = threading.get_ident()
+        deadline = time.monotonic() + self.seconds
+        episode = None
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = frame_stack(frame)
+                if not self.include_idle and is_idle(stack):
+                    continue
+                self.stacks[";".join([names.get(ident, f"thread-{ident}")] + stack)] += 1
+            self.samples += 1
+
+            beat = self._beat
+            stalled = time.monotonic() - beat
+            if stalled >= self.blocking_threshold:
+                if episode is None or episode["beat"] != beat:
+                    frame = sys._current_frames().get(self._loop_thread)
+                    episode = {"beat": beat, "stack": frame_stack(frame) if frame else []}
+                    self.blocking.append(episode)
+                episode["duration_ms"] = round(stalled * 1000, 1)
+            time.sleep(self.interval)
+        self._done.set()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def loop_lag(self) -> Dict[str, float]:
+        return {
+            "mean_ms": round(sum(self.lags) / len(self.lags) * 1000, 2) if self.lags else 0.0,
+            "p99_ms": round(percentile(self.lags, 0.99) * 1000, 2),
+            "max_ms": round(max(self.lags, default=0.0) * 1000, 2),
+        }
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "seconds": self.seconds,
+            "samples": self.samples,
+            "loop_lag": self.loop_lag(),
+            "blocking": [
+                {"duration_ms": episode["duration_ms"], "stack": episode["stack"]}
+                for episode in self.blocking
+            ],
+            "collapsed": self.collapsed(),
+        }
+
+class Profiler:
+    """Runs profiling sessions for the admin endpoint, one at a time"""
+
+    def __init__(self, max_seconds: float = PROFILER_MAX_SECONDS):
+        self.max_seconds = max_seconds
+        self._lock = asyncio.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    async def profile(self, seconds: float, **options) -> ProfileSession:
+        async with self._lock:
+            session = ProfileSession(min(seconds, self.max_seconds), **options)
+            print(f"Profiling for {session.seconds}s")
+            return await session.run()
+
+profiler = Profiler()
+
+class LoopWatchdog:
+    """Records event loop stalls: a heartbeat task ticks on the loop, a thread notices when it stops"""
+
+    def __init__(self, threshold_ms: float = LOOP_STALL_THRESHOLD_MS, keep: int = 50):
+        self.threshold = threshold_ms / 1000
+        self.tick = min(self.threshold / 4, 0.025)
+        self.stalls = 0
+        self.recent = deque(maxlen=keep)
+        self._beat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Start watching the running loop (call from the loop)"""
+        if self._heartbeat_task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+        print(f"Loop watchdog on (stalls over {self.threshold * 1000:.0f} ms)")
+
+    async def stop(self):
+        self._stopped.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            self._beat = time.monotonic()
+
+    def _watch(self):
+        stall = None
+        while not self._stopped.wait(self.tick / 2):
+            beat = self._beat
+            stalled = time.monotonic() - beat - self.tick
+            if stall is not None and stall["beat"] != beat:
+                self._record(stall)
+                stall = None
+            if stalled >= self.threshold and stall is None:
+                # Captured while the loop is still stuck, so this is the blocking code
+                frame = sys._current_frames().get(self._loop_thread)
+                stall = {"beat": beat, "stack": frame_stack(frame) if frame else []}
+            if stall is not None:
+                stall["duration_ms"] = round(max(stalled, 0) * 1000, 1)
+
+    def _record(self, stall: Dict[str, Any]):
+        self.stalls += 1
+        metrics.inc("loop.stalls")
+        self.recent.append({"at": time.time(), "duration_ms": stall["duration_ms"], "stack": stall["stack"]})
+        print(f"Event loop blocked for {stall['duration_ms']} ms:\n  " + "\n  ".join(stall["stack"][-8:]))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._heartbeat_task is not None,
+            "threshold_ms": self.threshold * 1000,
+            "stalls": self.stalls,
+            "recent": list(self.recent)[-10:],
+        }
+
+loop_watchdog = LoopWatchdog()
+
+metrics.register_collector("loop_watchdog", loop_watchdog.stats)
@@ -0,0 +1,132 @@
+"""
+query_profiler.py
+
+Per-request SQL query counting and slow-query logging.
+Hooks SQLAlchemy's before/after_cursor_execute events on every engine and
+attributes each statement to the request (or test) that issued it.
+
+Key Features:
+- Query count and total query time per request
+- Slow queries (over SLOW_QUERY_MS) logged with their EXPLAIN plan
+- X-DB-Query-Count / X-DB-Query-Time-Ms response headers in DEBUG mode
+- track_queries() for measuring a block of code (used by the query_budget test fixture)
+- Off unless QUERY_PROFILER_ENABLED is set
+
+"""
+
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .metrics import metrics
+
+QUERY_PROFILER_ENABLED = os.getenv("QUERY_PROFILER_ENABLED", "false").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+# Debug mode: per-request query numbers go out as response headers
+DEBUG = os.getenv("DEBUG", "false").lower() in ("1", "true", "yes")
+
+EXPLAINABLE = ("select", "with", "update", "delete", "insert")
+
+class QueryStats:
+    """Statements issued while this object is current"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.statements: List[str] = []
+        self.slow: List[Dict[str, Any]] = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"count": self.count, "total_ms": round(self.total_ms, 2), "slow": self.slow}
+
+_current: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("query_stats", default=None)
+_installed = False
+
+def explain(conn, statement: str, parameters) -> Optional[str]:
+    """Query plan for a statement, on the same connection; None if it can't be explained"""
+    if not statement.lstrip().lower().startswith(EXPLAINABLE):
+        return None
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return "\n".join(" ".join(str(col) for col in row) for row in cursor.fetchall())
+    except Exception as e:
+        return f"(no plan: {e})"
+    finally:
+        cursor.close()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_start")
+    if not started:
+        return
+    elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+    metrics.inc("db.queries")
+
+    stats = _current.get()
+    if stats is not None:
+        stats.count += 1
+        stats.total_ms += elapsed_ms
+        stats.statements.append(statement)
+
+    if elapsed_ms >= SLOW_QUERY_MS:
+        metrics.inc("db.slow_queries")
+        plan = None if executemany else explain(conn, statement, parameters)
+        print(f"Slow query ({elapsed_ms:.1f} ms): {' '.join(statement.split())}")
+        if plan:
+            print(f"Plan:\n{plan}")
+        if stats is not None:
+            stats.slow.append({"statement": statement, "ms": round(elapsed_ms, 2), "plan": plan})
+
+def install():
+    """Start timing statements on every engine (idempotent)"""
+    global _installed
+    if _installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    _installed = True
+
+@contextmanager
+def track_queries():
+    """Count the statements issued inside the block, including from threads it starts with copied context"""
+    install()
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+class QueryProfilerMiddleware:
+    """ASGI middleware that tracks each request's queries and reports them in DEBUG mode"""
+
+    def __init__(self, app, headers: bool = DEBUG):
+        self.app = app
+        self.headers = headers
+        install()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_with_stats(message):
+            # Statements issued while a body streams come after the headers and aren't included
+            if message["type"] == "http.response.start" and self.headers:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-db-query-count", str(stats.count).encode()),
+                    (b"x-db-query-time-ms", f"{stats.total_ms:.2f}".encode()),
+                ]
+            await send(message)
+
+        with track_queries() as stats:
+            await self.app(scope, receive, send_with_stats)
+        if stats.slow:
+            print(f"{scope['method']} {scope['path']}: {stats.count} queries, {len(stats.slow)} slow, {stats.total_ms:.1f} ms")
@@ -0,0 +1,93 @@
+"""
+redis_client.py
+
+Minimal asyncio client for the Redis serialization protocol (RESP2).
+Enough of the protocol for the shared-state backend, without adding a
+client library dependency.
+
+Key Features:
+- Command encoding and reply parsing (simple, error, integer, bulk, array)
+- Pipelined command batches
+- Dedicated pub/sub connections with a background reader
+- redis:// URL parsing (password and database index)
+
+"""
+
+import asyncio
+from typing import Optional, List, Any, Tuple
+from urllib.parse import urlparse
+
+class RespError(Exception):
+    """Error reply from the server"""
+
+def parse_url(url: str) -> Tuple[str, int, Optional[str], int]:
+    parsed = urlparse(url)
+    db = int(parsed.path.lstrip("/") or 0)
+    return parsed.hostname or "localhost", parsed.port or 6379, parsed.password, db
+
+def encode_command(*args) -> bytes:
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+    return b"".join(parts)
+
+class RespConnection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def open(cls, url: str, timeout: float = 5.0) -> "RespConnection":
+        host, port, password, db = parse_url(url)
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        connection = cls(reader, writer)
+        if password:
+            await connection.execute("AUTH", password)
+        if db:
+            await connection.execute("SELECT", db)
+        return connection
+
+    async def read_reply(self) -> Any:
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        prefix, body = line[:1], line[1:-2]
+        if prefix == b"+":
+            return body.decode()
+        if prefix == b"-":
+            return RespError(body.decode())
+        if prefix == b":":
+            return int(body)
+        if prefix == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            data = await self.reader.readexactly(length + 2)
+            return data[:-2].decode()
+        if prefix == b"*":
+            length = int(body)
+            if length < 0:
+                return None
+            return [await self.read_reply() for _ in range(length)]
+        raise ConnectionError(f"Unexpected reply: {line!r}")
+
+    async def execute_many(self, commands: List[tuple]) -> List[Any]:
+        """Send commands in one write and read their replies in order"""
+        self.writer.write(b"".join(encode_command(*command) for command in commands))
+        await self.writer.drain()
+        replies = [await self.read_reply() for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    async def execute(self, *args) -> Any:
+        return (await self.execute_many([args]))[0]
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except Exception:
+            pass
@@ -0,0 +1,281 @@
+"""
+resilience.py
+
+Shared resilience layer for upstream calls (Yelp, OpenAI).
+Keeps a slow or failing upstream from tying up workers.
+
+Key Features:
+- Per-upstream circuit breakers (closed / open / half-open)
+- Bounded retries with full-jitter exponential backoff
+- Hedged requests after a latency percentile
+- Rolling latency tracking per upstream
+- Request deadlines propagated through a context variable
+- Breaker state and retry counters in metrics
+
+"""
+
+import asyncio
+import contextvars
+import inspect
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Callable, Dict, Any
+
+import httpx
+import openai
+
+from .metrics import metrics
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "20"))
+
+# Header a client can send to ask for a shorter (never longer) deadline, in seconds
+DEADLINE_HEADER = b"x-request-timeout"
+
+# Long-lived SSE replies manage their own lifetime
+DEADLINE_EXEMPT_PREFIXES = ("/api/messages/stream", "/api/messages/events")
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+class UpstreamError(Exception):
+    """Non-success HTTP status from an upstream"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit for {name} is open")
+        self.name = name
+        self.retry_after = retry_after
+
+class DeadlineExceeded(Exception):
+    pass
+
+def is_transient(error: Exception) -> bool:
+    """Errors worth retrying, and that count against an upstream's health"""
+    if isinstance(error, (httpx.TimeoutException, httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+        return True
+    if isinstance(error, UpstreamError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+# --- Deadlines ---------------------------------------------------------------
+
+@contextmanager
+def deadline_scope(seconds: float):
+    """Set the deadline for the current request; nested scopes can only shorten it"""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+def deadline_remaining() -> Optional[float]:
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+def deadline_timeout(default: float) -> float:
+    """Timeout for one upstream attempt: the default, capped by the request deadline"""
+    remaining = deadline_remaining()
+    if remaining is None:
+        return default
+    if remaining <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return min(default, remaining)
+
+class DeadlineMiddleware:
+    """ASGI middleware that gives every request a deadline (X-Request-Timeout can shorten it)"""
+
+    def __init__(self, app, default_seconds: float = REQUEST_DEADLINE_SECONDS):
+        self.app = app
+        self.default_seconds = default_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(DEADLINE_EXEMPT_PREFIXES):
+            return await self.app(scope, receive, send)
+
+        seconds = self.default_seconds
+        for name, value in scope.get("headers", []):
+            if name == DEADLINE_HEADER:
+                try:
+                    seconds = min(seconds, max(float(value), 0.0))
+                except ValueError:
+                    pass
+        with deadline_scope(seconds):
+            await self.app(scope, receive, send)
+
+# --- Circuit breakers --------------------------------------------------------
+
+class CircuitBreaker:
+    """Opens after consecutive transient failures; lets one trial call through after a cool-down"""
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_RESET_SECONDS, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # When the half-open trial call started; others are short-circuited until it finishes
+        self.trial_started_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "open":
+                metrics.inc(f"resilience.{self.name}.short_circuited")
+                raise CircuitOpenError(self.name, self.reset_seconds - (self.clock() - self.opened_at))
+            if state == "half_open":
+                now = self.clock()
+                # A trial that never reported back (e.g. cancelled) stops blocking after a cool-down
+                if self.trial_started_at is not None and now - self.trial_started_at < self.reset_seconds:
+                    metrics.inc(f"resilience.{self.name}.short_circuited")
+                    raise CircuitOpenError(self.name, self.reset_seconds - (now - self.trial_started_at))
+                self.trial_started_at = now
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_started_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            # A failed trial call in half-open re-opens right away
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    print(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.opened_at = self.clock()
+            self.trial_started_at = None
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+def get_breaker(name: str) -> CircuitBreaker:
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name)
+    return _breakers[name]
+
+# --- Retries -----------------------------------------------------------------
+
+class RetryPolicy:
+    def __init__(self, attempts: int = 3, base_delay: float = 0.2, max_delay: float = 2.0, rng=random.random):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = rng
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(max_delay, base * 2^(attempt-1))]"""
+        return self.rng() * min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+
+NO_RETRY = RetryPolicy(attempts=1)
+
+async def call_with_retry(
+    fn: Callable[[], Any],
+    breaker: Optional[CircuitBreaker] = None,
+    policy: RetryPolicy = NO_RETRY,
+    retry_on: Callable[[Exception], bool] = is_transient
+):
+    """Call fn (sync or async) through a breaker, retrying transient errors within the deadline.
+
+    Only pass a retrying policy for idempotent calls.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        if breaker:
+            breaker.before_call()
+        try:
+            result = fn()
+            if inspect.isawaitable(result):
+                result = await result
+        except Exception as e:
+            transient = retry_on(e)
+            if breaker:
+                # Client errors mean the upstream is up
+                breaker.record_failure() if transient else breaker.record_success()
+            if not transient or attempt >= policy.attempts:
+                raise
+            delay = policy.backoff(attempt)
+            remaining = deadline_remaining()
+            if remaining is not None and delay >= remaining:
+                raise
+            name = breaker.name if breaker else "upstream"
+            print(f"Retrying {name} call after {type(e).__name__} (attempt {attempt + 1}/{policy.attempts})")
+            metrics.inc(f"resilience.{name}.retries")
+            await asyncio.sleep(delay)
+            continue
+        if breaker:
+            breaker.record_success()
+        return result
+
+# --- Hedging -----------------------------------------------------------------
+
+class LatencyTracker:
+    """Rolling window of recent call latencies"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+async def hedged(fn: Callable[[], Any], delay: float, name: str = "upstream"):
+    """Start fn; if it hasn't finished after `delay`, start a second copy and take the first success"""
+    tasks = [asyncio.ensure_future(fn())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            metrics.inc(f"resilience.{name}.hedges")
+            tasks.append(asyncio.ensure_future(fn()))
+
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+def breaker_stats() -> Dict[str, Any]:
+    return {name: {"state": b.state, "failures": b.failures} for name, b in _breakers.items()}
+
+metrics.register_collector("circuit_breakers", breaker_stats)
@@ -0,0 +1,127 @@
+"""
+responses.py
+
+Fast JSON responses for large payloads.
+Endpoints that return a FastJSONResponse skip FastAPI's jsonable_encoder,
+which walks every value in Python, and serialize in one pass.
+
+Key Features:
+- orjson encoder with native datetime handling (stdlib json fallback)
+- Pre-serialized fragments spliced into the output without re-encoding
+- Compact output with the same values the default encoder produces
+- Drop-in JSONResponse subclass
+- Strong ETags and 304 Not Modified for conditional GETs
+
+"""
+
+import datetime
+import enum
+import hashlib
+import json
+import re
+import secrets
+import uuid
+from decimal import Decimal
+from typing import Any, List, Union
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from .compression import strip_encoding
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
+
+class Fragment:
+    """JSON that is already serialized (e.g. stored as text), emitted as-is"""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: Union[str, bytes]):
+        self.data = data.encode() if isinstance(data, str) else data
+
+def encode_value(value: Any) -> Any:
+    """Types neither encoder handles on its own"""
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    fragments: List[bytes] = []
+    # Fragments go out as placeholder strings first; the nonce keeps user text from matching one
+    nonce = secrets.token_hex(8)
+
+    def default(value: Any) -> Any:
+        if isinstance(value, Fragment):
+            fragments.append(value.data)
+            return f"\x00{nonce}:{len(fragments) - 1}\x00"
+        return encode_value(value)
+
+    if orjson is not None:
+        data = orjson.dumps(content, default=default, option=orjson.OPT_NON_STR_KEYS)
+    else:
+        data = json.dumps(content, default=default, ensure_ascii=False, separators=(",", ":")).encode()
+
+    if fragments:
+        # Both encoders escape NUL as \u0000
+        placeholder = re.compile(rb'"\\u0000' + nonce.encode() + rb':(\d+)\\u0000"')
+        data = placeholder.sub(lambda match: fragments[int(match.group(1))], data)
+    return data
+
+def loads(data: Union[str, bytes]) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+class FastJSONResponse(JSONResponse):
+    """Return an instance from the endpoint (not a dict) so jsonable_encoder is skipped"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+# --- Conditional GET ---------------------------------------------------------
+
+# Authenticated data: browsers may keep it, but must revalidate every time
+REVALIDATE = "private, no-cache"
+
+def strong_etag(*parts: Any) -> str:
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match check (weak comparison, ignoring the compression suffix)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if strip_encoding(candidate) == etag:
+            return True
+    return False
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": REVALIDATE})
+
+def conditional_json(request: Request, content: Any, etag: str = None) -> Response:
+    """FastJSONResponse with an ETag (hash of the body unless given), or 304 if the client has it"""
+    response = FastJSONResponse(content, headers={"Cache-Control": REVALIDATE})
+    etag = etag or f'"{hashlib.sha256(response.body).hexdigest()[:32]}"'
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return response
@@ -0,0 +1,317 @@
+"""
+shared_state.py
+
+Pluggable shared-state backend for multi-worker deployments.
+Lets caches, locks and reply streams be shared between uvicorn workers
+and nodes instead of living in one process.
+
+Key Features:
+- One async interface: cache, single-flight locks, pub/sub, bounded lists
+- In-memory backend for single-process deployments and tests (expired keys swept periodically)
+- Redis-protocol backend (any RESP2 server) for shared deployments
+- Cache-aside helper that collapses concurrent misses into one fetch
+- Selected by SHARED_STATE_URL (memory:// or redis://host:port/db)
+
+"""
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import deque
+from typing import Optional, List, Dict, Any, Awaitable, Callable
+
+from .redis_client import RespConnection, RespError
+
+SHARED_STATE_URL = os.getenv("SHARED_STATE_URL", "memory://")
+
+# How long single_flight waiters poll for another worker's result
+LOCK_POLL_SECONDS = 0.05
+
+# How often the memory backend drops expired keys that are never read again
+MEMORY_SWEEP_SECONDS = float(os.getenv("SHARED_STATE_SWEEP_SECONDS", "60"))
+
+# Compare-and-delete, so a lock is only released by its holder
+RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+class Subscription:
+    """Messages published to one channel after subscribing"""
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def get(self, timeout: float) -> Optional[str]:
+        """Next message, or None if nothing arrived within timeout"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        pass
+
+class SharedState:
+    """Interface for shared state; values are strings"""
+
+    # True when other processes see the same state
+    is_shared = False
+
+    async def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None, only_if_absent: bool = False) -> bool:
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def delete_if_equals(self, key: str, value: str) -> bool:
+        raise NotImplementedError
+
+    async def list_append(self, key: str, values: List[str], max_len: int, ttl: Optional[float] = None):
+        """Append to a list, keeping only the newest max_len items"""
+        raise NotImplementedError
+
+    async def list_range(self, key: str) -> List[str]:
+        raise NotImplementedError
+
+    async def publish(self, channel: str, message: str):
+        raise NotImplementedError
+
+    async def subscribe(self, channel: str) -> Subscription:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    # --- Helpers built on the primitives -----------------------------------
+
+    async def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        token = uuid.uuid4().hex
+        if await self.set(f"lock:{key}", token, ttl=ttl, only_if_absent=True):
+            return token
+        return None
+
+    async def release_lock(self, key: str, token: str):
+        await self.delete_if_equals(f"lock:{key}", token)
+
+    async def get_json(self, key: str) -> Optional[Any]:
+        value = await self.get(key)
+        return None if value is None else json.loads(value)
+
+    async def set_json(self, key: str, value: Any, ttl: Optional[float] = None):
+        await self.set(key, json.dumps(value), ttl=ttl)
+
+    async def cached(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: float, lock_ttl: float = 30.0) -> Any:
+        """Cache-aside for JSON values; concurrent misses (on any worker) share one fetch"""
+        value = await self.get_json(key)
+        if value is not None:
+            return value
+
+        deadline = time.monotonic() + lock_ttl
+        while True:
+            token = await self.acquire_lock(key, lock_ttl)
+            if token:
+                try:
+                    value = await self.get_json(key)
+                    if value is None:
+                        value = await fetch()
+                        await self.set_json(key, value, ttl=ttl)
+                    return value
+                finally:
+                    await self.release_lock(key, token)
+
+            # Someone else is fetching; wait for their result
+            await asyncio.sleep(LOCK_POLL_SECONDS)
+            value = await self.get_json(key)
+            if value is not None:
+                return value
+            if time.monotonic() > deadline:
+                return await fetch()
+
+class MemoryState(SharedState):
+    """Process-local backend"""
+
+    def __init__(self, clock=time.monotonic, sweep_seconds: float = MEMORY_SWEEP_SECONDS):
+        self.clock = clock
+        self.sweep_seconds = sweep_seconds
+        self._values: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._channels: Dict[str, set] = {}
+        self._next_sweep = clock() + sweep_seconds
+
+    def _sweep(self):
+        """Drop every expired key; cache keys (tokens, Yelp URLs) are rarely read again once stale"""
+        now = self.clock()
+        for key in [key for key, expires in self._expires.items() if expires <= now]:
+            self._values.pop(key, None)
+            del self._expires[key]
+        self._next_sweep = now + self.sweep_seconds
+
+    def _live(self, key: str) -> bool:
+        expires = self._expires.get(key)
+        if expires is not None and expires <= self.clock():
+            self._values.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._values
+
+    def _expire(self, key: str, ttl: Optional[float]):
+        if ttl is None:
+            self._expires.pop(key, None)
+        else:
+            self._expires[key] = self.clock() + ttl
+        # Checked on writes, the only way the keyspace grows
+        if self.clock() >= self._next_sweep:
+            self._sweep()
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._values[key] if self._live(key) else None
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None, only_if_absent: bool = False) -> bool:
+        if only_if_absent and self._live(key):
+            return False
+        self._values[key] = value
+        self._expire(key, ttl)
+        return True
+
+    async def delete(self, key: str):
+        self._values.pop(key, None)
+        self._expires.pop(key, None)
+
+    async def delete_if_equals(self, key: str, value: str) -> bool:
+        if self._live(key) and self._values[key] == value:
+            await self.delete(key)
+            return True
+        return False
+
+    async def list_append(self, key: str, values: List[str], max_len: int, ttl: Optional[float] = None):
+        if not self._live(key):
+            self._values[key] = deque(maxlen=max_len)
+        self._values[key].extend(values)
+        self._expire(key, ttl)
+
+    async def list_range(self, key: str) -> List[str]:
+        return list(self._values[key]) if self._live(key) else []
+
+    async def publish(self, channel: str, message: str):
+        for subscription in list(self._channels.get(channel, ())):
+            subscription.queue.put_nowait(message)
+
+    async def subscribe(self, channel: str) -> Subscription:
+        subscription = MemorySubscription(self, channel)
+        self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+class MemorySubscription(Subscription):
+    def __init__(self, state: MemoryState, channel: str):
+        super().__init__()
+        self.state = state
+        self.channel = channel
+
+    async def close(self):
+        subscribers = self.state._channels.get(self.channel)
+        if subscribers is not None:
+            subscribers.discard(self)
+            if not subscribers:
+                del self.state._channels[self.channel]
+
+class RedisState(SharedState):
+    """Backend for any server speaking the Redis protocol"""
+
+    is_shared = True
+
+    def __init__(self, url: str):
+        self.url = url
+        self._connection: Optional[RespConnection] = None
+        self._lock = asyncio.Lock()
+
+    async def _execute_many(self, commands: List[tuple]) -> List[Any]:
+        # One shared connection; commands from concurrent callers are serialized
+        async with self._lock:
+            if self._connection is None:
+                self._connection = await RespConnection.open(self.url)
+            try:
+                return await self._connection.execute_many(commands)
+            except RespError:
+                # Every reply was read; the connection is still in step
+                raise
+            except BaseException:
+                # Failed or cancelled between write and read: an unread reply would
+                # be handed to the next caller, so the connection is dropped
+                connection, self._connection = self._connection, None
+                connection.writer.close()
+                raise
+
+    async def _execute(self, *args) -> Any:
+        return (await self._execute_many([args]))[0]
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._execute("GET", key)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None, only_if_absent: bool = False) -> bool:
+        args = ["SET", key, value]
+        if ttl is not None:
+            args += ["PX", max(int(ttl * 1000), 1)]
+        if only_if_absent:
+            args.append("NX")
+        return await self._execute(*args) == "OK"
+
+    async def delete(self, key: str):
+        await self._execute("DEL", key)
+
+    async def delete_if_equals(self, key: str, value: str) -> bool:
+        return await self._execute("EVAL", RELEASE_SCRIPT, 1, key, value) == 1
+
+    async def list_append(self, key: str, values: List[str], max_len: int, ttl: Optional[float] = None):
+        commands = [("RPUSH", key, *values), ("LTRIM", key, -max_len, -1)]
+        if ttl is not None:
+            commands.append(("PEXPIRE", key, max(int(ttl * 1000), 1)))
+        await self._execute_many(commands)
+
+    async def list_range(self, key: str) -> List[str]:
+        return await self._execute("LRANGE", key, 0, -1) or []
+
+    async def publish(self, channel: str, message: str):
+        await self._execute("PUBLISH", channel, message)
+
+    async def subscribe(self, channel: str) -> Subscription:
+        connection = await RespConnection.open(self.url)
+        await connection.execute("SUBSCRIBE", channel)
+        return RedisSubscription(connection)
+
+    async def close(self):
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+class RedisSubscription(Subscription):
+    """Pub/sub needs its own connection; a reader task feeds the queue"""
+
+    def __init__(self, connection: RespConnection):
+        super().__init__()
+        self.connection = connection
+        self._reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        try:
+            while True:
+                reply = await self.connection.read_reply()
+                if isinstance(reply, list) and len(reply) == 3 and reply[0] == "message":
+                    self.queue.put_nowait(reply[2])
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+    async def close(self):
+        self._reader.cancel()
+        await self.connection.close()
+
+def create_shared_state(url: str = SHARED_STATE_URL) -> SharedState:
+    if url.startswith("memory://"):
+        return MemoryState()
+    if url.startswith("redis://"):
+        print(f"Using shared state at {url.split('@')[-1]}")
+        return RedisState(url)
+    raise ValueError(f"Unsupported SHARED_STATE_URL: {url}")
+
+shared_state = create_shared_state()
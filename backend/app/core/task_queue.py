@@ -0,0 +1,362 @@
+"""
+task_queue.py
+
+In-process queue for background work that shouldn't hold up a request.
+Handlers are registered by name; request paths enqueue a job with a JSON
+payload and return. A fixed number of workers run jobs, retrying failures
+with backoff. Jobs can optionally be written to a SQLite file, so they
+survive a restart.
+
+Key Features:
+- Named handlers with JSON payloads
+- Worker concurrency limit (TASK_QUEUE_CONCURRENCY)
+- Retries with jittered exponential backoff, then marked failed
+- Deduplication by key: enqueueing a pending key returns the existing job
+- Callers can await a job (e.g. a request that needs its result after all)
+- Optional persistence (TASK_QUEUE_PATH) with leases, so a crashed worker's
+  jobs are picked up by another process
+- Graceful drain on shutdown: due jobs finish, the rest stay persisted
+- Queue depth, running jobs and outcomes in metrics
+
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional, Dict, Any, Callable, Awaitable, List
+
+from .metrics import metrics
+from .resilience import RetryPolicy
+
+TASK_QUEUE_CONCURRENCY = int(os.getenv("TASK_QUEUE_CONCURRENCY", "4"))
+TASK_QUEUE_MAX_ATTEMPTS = int(os.getenv("TASK_QUEUE_MAX_ATTEMPTS", "5"))
+# SQLite file for persisted jobs; empty keeps everything in memory
+TASK_QUEUE_PATH = os.getenv("TASK_QUEUE_PATH", "")
+TASK_QUEUE_DRAIN_SECONDS = float(os.getenv("TASK_QUEUE_DRAIN_SECONDS", "10"))
+
+# A persisted job not renewed for this long is considered abandoned
+LEASE_SECONDS = 120.0
+
+Handler = Callable[..., Awaitable[Any]]
+
+class Job:
+    def __init__(
+        self,
+        name: str,
+        payload: Dict[str, Any],
+        key: Optional[str] = None,
+        max_attempts: int = TASK_QUEUE_MAX_ATTEMPTS,
+        run_at: Optional[float] = None,
+        persist: bool = False,
+        job_id: Optional[str] = None,
+        attempts: int = 0
+    ):
+        self.id = job_id or uuid.uuid4().hex
+        self.name = name
+        self.payload = payload
+        self.key = key
+        self.max_attempts = max_attempts
+        self.run_at = run_at or time.time()
+        self.persist = persist
+        self.attempts = attempts
+        self.status = "pending"  # pending, running, completed or failed
+        self.error: Optional[str] = None
+        self.result: Any = None
+        self._done = asyncio.Event()
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the job completed or failed; False on timeout"""
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+class SQLiteTaskStore:
+    """Persisted jobs in their own SQLite file (kept apart from the chat database's write lock)"""
+
+    def __init__(self, path: str, lease_seconds: float = LEASE_SECONDS):
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, name TEXT NOT NULL, payload TEXT NOT NULL, key TEXT, "
+            "attempts INTEGER NOT NULL, max_attempts INTEGER NOT NULL, run_at REAL NOT NULL, "
+            "status TEXT NOT NULL, error TEXT, leased_until REAL NOT NULL)"
+        )
+
+    def add(self, job: Job):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.name, json.dumps(job.payload), job.key, job.attempts, job.max_attempts,
+                 job.run_at, job.status, job.error, time.time() + self.lease_seconds)
+            )
+
+    def update(self, job: Job):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET attempts = ?, run_at = ?, status = ?, error = ? WHERE id = ?",
+                (job.attempts, job.run_at, job.status, job.error, job.id)
+            )
+
+    def remove(self, job_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def renew(self, job_ids: List[str]):
+        """Extend the lease on jobs this process still holds"""
+        if not job_ids:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET leased_until = ? WHERE id = ?",
+                [(time.time() + self.lease_seconds, job_id) for job_id in job_ids]
+            )
+
+    def claim(self) -> List[Job]:
+        """Take over unfinished jobs whose lease ran out (e.g. their process exited)"""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "UPDATE jobs SET leased_until = ? WHERE status IN ('pending', 'running') AND leased_until < ? "
+                "RETURNING id, name, payload, key, attempts, max_attempts, run_at",
+                (now + self.lease_seconds, now)
+            ).fetchall()
+        return [
+            Job(name, json.loads(payload), key=key, max_attempts=max_attempts, run_at=run_at,
+                persist=True, job_id=job_id, attempts=attempts)
+            for job_id, name, payload, key, attempts, max_attempts, run_at in rows
+        ]
+
+    def release(self, job_ids: List[str]):
+        """Give jobs back on shutdown, so the next process to start picks them up"""
+        if not job_ids:
+            return
+        with self._lock:
+            self._conn.executemany("UPDATE jobs SET leased_until = 0 WHERE id = ?", [(job_id,) for job_id in job_ids])
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+class TaskQueue:
+    def __init__(
+        self,
+        concurrency: int = TASK_QUEUE_CONCURRENCY,
+        store: Optional[SQLiteTaskStore] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        drain_seconds: float = TASK_QUEUE_DRAIN_SECONDS
+    ):
+        self.concurrency = concurrency
+        self.store = store
+        self.retry_policy = retry_policy or RetryPolicy(attempts=TASK_QUEUE_MAX_ATTEMPTS, base_delay=1.0, max_delay=60.0)
+        self.drain_seconds = drain_seconds
+        self.handlers: Dict[str, Handler] = {}
+        self.accepting = True
+        self.running = 0
+        self._heap: List[tuple] = []
+        self._sequence = itertools.count()
+        self._jobs: Dict[str, Job] = {}  # unfinished jobs by id
+        self._keys: Dict[str, Job] = {}
+        self._workers: List[asyncio.Task] = []
+        self._maintainer: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop = None
+
+    def register(self, name: str, handler: Handler):
+        """Run handler(**payload) for jobs of this name"""
+        self.handlers[name] = handler
+
+    def find(self, key: str) -> Optional[Job]:
+        return self._keys.get(key)
+
+    def enqueue(
+        self,
+        name: str,
+        payload: Optional[Dict[str, Any]] = None,
+        key: Optional[str] = None,
+        delay: float = 0.0,
+        persist: bool = False,
+        max_attempts: Optional[int] = None
+    ) -> Job:
+        if name not in self.handlers:
+            raise ValueError(f"No handler registered for task {name}")
+        self._ensure_started()
+        if key and key in self._keys:
+            return self._keys[key]
+
+        job = Job(
+            name, payload or {}, key=key, max_attempts=max_attempts or self.retry_policy.attempts,
+            run_at=time.time() + delay, persist=persist and self.store is not None
+        )
+        if not self.accepting:
+            # Shutting down: persisted jobs wait for the next start, the rest are dropped
+            if job.persist:
+                self.store.add(job)
+                self.store.release([job.id])
+            else:
+                print(f"Task queue is draining, dropped task {name}")
+            metrics.inc("task_queue.rejected")
+            return job
+
+        if job.persist:
+            self.store.add(job)
+        self._push(job)
+        metrics.inc("task_queue.enqueued")
+        return job
+
+    def _push(self, job: Job):
+        self._jobs[job.id] = job
+        if job.key:
+            self._keys[job.key] = job
+        heapq.heappush(self._heap, (job.run_at, next(self._sequence), job))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _forget(self, job: Job):
+        self._jobs.pop(job.id, None)
+        if job.key and self._keys.get(job.key) is job:
+            del self._keys[job.key]
+
+    # --- Workers --------------------------------------------------------------
+
+    def _ensure_started(self):
+        """Start workers on first use within a running loop (tests and scripts skip the lifespan)"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # queued until start() is called from the app's loop
+        if self._loop is not loop and self.accepting:
+            self.start()
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+        self._loop = loop
+        self.accepting = True
+        self._wakeup = asyncio.Event()
+        if self.store is not None:
+            for job in self.store.claim():
+                if job.id not in self._jobs:
+                    self._push(job)
+            self._maintainer = asyncio.create_task(self._maintain())
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def _next(self) -> Job:
+        while True:
+            now = time.time()
+            if self._heap and self._heap[0][0] <= now:
+                return heapq.heappop(self._heap)[2]
+            timeout = self._heap[0][0] - now if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self):
+        while True:
+            job = await self._next()
+            self.running += 1
+            try:
+                await self._run(job)
+            finally:
+                self.running -= 1
+
+    async def _run(self, job: Job):
+        handler = self.handlers.get(job.name)
+        job.status = "running"
+        job.attempts += 1
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for task {job.name}")
+            job.result = await handler(**job.payload)
+        except asyncio.CancelledError:
+            # Drain timed out mid-job: it runs again after the restart (if persisted)
+            job.status = "pending"
+            raise
+        except Exception as e:
+            job.error = str(e)
+            if job.attempts < job.max_attempts:
+                job.status = "pending"
+                job.run_at = time.time() + self.retry_policy.backoff(job.attempts)
+                print(f"Task {job.name} failed (attempt {job.attempts}), retrying: {e}")
+                metrics.inc("task_queue.retried")
+                if job.persist:
+                    self.store.update(job)
+                heapq.heappush(self._heap, (job.run_at, next(self._sequence), job))
+                return
+            print(f"Task {job.name} failed after {job.attempts} attempts: {e}")
+            job.status = "failed"
+            metrics.inc("task_queue.failed")
+            if job.persist:
+                # Kept for inspection
+                self.store.update(job)
+        else:
+            job.status = "completed"
+            metrics.inc("task_queue.completed")
+            if job.persist:
+                self.store.remove(job.id)
+        self._forget(job)
+        job._done.set()
+
+    async def _maintain(self):
+        """Renew leases on our jobs and adopt abandoned ones"""
+        while True:
+            await asyncio.sleep(self.store.lease_seconds / 3)
+            try:
+                self.store.renew([job.id for job in self._jobs.values() if job.persist])
+                for job in self.store.claim():
+                    if job.id not in self._jobs:
+                        self._push(job)
+            except Exception as e:
+                print(f"Task queue maintenance failed: {e}")
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Stop taking jobs, let due and running ones finish, then stop the workers"""
+        self.accepting = False
+        deadline = time.monotonic() + (self.drain_seconds if timeout is None else timeout)
+        # Retries scheduled for later are left for the next start
+        while (self.running or (self._heap and self._heap[0][0] <= time.time())) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        tasks = self._workers + ([self._maintainer] if self._maintainer else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Stays closed to new jobs until start() is called again
+        self._workers, self._maintainer, self._loop = [], None, None
+
+        unfinished = [job for job in self._jobs.values() if job.persist]
+        if self.store is not None:
+            self.store.release([job.id for job in unfinished])
+        if self._jobs:
+            print(f"Task queue stopped with {len(self._jobs)} unfinished jobs ({len(unfinished)} persisted)")
+        self._heap.clear()
+        self._jobs.clear()
+        self._keys.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            "queued": len(self._heap),
+            "running": self.running,
+            "workers": len(self._workers),
+            "concurrency": self.concurrency,
+        }
+        if self.store is not None:
+            stats["persisted_failed"] = self.store.count("failed")
+        return stats
+
+task_queue = TaskQueue(store=SQLiteTaskStore(TASK_QUEUE_PATH) if TASK_QUEUE_PATH else None)
+
+metrics.register_collector("task_queue", task_queue.stats)
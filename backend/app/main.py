@@ -12,9 +12,15 @@ Features:
 - API documentation setup
 - Error handlers
 - Security middleware
+- Request deadlines for upstream calls
+- Negotiated gzip/brotli response compression
+- Optional per-request SQL query counting and slow-query logging
+- Lifespan-managed background jobs (task queue workers, retention and compaction)
+- Event loop stall watchdog in debug mode
 
 """
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
@@ -22,13 +28,40 @@ import os
 
 load_dotenv()
 
-from .api import messages, auth, yelp
+from .api import messages, auth, yelp, metrics
 from .core.database import engine
+from .core.resilience import DeadlineMiddleware
+from .core.compression import CompressionMiddleware
+from .core.query_profiler import QueryProfilerMiddleware, QUERY_PROFILER_ENABLED
 from .models import database_models
+from .core.migrations import run_migrations
+from .services.search import install_search_index
+from .services.retention import retention
+from .core.task_queue import task_queue
+from .core.profiler import loop_watchdog, LOOP_WATCHDOG_ENABLED
 
 database_models.Base.metadata.create_all(bind=engine)
+install_search_index(engine)
+run_migrations(engine)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if LOOP_WATCHDOG_ENABLED:
+        loop_watchdog.start()
+    task_queue.start()
+    retention.start()
+    yield
+    await retention.stop()
+    # Lets queued work (snapshot captures, thread setup) finish before exit
+    await task_queue.drain()
+    await loop_watchdog.stop()
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(CompressionMiddleware)
+if QUERY_PROFILER_ENABLED:
+    app.add_middleware(QueryProfilerMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -41,6 +74,7 @@ app.add_middleware(
 app.include_router(messages.router, prefix="/api/messages", tags=["messages"])
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(yelp.router, prefix="/api/yelp", tags=["yelp"])
+app.include_router(metrics.router, prefix="/api/metrics", tags=["metrics"])
 
 @app.get("/")
 async def root():
@@ -8,23 +8,36 @@ Models:
 - User: Stores Google user information
 - Conversation: Manages chat conversations
 - Message: Stores chat messages with restaurant data
+- ConversationSummary: Rolling summary of older conversation turns
+- ConversationArchive: Where an archived conversation's messages are stored
+- PooledThread: Pre-created, pre-greeted OpenAI thread waiting for a conversation
+- RestaurantSearch: Structured restaurant search shown with a bot message
+- YelpSnapshot: Businesses a restaurant search resolved to, stored with the message
 - 
 Key Features:
 - User-Conversation relationship
 - Message-Conversation relationship
-- Restaurant search data serialization
+- Database-level ON DELETE CASCADE (children are never loaded just to be deleted)
+- Structured restaurant search columns (queryable, no JSON decoding)
+- Stored Yelp result snapshots, so old conversations render without Yelp calls
+- Archived conversations keep their row; messages move to compressed files
 - Timestamp handling
 - Conversation state tracking
+- Conversation updated_at touched on every message change (drives ETags)
 
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from datetime import datetime, timezone
 import json
 
 from ..core.database import Base
 
+def utcnow():
+    return datetime.now(timezone.utc)
+
 class User(Base):
     __tablename__ = "users"
 
@@ -41,39 +54,146 @@ class Conversation(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, default="New Conversation")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Set in Python for sub-second precision: it is part of the conversation's ETag
+    updated_at = Column(DateTime(timezone=True), onupdate=utcnow)
     is_active = Column(Boolean, default=True)
     is_new = Column(Boolean, default=True)
     thread_id = Column(String, unique=True, nullable=True)
     user_id = Column(String, ForeignKey("users.id"))
-    messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
+    messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan", passive_deletes=True)
+    summary = relationship("ConversationSummary", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+    archive = relationship("ConversationArchive", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
     user = relationship("User", back_populates="conversations")
 
+    @classmethod
+    def touch(cls, db, conversation_id: int):
+        """Mark a conversation as changed when only its messages were"""
+        db.query(cls).filter(cls.id == conversation_id).update({cls.updated_at: utcnow()}, synchronize_session=False)
+
 class Message(Base):
     __tablename__ = "messages"
 
     id = Column(Integer, primary_key=True, index=True)
-    conversation_id = Column(Integer, ForeignKey("conversations.id"))
+    conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), index=True)
     content = Column(String, nullable=False)
     sender = Column(String, nullable=False)  # 'user' or 'bot'
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
     is_edited = Column(Boolean, default=False)
-    restaurant_search = Column(Text, nullable=True)
+    # Pre-migration JSON text; new searches live in restaurant_searches
+    legacy_restaurant_search = Column("restaurant_search", Text, nullable=True)
     
     conversation = relationship("Conversation", back_populates="messages")
+    search = relationship("RestaurantSearch", uselist=False, lazy="selectin", cascade="all, delete-orphan", passive_deletes=True)
+    snapshot = relationship("YelpSnapshot", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
 
     def load_restaurant_search(self):
-        """Simple load - if there's data, parse it. If not, return None."""
-        if not self.restaurant_search:
+        """Search parameters as a dict, or None if this message has no search"""
+        if self.search is not None:
+            return self.search.to_dict()
+        if not self.legacy_restaurant_search:
             return None
         try:
-            return json.loads(self.restaurant_search)
+            return json.loads(self.legacy_restaurant_search)
         except:
             return None
 
     def save_restaurant_search(self, data):
-        """Simple save - if there's data, save it. If not, set to None."""
-        if data is not None:
-            self.restaurant_search = json.dumps(data)
+        """Store search parameters in structured columns (None removes the search)"""
+        self.legacy_restaurant_search = None
+        if data is None:
+            self.search = None
+        elif self.search is not None:
+            self.search.update_from_dict(data)
         else:
-            self.restaurant_search = None
\ No newline at end of file
+            self.search = RestaurantSearch.from_dict(data)
+
+    @property
+    def restaurant_search(self):
+        return self.load_restaurant_search()
+
+    @restaurant_search.setter
+    def restaurant_search(self, data):
+        self.save_restaurant_search(json.loads(data) if isinstance(data, str) else data)
+
+class RestaurantSearch(Base):
+    __tablename__ = "restaurant_searches"
+
+    FIELDS = ("term", "location", "price", "k", "sort_by")
+
+    id = Column(Integer, primary_key=True)
+    message_id = Column(Integer, ForeignKey("messages.id", ondelete="CASCADE"), unique=True, nullable=False)
+    term = Column(String, nullable=True)
+    location = Column(String, nullable=True)
+    price = Column(String, nullable=True)
+    k = Column(Integer, nullable=True)
+    sort_by = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # "Top searched cuisines per city"
+    __table_args__ = (Index("ix_restaurant_searches_location_term", "location", "term"),)
+
+    @classmethod
+    def clean(cls, data: dict) -> dict:
+        values = {field: data.get(field) for field in cls.FIELDS}
+        try:
+            values["k"] = int(values["k"]) if values["k"] is not None else None
+        except (TypeError, ValueError):
+            values["k"] = None
+        return values
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RestaurantSearch":
+        return cls(**cls.clean(data))
+
+    def update_from_dict(self, data: dict):
+        for field, value in self.clean(data).items():
+            setattr(self, field, value)
+
+    def to_dict(self) -> dict:
+        # Same shape as the search_restaurants tool arguments: unset fields are omitted
+        return {field: getattr(self, field) for field in self.FIELDS if getattr(self, field) is not None}
+
+class YelpSnapshot(Base):
+    __tablename__ = "yelp_snapshots"
+
+    id = Column(Integer, primary_key=True)
+    message_id = Column(Integer, ForeignKey("messages.id", ondelete="CASCADE"), unique=True, nullable=False)
+    businesses = Column(Text, nullable=False, default="[]")  # compact JSON list
+    fetched_at = Column(DateTime(timezone=True), nullable=False)
+
+    def load_businesses(self) -> list:
+        try:
+            return json.loads(self.businesses or "[]")
+        except ValueError:
+            return []
+
+    def save_businesses(self, businesses: list):
+        self.businesses = json.dumps(businesses, separators=(",", ":"))
+
+class ConversationSummary(Base):
+    __tablename__ = "conversation_summaries"
+
+    conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), primary_key=True)
+    summary = Column(Text, nullable=False, default="")
+    summarized_through_id = Column(Integer, nullable=False, default=0)  # last message folded into the summary
+    token_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class ConversationArchive(Base):
+    __tablename__ = "conversation_archives"
+
+    conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(String, nullable=False, index=True)
+    # Gzip member at [offset, offset + length) of the user's archive file
+    path = Column(String, nullable=False)
+    offset = Column(Integer, nullable=False)
+    length = Column(Integer, nullable=False)
+    message_count = Column(Integer, nullable=False, default=0)
+    archived_at = Column(DateTime(timezone=True), nullable=False, default=utcnow)
+
+class PooledThread(Base):
+    __tablename__ = "pooled_threads"
+
+    thread_id = Column(String, primary_key=True)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utcnow)
@@ -9,6 +9,7 @@ Models:
 - MessageCreate/Update: Input validation
 - Message: Complete message representation
 - Conversation: Conversation management
+- BulkDeleteRequest: Deleting several conversations at once
 - UserBase: User data validation
 
 Features:
@@ -94,6 +95,10 @@ class Conversation(ConversationBase):
     class Config:
         from_attributes = True
 
+class BulkDeleteRequest(BaseModel):
+    conversation_ids: Optional[List[int]] = None
+    all: bool = False
+
 class ConversationWithMessages(Conversation):
     messages: List[Message]
 
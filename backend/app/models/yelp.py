@@ -0,0 +1,16 @@
+"""
+yelp.py
+
+Pydantic models for Yelp proxy requests.
+
+Models:
+- BusinessBatchRequest: Details (and optionally reviews) for several businesses at once
+
+"""
+
+from typing import List
+from pydantic import BaseModel
+
+class BusinessBatchRequest(BaseModel):
+    ids: List[str]
+    reviews: bool = True
@@ -0,0 +1,175 @@
+"""
+admission.py
+
+Admission control for reply streams.
+Caps how many replies run at once so one user cannot start parallel runs
+on the same thread and the process stays within upstream rate limits.
+
+Key Features:
+- Per-user and per-conversation concurrency limits
+- Global token bucket matched to the upstream request quota
+- Bounded wait queue with a wait timeout
+- Retry-After estimate for rejected requests
+- Queue depth and admission counters in metrics
+
+"""
+
+import asyncio
+import math
+import os
+import time
+from typing import Dict, Any
+
+from ..core.metrics import metrics
+
+STREAM_MAX_PER_USER = int(os.getenv("STREAM_MAX_PER_USER", "2"))
+STREAM_MAX_PER_CONVERSATION = int(os.getenv("STREAM_MAX_PER_CONVERSATION", "1"))
+STREAM_RATE_PER_MINUTE = float(os.getenv("STREAM_RATE_PER_MINUTE", "120"))
+STREAM_BURST = int(os.getenv("STREAM_BURST", "10"))
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "50"))
+STREAM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("STREAM_QUEUE_TIMEOUT_SECONDS", "10"))
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: int, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated_at = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_take(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        """Seconds until the next token is available"""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+class Permit:
+    """One admitted reply; release it when the reply finishes"""
+
+    def __init__(self, controller: "AdmissionController", user_id: str, conversation_id: int):
+        self.controller = controller
+        self.user_id = user_id
+        self.conversation_id = conversation_id
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_per_user: int = STREAM_MAX_PER_USER,
+        max_per_conversation: int = STREAM_MAX_PER_CONVERSATION,
+        rate_per_minute: float = STREAM_RATE_PER_MINUTE,
+        burst: int = STREAM_BURST,
+        queue_size: int = STREAM_QUEUE_SIZE,
+        queue_timeout: float = STREAM_QUEUE_TIMEOUT_SECONDS,
+        clock=time.monotonic
+    ):
+        self.max_per_user = max_per_user
+        self.max_per_conversation = max_per_conversation
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.clock = clock
+        self.bucket = TokenBucket(rate_per_minute / 60, burst, clock)
+        self.waiting = 0
+        self.active = 0
+        self._by_user: Dict[str, int] = {}
+        self._by_conversation: Dict[int, int] = {}
+        self._wakeup = asyncio.Event()
+
+    def _has_slot(self, user_id: str, conversation_id: int) -> bool:
+        return (
+            self._by_user.get(user_id, 0) < self.max_per_user
+            and self._by_conversation.get(conversation_id, 0) < self.max_per_conversation
+        )
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(min(self.bucket.wait_time(), self.queue_timeout)))
+
+    def _admit(self, user_id: str, conversation_id: int) -> Permit:
+        self.active += 1
+        self._by_user[user_id] = self._by_user.get(user_id, 0) + 1
+        self._by_conversation[conversation_id] = self._by_conversation.get(conversation_id, 0) + 1
+        metrics.inc("admission.admitted")
+        return Permit(self, user_id, conversation_id)
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        metrics.inc("admission.rejected")
+        print(f"Admission rejected: {reason}")
+        return AdmissionRejected(reason, self._retry_after())
+
+    async def acquire(self, user_id: str, conversation_id: int) -> Permit:
+        """Wait for a slot and a rate token, or raise AdmissionRejected"""
+        if self.waiting == 0 and self._has_slot(user_id, conversation_id) and self.bucket.try_take():
+            return self._admit(user_id, conversation_id)
+
+        if self.waiting >= self.queue_size:
+            raise self._reject("wait queue is full")
+
+        self.waiting += 1
+        metrics.set_gauge("admission.queue_depth", self.waiting)
+        deadline = self.clock() + self.queue_timeout
+        try:
+            while True:
+                wait = deadline - self.clock()
+                if self._has_slot(user_id, conversation_id):
+                    if self.bucket.try_take():
+                        return self._admit(user_id, conversation_id)
+                    wait = min(wait, self.bucket.wait_time())
+
+                if deadline - self.clock() <= 0:
+                    raise self._reject("timed out waiting for a slot")
+
+                wakeup = self._wakeup
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=max(wait, 0))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.waiting -= 1
+            metrics.set_gauge("admission.queue_depth", self.waiting)
+
+    def _release(self, permit: Permit):
+        self.active -= 1
+        for counts, key in ((self._by_user, permit.user_id), (self._by_conversation, permit.conversation_id)):
+            counts[key] -= 1
+            if counts[key] <= 0:
+                del counts[key]
+        # Wake every waiter; each one re-checks its own limits
+        wakeup, self._wakeup = self._wakeup, asyncio.Event()
+        wakeup.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "queue_size": self.queue_size,
+            "tokens": round(self.bucket.tokens, 2),
+        }
+
+admission = AdmissionController()
+metrics.register_collector("admission", admission.stats)
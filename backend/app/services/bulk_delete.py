@@ -0,0 +1,159 @@
+"""
+bulk_delete.py
+
+Deleting many conversations at once.
+Small deletions run inline; anything with a large message history becomes
+a background job that removes messages in chunks, so one request never
+holds the database write lock for the whole history.
+
+Key Features:
+- Database-level ON DELETE CASCADE does the per-row work (no ORM loading)
+- Chunked message deletes with a short pause between chunks
+- Job status (total and deleted message counts) for polling
+- Conversation list deltas published once each conversation is gone
+- Finished jobs are kept for a while, then pruned
+- Deleted conversation and message counts in metrics
+
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from typing import Optional, List, Dict, Any
+
+from sqlalchemy import text, bindparam
+
+from ..core.database import SessionLocal
+from ..core.metrics import metrics
+from ..core.offload import run_sync
+from ..models.database_models import Conversation as ConversationModel, Message as MessageModel
+from .conversation_events import conversation_events
+
+BULK_DELETE_CHUNK_SIZE = int(os.getenv("BULK_DELETE_CHUNK_SIZE", "500"))
+# Up to this many messages are deleted within the request
+BULK_DELETE_INLINE_LIMIT = int(os.getenv("BULK_DELETE_INLINE_LIMIT", "2000"))
+BULK_DELETE_PAUSE_SECONDS = float(os.getenv("BULK_DELETE_PAUSE_SECONDS", "0.05"))
+
+# Finished jobs stay visible to pollers for this long
+JOB_RETENTION_SECONDS = 3600
+
+class BulkDeleteJob:
+    def __init__(self, user_id: str, conversation_ids: List[int], total_messages: int):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.conversation_ids = conversation_ids
+        self.total_messages = total_messages
+        self.deleted_messages = 0
+        self.status = "pending"  # pending, running, completed or failed
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "conversations": len(self.conversation_ids),
+            "total_messages": self.total_messages,
+            "deleted_messages": self.deleted_messages,
+            "error": self.error,
+        }
+
+class BulkDeleter:
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        chunk_size: int = BULK_DELETE_CHUNK_SIZE,
+        inline_limit: int = BULK_DELETE_INLINE_LIMIT,
+        pause_seconds: float = BULK_DELETE_PAUSE_SECONDS
+    ):
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size
+        self.inline_limit = inline_limit
+        self.pause_seconds = pause_seconds
+        self.jobs: Dict[str, BulkDeleteJob] = {}
+        self._tasks: set = set()
+
+    def resolve(self, user_id: str, conversation_ids: Optional[List[int]] = None) -> List[int]:
+        """The user's conversations among conversation_ids (all of them if None)"""
+        with self.session_factory() as db:
+            query = db.query(ConversationModel.id).filter(ConversationModel.user_id == user_id)
+            if conversation_ids is not None:
+                query = query.filter(ConversationModel.id.in_(conversation_ids))
+            return [row[0] for row in query.order_by(ConversationModel.id).all()]
+
+    def count_messages(self, conversation_ids: List[int]) -> int:
+        if not conversation_ids:
+            return 0
+        with self.session_factory() as db:
+            return db.query(MessageModel).filter(MessageModel.conversation_id.in_(conversation_ids)).count()
+
+    def _delete_message_chunk(self, conversation_ids: List[int]) -> int:
+        # Searches, snapshots and the search index go with each message (cascade and triggers)
+        statement = text(
+            "DELETE FROM messages WHERE id IN ("
+            "SELECT id FROM messages WHERE conversation_id IN :ids LIMIT :limit)"
+        ).bindparams(bindparam("ids", expanding=True))
+        with self.session_factory() as db:
+            result = db.execute(statement, {"ids": conversation_ids, "limit": self.chunk_size})
+            db.commit()
+            return result.rowcount
+
+    def _delete_conversations(self, conversation_ids: List[int]):
+        with self.session_factory() as db:
+            db.query(ConversationModel).filter(ConversationModel.id.in_(conversation_ids)).delete(synchronize_session=False)
+            db.commit()
+
+    async def _finish(self, user_id: str, conversation_ids: List[int]):
+        await run_sync(self._delete_conversations, conversation_ids)
+        metrics.inc("bulk_delete.conversations", len(conversation_ids))
+        for conversation_id in conversation_ids:
+            await conversation_events.publish(user_id, "deleted", {"id": conversation_id})
+
+    async def delete_now(self, user_id: str, conversation_ids: List[int]) -> int:
+        """Delete within the caller; returns the number of conversations removed"""
+        if conversation_ids:
+            await self._finish(user_id, conversation_ids)
+        return len(conversation_ids)
+
+    async def run(self, job: BulkDeleteJob):
+        job.status = "running"
+        try:
+            while True:
+                deleted = await run_sync(self._delete_message_chunk, job.conversation_ids)
+                job.deleted_messages += deleted
+                metrics.inc("bulk_delete.messages", deleted)
+                if deleted < self.chunk_size:
+                    break
+                # Let other writers in between chunks
+                await asyncio.sleep(self.pause_seconds)
+            await self._finish(job.user_id, job.conversation_ids)
+            job.status = "completed"
+        except Exception as e:
+            print(f"Bulk delete job {job.id} failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+            metrics.inc("bulk_delete.failed")
+        finally:
+            job.finished_at = time.time()
+
+    def start(self, user_id: str, conversation_ids: List[int], total_messages: int) -> BulkDeleteJob:
+        self._prune()
+        job = BulkDeleteJob(user_id, conversation_ids, total_messages)
+        self.jobs[job.id] = job
+        task = asyncio.create_task(self.run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, user_id: str, job_id: str) -> Optional[BulkDeleteJob]:
+        job = self.jobs.get(job_id)
+        return job if job and job.user_id == user_id else None
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+bulk_deleter = BulkDeleter()
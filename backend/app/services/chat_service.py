@@ -12,128 +12,265 @@ Key Features:
 - Assistant initialization
 - Error handling and recovery
 - User context preservation
+- Pluggable engines (Assistants threads or Chat Completions)
+- Circuit breaker and retries for idempotent OpenAI calls
+- Threads prepared (and greeted) in the background when a conversation is created
+- Per-user pool of pre-greeted threads, so a first message skips thread setup
+- User message sent with the run request (additional_messages, or create_and_run for a new thread)
+- Assistant bootstrap on the task queue instead of at import time
+- Sync OpenAI client and database calls run on the offload pool
 
 """
 
 from openai import OpenAI
 import os
-from typing import List, Dict
+from typing import List, Dict, Optional
 from fastapi.responses import StreamingResponse
+from sqlalchemy import exists
 from ..models.database_models import Message as MessageModel, Conversation as ConversationModel, User as UserModel
+from .prompts import ASSISTANT_NAME, ASSISTANT_INSTRUCTIONS, SEARCH_RESTAURANTS_TOOL, personal_greeting
+from ..core.resilience import RetryPolicy, NO_RETRY, call_with_retry, get_breaker
+from ..core.database import SessionLocal
+from ..core.task_queue import task_queue
+from ..core.offload import run_sync
+from .thread_pool import thread_pool
 import json
 import asyncio
+import anyio
 
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
+OPENAI_MAX_ATTEMPTS = int(os.getenv("OPENAI_MAX_ATTEMPTS", "3"))
+
+# Retries are handled by openai_retry below, and only for idempotent calls
 client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY")
+    api_key=os.getenv("OPENAI_API_KEY"),
+    timeout=OPENAI_TIMEOUT_SECONDS,
+    max_retries=0
 )
 
-class ChatService:
-    def __init__(self):
+openai_breaker = get_breaker("openai")
+openai_retry = RetryPolicy(attempts=OPENAI_MAX_ATTEMPTS)
+
+# "assistants" (remote threads) or "completions" (local history)
+CHAT_ENGINE = os.getenv("CHAT_ENGINE", "assistants")
+
+# How long a first message waits for its conversation's thread to finish preparing
+THREAD_PREPARE_WAIT_SECONDS = float(os.getenv("THREAD_PREPARE_WAIT_SECONDS", "5"))
+
+class AssistantsEngine:
+    def __init__(self, client: OpenAI = client):
+        self.client = client
         self.assistant_id = os.getenv("OPENAI_ASSISTANT_ID")
+        task_queue.register("bootstrap_assistant", self.bootstrap_assistant)
+        task_queue.register("prepare_thread", self.prepare_thread)
+        task_queue.register("fill_thread_pool", self.fill_thread_pool)
         if not self.assistant_id:
-            assistant = client.beta.assistants.create(
-                name="Restaurant Assistant",
-                instructions="""You are Chef Ava, a helpful restaurant assistant. Help users find restaurants and answer questions about food and dining.
-                When users ask about specific restaurants or cuisines, use the search_restaurants function to find relevant options.
-                
-                Important notes about restaurant search functionality:
-                - The search_restaurants function will display restaurant cards in the chat interface automatically
-                - Each restaurant card shows the name, rating, reviews, photos, price level, hours, and location
-                - Users can click on restaurant cards to visit their Yelp pages
-                - No need to describe restaurant details that are already visible in the cards
-                - Focus on providing context, recommendations, and insights about the restaurants shown
-                
-                Guidelines for restaurant searches:
-                - Use between 1-5 results (k parameter) depending on how many restaurants you assume the user wants to see.
-                - Always include relevant search parameters like cuisine, price range, etc.
-                - Important! Be mindful that you will send this query to Yelp's search bar, do not just input anything there like 'romantic restaurant' if the user asked for a great date place. Instead use your own judgement to decide what type of restaurants would be good for dates, and search that there instead, like 'fancy italian', for example. Usually you want one or 2 adjectives and a cuisine type like style search queries.
-                - Location can be specified by city or address
-                
-                Remember to:
-                - Maintain a natural conversation while leveraging the visual restaurant cards
-                - Refer to people by first name only
-                - Provide thoughtful recommendations and local insights
-                - Keep responses focused and concise since details are in the cards""",
-                tools=[{
-                    "type": "function",
-                    "function": {
-                        "name": "search_restaurants",
-                        "description": "Search for restaurants and display the results as cards in chat",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "term": {
-                                    "type": "string",
-                                    "description": "Search term for Yelp search bar (e.g. cuisine type, restaurant name, etc)"
-                                },
-                                "location": {
-                                    "type": "string",
-                                    "description": "Location to search in (city, address, etc) - Cannot be just a country name, needs to be a city or address. For best results, use 'Atlanta, GA' format for US cities and 'São Paulo, Brazil' type format for international. City and State vs City and Country. Use the exact spellings of the city and country name with the accents."
-                                },
-                                "price": {
-                                    "type": "string",
-                                    "description": "Price level (1-4 dollar signs)",
-                                    "enum": ["$", "$$", "$$$", "$$$$"]
-                                },
-                                "k": {
-                                    "type": "integer",
-                                    "description": "Number of results to show (1-5)",
-                                    "minimum": 1,
-                                    "maximum": 5
-                                },
-                                "sort_by": {
-                                    "type": "string",
-                                    "description": "How to sort search results (always use best_match, unless the user explicitly asks to sort by distance/rating/review_count, like: give me the 3 closes restaurants to my address here, but if they say give me the 3 best restaurants, always use best_match).",
-                                    "enum": ["best_match", "review_count", "distance"]
-                                }
-                            },
-                            "required": ["term", "k"]
-                        }
-                    }
-                }],
-                model="gpt-4o"
-            )
-            self.assistant_id = assistant.id
-            print(f"Created new assistant with ID: {self.assistant_id}")
+            # Created in the background instead of blocking startup
+            task_queue.enqueue("bootstrap_assistant", key="bootstrap_assistant")
 
-    async def get_streaming_response(self, conversation_id: int, thread_id: str, message: str, db=None) -> StreamingResponse:
+    async def bootstrap_assistant(self):
+        if self.assistant_id:
+            return
+        assistant = await self._call(
+            self.client.beta.assistants.create,
+            name=ASSISTANT_NAME,
+            instructions=ASSISTANT_INSTRUCTIONS,
+            tools=[SEARCH_RESTAURANTS_TOOL],
+            model="gpt-4o"
+        )
+        self.assistant_id = assistant.id
+        print(f"Created new assistant with ID: {self.assistant_id}")
+
+    async def ensure_assistant(self):
+        """Wait for the background bootstrap if the assistant doesn't exist yet"""
+        if self.assistant_id:
+            return
+        job = task_queue.enqueue("bootstrap_assistant", key="bootstrap_assistant")
+        await job.wait(OPENAI_TIMEOUT_SECONDS)
+        if not self.assistant_id:
+            raise RuntimeError("Assistant is not available yet")
+
+    @staticmethod
+    def _greeting(user_name: Optional[str]) -> List[Dict]:
+        return [{"role": "user", "content": personal_greeting(user_name)}] if user_name else []
+
+    async def _new_thread(self, user_name: Optional[str]) -> str:
+        """Create a thread holding the personal greeting in one call"""
+        thread = await self._call(self.client.beta.threads.create, messages=self._greeting(user_name))
+        return thread.id
+
+    def _delete_thread(self, thread_id: str):
         try:
-            if not thread_id:
-                thread = client.beta.threads.create()
-                thread_id = thread.id
-                
-                if db:
-                    conversation = db.query(ConversationModel).filter_by(id=conversation_id).first()
-                    if conversation:
-                        conversation.thread_id = thread_id
-                        user = db.query(UserModel).filter_by(id=conversation.user_id).first()
-                        if user:
-                            client.beta.threads.messages.create(
-                                thread_id=thread_id,
-                                role="user",
-                                content=f"Hello! Just so you know, my name from my Google account is: {user.name}. Please use my name occasionally in our conversation to make it more personal."
-                            )
-                        db.commit()
-
-            # Add the user's message to thread
-            client.beta.threads.messages.create(
-                thread_id=thread_id,
-                role="user",
-                content=message
+            self.client.beta.threads.delete(thread_id=thread_id)
+        except Exception as e:
+            print(f"Error deleting thread {thread_id}: {e}")
+
+    def refill_pool(self, user_id: str):
+        if thread_pool.size > 0:
+            task_queue.enqueue("fill_thread_pool", {"user_id": user_id}, key=f"thread_pool:{user_id}")
+
+    @staticmethod
+    def _user_name(user_id: str) -> Optional[str]:
+        with SessionLocal() as db:
+            user = db.get(UserModel, user_id)
+            return user.name if user else None
+
+    async def fill_thread_pool(self, user_id: str):
+        """Top up the user's pool of greeted threads (and retire old ones)"""
+        for thread_id in await run_sync(thread_pool.take_expired):
+            await run_sync(self._delete_thread, thread_id)
+        user_name = await run_sync(self._user_name, user_id)
+        if not user_name:
+            return
+        for _ in range(await run_sync(thread_pool.missing, user_id)):
+            thread_id = await self._new_thread(user_name)
+            await run_sync(thread_pool.add, user_id, thread_id)
+
+    async def prepare_thread(self, conversation_id: int):
+        """Give a new conversation a greeted thread ahead of its first message, from the pool if possible"""
+        def unprepared_owner():
+            with SessionLocal() as db:
+                conversation = db.get(ConversationModel, conversation_id)
+                if conversation is None or conversation.thread_id:
+                    return None, None
+                user = db.get(UserModel, conversation.user_id)
+                return conversation.user_id, user.name if user else None
+
+        def claim(thread_id: str) -> int:
+            # A turn already answered without a thread (from the response cache) is only
+            # replayed into a thread created by the next message, so don't attach one now
+            answered = exists().where(
+                MessageModel.conversation_id == conversation_id,
+                MessageModel.sender == "bot",
+                MessageModel.content != ""
+            )
+            with SessionLocal() as db:
+                claimed = db.query(ConversationModel)\
+                    .filter(ConversationModel.id == conversation_id, ConversationModel.thread_id.is_(None), ~answered)\
+                    .update({ConversationModel.thread_id: thread_id}, synchronize_session=False)
+                db.commit()
+                return claimed
+
+        user_id, user_name = await run_sync(unprepared_owner)
+        if not user_name:
+            return
+
+        thread_id = await run_sync(thread_pool.take, user_id) or await self._new_thread(user_name)
+        if not await run_sync(claim, thread_id):
+            # The first message got there first; the thread is still good for the next conversation
+            await run_sync(thread_pool.add, user_id, thread_id)
+        self.refill_pool(user_id)
+
+    async def _prepared_thread(self, conversation_id: int, db) -> Optional[str]:
+        """Thread id set by prepare_thread, waiting briefly if it is still running"""
+        job = task_queue.find(f"thread:{conversation_id}")
+        if job is not None:
+            await job.wait(THREAD_PREPARE_WAIT_SECONDS)
+        conversation = await run_sync(db.query(ConversationModel).filter_by(id=conversation_id).first)
+        return conversation.thread_id if conversation else None
+
+    @staticmethod
+    def _thread_seed(db, conversation_id: int, message: str):
+        """(owner id, owner name, earlier turns to replay) for a conversation getting its first thread"""
+        conversation = db.query(ConversationModel).filter_by(id=conversation_id).first() if db else None
+        user = db.query(UserModel).filter_by(id=conversation.user_id).first() if conversation else None
+
+        # Turns answered without a thread (e.g. from the response cache) are replayed into it
+        seed_messages = []
+        if db:
+            prior_messages = (
+                db.query(MessageModel)
+                .filter(MessageModel.conversation_id == conversation_id, MessageModel.content != "")
+                .order_by(MessageModel.id)
+                .all()
             )
+            seed_messages = [
+                {"role": "user" if msg.sender == "user" else "assistant", "content": msg.content}
+                for msg in prior_messages
+            ]
+            if seed_messages and seed_messages[-1] == {"role": "user", "content": message}:
+                seed_messages.pop()
+        return conversation.user_id if conversation else None, user.name if user else None, seed_messages
+
+    @staticmethod
+    def _save_thread_id(db, conversation_id: int, thread_id: str):
+        db.query(ConversationModel).filter_by(id=conversation_id)\
+            .update({ConversationModel.thread_id: thread_id}, synchronize_session=False)
+        db.commit()
+
+    async def _start_new_thread_run(self, conversation_id: int, message: str, db=None):
+        """First run of a conversation with no prepared thread: a pooled thread, else create_and_run"""
+        user_id, user_name, seed_messages = await run_sync(self._thread_seed, db, conversation_id, message)
 
-            # Run the assistant
-            run = client.beta.threads.runs.create(
-                thread_id=thread_id,
-                assistant_id=self.assistant_id
+        thread_id = None
+        if user_name and not seed_messages:
+            thread_id = await run_sync(thread_pool.take, user_id)
+        if thread_id:
+            try:
+                run = await self._start_run(thread_id, message)
+            except Exception:
+                # Still just a greeted thread; the next conversation can use it
+                await run_sync(thread_pool.add, user_id, thread_id)
+                raise
+        else:
+            # Thread, greeting, earlier turns and the message in a single request
+            run = await self._call(
+                self.client.beta.threads.create_and_run,
+                assistant_id=self.assistant_id,
+                thread={"messages": self._greeting(user_name) + seed_messages
+                        + [{"role": "user", "content": message}]}
             )
 
+        if user_id:
+            await run_sync(self._save_thread_id, db, conversation_id, run.thread_id)
+            self.refill_pool(user_id)
+        return run
+
+    async def _start_run(self, thread_id: str, message: str):
+        """Run on an existing thread, posting the user's message with the run request"""
+        return await self._call(
+            self.client.beta.threads.runs.create,
+            thread_id=thread_id,
+            assistant_id=self.assistant_id,
+            additional_messages=[{"role": "user", "content": message}]
+        )
+
+    def cancel_run(self, thread_id: str, run_id: str):
+        """Cancel an in-progress run upstream"""
+        try:
+            self.client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+            print(f"Cancelled run {run_id} on thread {thread_id}")
+        except Exception as e:
+            print(f"Error cancelling run {run_id}: {e}")
+
+    async def _call(self, fn, idempotent: bool = False, **kwargs):
+        """Call the OpenAI API through the breaker; only idempotent calls are retried"""
+        # The client is sync: each request runs on the offload pool
+        return await call_with_retry(
+            lambda: run_sync(fn, **kwargs),
+            breaker=openai_breaker,
+            policy=openai_retry if idempotent else NO_RETRY
+        )
+
+    async def get_streaming_response(self, conversation_id: int, thread_id: str, message: str, db=None) -> StreamingResponse:
+        try:
+            await self.ensure_assistant()
+            if not thread_id and db:
+                thread_id = await self._prepared_thread(conversation_id, db)
+
+            if thread_id:
+                run = await self._start_run(thread_id, message)
+            else:
+                run = await self._start_new_thread_run(conversation_id, message, db)
+                thread_id = run.thread_id
+
             async def generate():
-                accumulated_content = []
-                restaurant_search_data = None
+                run_finished = False
                 try:
                     while True:
-                        run_status = client.beta.threads.runs.retrieve(
+                        run_status = await self._call(
+                            self.client.beta.threads.runs.retrieve,
+                            idempotent=True,
                             thread_id=thread_id,
                             run_id=run.id
                         )
@@ -144,11 +281,11 @@ class ChatService:
                                     try:
                                         params = json.loads(action.function.arguments)
                                         print(f"Restaurant search params: {params}")  # Debug log
-                                        restaurant_search_data = params
                                         yield f"data: {json.dumps({'restaurant_search': params})}\n\n"
                                         
                                         # Submit empty result since we're handling display client-side
-                                        client.beta.threads.runs.submit_tool_outputs(
+                                        await self._call(
+                                            self.client.beta.threads.runs.submit_tool_outputs,
                                             thread_id=thread_id,
                                             run_id=run.id,
                                             tool_outputs=[{
@@ -161,39 +298,22 @@ class ChatService:
                             continue
 
                         if run_status.status == 'completed':
-                            messages = client.beta.threads.messages.list(thread_id=thread_id)
+                            run_finished = True
+                            messages = await self._call(self.client.beta.threads.messages.list, idempotent=True, thread_id=thread_id)
                             latest_message = messages.data[0]
                             
+                            # The caller persists the reply from these events
                             for content_item in latest_message.content:
                                 if hasattr(content_item, 'text'):
                                     content = content_item.text.value
                                     words = content.split(' ')
                                     for word in words:
-                                        accumulated_content.append(word + ' ')
                                         yield f"data: {json.dumps({'content': word + ' '})}\n\n"
                                         await asyncio.sleep(0.05)
-                            
-                            if db:
-                                bot_message = (
-                                    db.query(MessageModel)
-                                    .filter_by(conversation_id=conversation_id)
-                                    .order_by(MessageModel.timestamp.desc())
-                                    .first()
-                                )
-                                if bot_message and bot_message.sender == 'bot':
-                                    print(f"Saving message content: {accumulated_content}")  # Debug log
-                                    print(f"Saving restaurant search data: {restaurant_search_data}")  # Debug log
-                                    bot_message.content = ''.join(accumulated_content).strip()
-                                    bot_message.save_restaurant_search(restaurant_search_data)
-                                    db.commit()
-                                    
-                                    # Verify save
-                                    db.refresh(bot_message)
-                                    loaded_data = bot_message.load_restaurant_search()
-                                    print(f"Verified saved restaurant search data: {loaded_data}")  # Debug log
                             break
                         
                         elif run_status.status in ['failed', 'cancelled', 'expired']:
+                            run_finished = True
                             error_msg = "I apologize, but I had trouble processing your request."
                             yield f"data: {json.dumps({'content': error_msg})}\n\n"
                             break
@@ -208,6 +328,12 @@ class ChatService:
                     yield f"data: {json.dumps({'content': error_msg})}\n\n"
                     yield "data: [DONE]\n\n"
 
+                finally:
+                    # Closed early (client gone): stop the run instead of letting it finish unseen
+                    if not run_finished:
+                        with anyio.CancelScope(shield=True):
+                            await run_sync(self.cancel_run, thread_id, run.id)
+
             return StreamingResponse(
                 generate(),
                 media_type="text/event-stream"
@@ -219,4 +345,36 @@ class ChatService:
                 error_msg = "An error occurred while processing your request."
                 yield f"data: {json.dumps({'content': error_msg})}\n\n"
                 yield "data: [DONE]\n\n"
-            return StreamingResponse(error_stream(), media_type="text/event-stream")
\ No newline at end of file
+            return StreamingResponse(error_stream(), media_type="text/event-stream")
+
+def create_chat_engine(name: str = CHAT_ENGINE):
+    """Create the chat engine selected by name"""
+    if name == "completions":
+        from .completions_engine import CompletionsEngine
+        return CompletionsEngine()
+    if name == "assistants":
+        return AssistantsEngine()
+    raise ValueError(f"Unknown chat engine: {name}")
+
+class ChatService:
+    """Entry point for chat replies; delegates to the configured engine.
+
+    Every engine exposes the same ``get_streaming_response`` coroutine and
+    emits the same SSE events (content, restaurant_search, [DONE]).
+    """
+
+    def __init__(self, engine=None):
+        self.engine = engine or create_chat_engine()
+
+    def prepare_conversation(self, conversation_id: int):
+        """Queue upstream setup for a new conversation, so its first reply starts sooner"""
+        if hasattr(self.engine, "prepare_thread"):
+            task_queue.enqueue("prepare_thread", {"conversation_id": conversation_id}, key=f"thread:{conversation_id}")
+
+    async def get_streaming_response(self, conversation_id: int, thread_id: str, message: str, db=None) -> StreamingResponse:
+        return await self.engine.get_streaming_response(
+            conversation_id=conversation_id,
+            thread_id=thread_id,
+            message=message,
+            db=db
+        )
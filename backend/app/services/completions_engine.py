@@ -0,0 +1,172 @@
+"""
+completions_engine.py
+
+Chat engine that streams OpenAI chat completions directly.
+Builds the prompt from the local messages table instead of an Assistants thread.
+
+Key Features:
+- Single streaming request per reply
+- Prompt built from locally stored history
+- Token-budgeted context with a rolling summary of older turns
+- Same search_restaurants tool as the Assistants engine
+- Same SSE event format as the Assistants engine
+- Retries a failed request before any output was streamed
+
+"""
+
+from openai import AsyncOpenAI
+import os
+from typing import List, Dict, Any
+from fastapi.responses import StreamingResponse
+from ..core.database import SessionLocal
+from ..models.database_models import Conversation as ConversationModel, User as UserModel
+from .prompts import ASSISTANT_INSTRUCTIONS, SEARCH_RESTAURANTS_TOOL
+from .context_builder import ContextBuilder, ContextWindow, LLMSummarizer
+from .chat_service import openai_breaker, openai_retry, OPENAI_TIMEOUT_SECONDS
+from ..core.resilience import call_with_retry
+from ..core.offload import run_sync
+import json
+import asyncio
+import anyio
+
+CHAT_MODEL = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o")
+# "llm" summarizes dropped turns with the chat model, "extractive" needs no model
+CONTEXT_SUMMARIZER = os.getenv("CONTEXT_SUMMARIZER", "llm")
+
+# A reply that calls search_restaurants needs one follow-up request for the text
+MAX_TOOL_ROUNDS = 2
+
+class CompletionsEngine:
+    def __init__(self, client: AsyncOpenAI = None, model: str = CHAT_MODEL, context_builder: ContextBuilder = None, session_factory=SessionLocal):
+        self.client = client or AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=OPENAI_TIMEOUT_SECONDS, max_retries=0)
+        self.model = model
+        self.context_builder = context_builder or ContextBuilder(
+            summarizer=LLMSummarizer(self.client, model) if CONTEXT_SUMMARIZER == "llm" else None
+        )
+        self.session_factory = session_factory
+        self._summary_tasks = set()
+
+    def build_messages(self, db, conversation_id: int, message: str) -> List[Dict[str, Any]]:
+        """Build the chat prompt from the conversation's summary and stored messages"""
+        return self.build_context(db, conversation_id, message).messages
+
+    def build_context(self, db, conversation_id: int, message: str) -> ContextWindow:
+        system_prompt = ASSISTANT_INSTRUCTIONS
+        if not db:
+            return ContextWindow(
+                messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": message}],
+                token_count=0,
+                oldest_kept_id=None,
+                needs_summary=False
+            )
+
+        conversation = db.query(ConversationModel).filter_by(id=conversation_id).first()
+        if conversation:
+            user = db.query(UserModel).filter_by(id=conversation.user_id).first()
+            if user:
+                system_prompt += f"\n\nThe user's name from their Google account is: {user.name}. Use their name occasionally to make the conversation more personal."
+
+        return self.context_builder.build(db, conversation_id, message, system_prompt)
+
+    async def _update_summary(self, conversation_id: int, before_id: int):
+        try:
+            with self.session_factory() as db:
+                await self.context_builder.update_summary(db, conversation_id, before_id)
+        except Exception as e:
+            print(f"Error updating conversation summary: {e}")
+
+    async def get_streaming_response(self, conversation_id: int, thread_id: str, message: str, db=None) -> StreamingResponse:
+        try:
+            context = await run_sync(self.build_context, db, conversation_id, message)
+            messages = context.messages
+            print(f"Prompt for conversation {conversation_id}: {len(messages)} messages, {context.token_count} tokens")
+        except Exception as e:
+            print(f"Error building chat prompt: {e}")
+            async def error_stream():
+                error_msg = "An error occurred while processing your request."
+                yield f"data: {json.dumps({'content': error_msg})}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(error_stream(), media_type="text/event-stream")
+
+        async def generate():
+            try:
+                for _ in range(MAX_TOOL_ROUNDS):
+                    # Nothing has been streamed yet, so a failed request can be retried
+                    stream = await call_with_retry(
+                        lambda: self.client.chat.completions.create(
+                            model=self.model,
+                            messages=messages,
+                            tools=[SEARCH_RESTAURANTS_TOOL],
+                            stream=True
+                        ),
+                        breaker=openai_breaker,
+                        policy=openai_retry
+                    )
+
+                    tool_calls = {}
+                    try:
+                        async for chunk in stream:
+                            if not chunk.choices:
+                                continue
+                            delta = chunk.choices[0].delta
+
+                            if delta.content:
+                                yield f"data: {json.dumps({'content': delta.content})}\n\n"
+
+                            for call in delta.tool_calls or []:
+                                entry = tool_calls.setdefault(call.index, {"id": "", "name": "", "arguments": ""})
+                                if call.id:
+                                    entry["id"] = call.id
+                                if call.function and call.function.name:
+                                    entry["name"] += call.function.name
+                                if call.function and call.function.arguments:
+                                    entry["arguments"] += call.function.arguments
+                    finally:
+                        # Dropping the connection is what stops generation upstream
+                        with anyio.CancelScope(shield=True):
+                            await stream.close()
+
+                    if not tool_calls:
+                        break
+
+                    messages.append({
+                        "role": "assistant",
+                        "content": None,
+                        "tool_calls": [{
+                            "id": call["id"],
+                            "type": "function",
+                            "function": {"name": call["name"], "arguments": call["arguments"]}
+                        } for call in tool_calls.values()]
+                    })
+
+                    for call in tool_calls.values():
+                        if call["name"] == "search_restaurants":
+                            try:
+                                params = json.loads(call["arguments"])
+                                print(f"Restaurant search params: {params}")
+                                yield f"data: {json.dumps({'restaurant_search': params})}\n\n"
+                            except json.JSONDecodeError:
+                                print(f"Error parsing function arguments: {call['arguments']}")
+
+                        # Cards are rendered client-side, so the tool only reports success
+                        messages.append({
+                            "role": "tool",
+                            "tool_call_id": call["id"],
+                            "content": json.dumps({"status": "success"})
+                        })
+
+                if context.needs_summary:
+                    # Fold dropped turns into the summary without delaying this reply
+                    task = asyncio.create_task(self._update_summary(conversation_id, context.oldest_kept_id))
+                    self._summary_tasks.add(task)
+                    task.add_done_callback(self._summary_tasks.discard)
+
+                yield "data: [DONE]\n\n"
+
+            except Exception as e:
+                print(f"Error in stream generation: {e}")
+                error_msg = "I apologize, but I'm having trouble processing your request right now."
+                yield f"data: {json.dumps({'content': error_msg})}\n\n"
+                yield "data: [DONE]\n\n"
+
+        return StreamingResponse(generate(), media_type="text/event-stream")
@@ -0,0 +1,186 @@
+"""
+context_builder.py
+
+Token-budgeted context window builder for locally stored conversations.
+Keeps prompt size flat by folding older turns into a persisted rolling summary.
+
+Key Features:
+- Token counting for every prompt
+- Bounded reads (only turns newer than the summary are loaded)
+- Rolling summary persisted per conversation
+- Incremental summary updates (only newly dropped turns are folded in)
+- Pluggable summarizers (LLM or extractive)
+
+"""
+
+import os
+from typing import List, Dict, Any, Optional
+from ..core.offload import run_sync
+from ..models.database_models import Message as MessageModel, ConversationSummary
+from .tokens import count_tokens, count_message_tokens, truncate_history
+import json
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "4000"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("CONTEXT_SUMMARY_TOKEN_BUDGET", "500"))
+RECENT_MESSAGE_LIMIT = int(os.getenv("CONTEXT_RECENT_MESSAGE_LIMIT", "40"))
+
+# Turns folded into the summary per summarizer call
+SUMMARY_BATCH_SIZE = 50
+
+SUMMARY_INSTRUCTIONS = """You maintain a running summary of a conversation between a user and Chef Ava, a restaurant assistant.
+Update the existing summary with the new turns. Keep names, locations, cuisines, budgets, dietary needs and restaurants already recommended.
+Reply with the updated summary only, in under {max_tokens} tokens."""
+
+def to_chat_message(msg: MessageModel) -> Dict[str, Any]:
+    """Convert a stored message into a chat completion message"""
+    if msg.sender == "user":
+        return {"role": "user", "content": msg.content}
+
+    content = msg.content
+    search = msg.load_restaurant_search()
+    if search:
+        content += f"\n\n[Restaurant cards shown for search: {json.dumps(search)}]"
+    return {"role": "assistant", "content": content}
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """Keep the end of a text so it fits in max_tokens"""
+    while text and count_tokens(text) > max_tokens:
+        text = text[len(text) // 10 + 1:]
+    return text
+
+class ExtractiveSummarizer:
+    """Summarizer that needs no model: appends condensed turns and keeps the newest part"""
+
+    def __init__(self, max_tokens: int = SUMMARY_TOKEN_BUDGET, chars_per_turn: int = 200):
+        self.max_tokens = max_tokens
+        self.chars_per_turn = chars_per_turn
+
+    async def __call__(self, previous_summary: str, messages: List[Dict[str, Any]]) -> str:
+        lines = [previous_summary] if previous_summary else []
+        for message in messages:
+            speaker = "User" if message["role"] == "user" else "Ava"
+            lines.append(f"{speaker}: {message['content'][:self.chars_per_turn]}")
+        return trim_to_tokens("\n".join(lines), self.max_tokens)
+
+class LLMSummarizer:
+    """Summarizer that asks a chat model to update the summary"""
+
+    def __init__(self, client, model: str, max_tokens: int = SUMMARY_TOKEN_BUDGET):
+        self.client = client
+        self.model = model
+        self.max_tokens = max_tokens
+
+    async def __call__(self, previous_summary: str, messages: List[Dict[str, Any]]) -> str:
+        turns = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SUMMARY_INSTRUCTIONS.format(max_tokens=self.max_tokens)},
+                {"role": "user", "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew turns:\n{turns}"}
+            ],
+            max_tokens=self.max_tokens
+        )
+        return trim_to_tokens(response.choices[0].message.content or previous_summary, self.max_tokens)
+
+class ContextWindow:
+    """Result of building a prompt for one reply"""
+
+    def __init__(self, messages: List[Dict[str, Any]], token_count: int, oldest_kept_id: Optional[int], needs_summary: bool):
+        self.messages = messages
+        self.token_count = token_count
+        # Stored messages older than this id are not in the prompt
+        self.oldest_kept_id = oldest_kept_id
+        self.needs_summary = needs_summary
+
+class ContextBuilder:
+    def __init__(
+        self,
+        summarizer=None,
+        token_budget: int = CONTEXT_TOKEN_BUDGET,
+        summary_token_budget: int = SUMMARY_TOKEN_BUDGET,
+        recent_message_limit: int = RECENT_MESSAGE_LIMIT
+    ):
+        self.summarizer = summarizer or ExtractiveSummarizer(max_tokens=summary_token_budget)
+        self.token_budget = token_budget
+        self.summary_token_budget = summary_token_budget
+        self.recent_message_limit = recent_message_limit
+
+    def build(self, db, conversation_id: int, message: str, system_prompt: str) -> ContextWindow:
+        """Build the prompt: system prompt, rolling summary, then the newest turns that fit"""
+        summary = db.get(ConversationSummary, conversation_id)
+        summarized_through = summary.summarized_through_id if summary else 0
+
+        # Only turns newer than the summary are candidates, and never more than the limit
+        rows = (
+            db.query(MessageModel)
+            .filter(
+                MessageModel.conversation_id == conversation_id,
+                MessageModel.id > summarized_through,
+                MessageModel.content != ""
+            )
+            .order_by(MessageModel.id.desc())
+            .limit(self.recent_message_limit)
+            .all()
+        )
+        rows.reverse()
+
+        history = [to_chat_message(row) for row in rows]
+        ids = [row.id for row in rows]
+        # The endpoint stores the user's message before streaming; only add it if missing
+        if not history or history[-1] != {"role": "user", "content": message}:
+            history.append({"role": "user", "content": message})
+            ids.append(None)
+
+        if summary and summary.summary:
+            system_prompt += f"\n\nSummary of the earlier conversation:\n{summary.summary}"
+        system_message = {"role": "system", "content": system_prompt}
+
+        history_budget = self.token_budget - count_message_tokens(system_message)
+        kept = truncate_history(history, history_budget)
+        kept_ids = ids[len(ids) - len(kept):]
+        oldest_kept_id = next((i for i in kept_ids if i is not None), None)
+
+        messages = [system_message] + kept
+        return ContextWindow(
+            messages=messages,
+            token_count=sum(count_message_tokens(m) for m in messages),
+            oldest_kept_id=oldest_kept_id,
+            needs_summary=len(kept) < len(history) or len(rows) == self.recent_message_limit
+        )
+
+    async def update_summary(self, db, conversation_id: int, before_id: Optional[int]) -> Optional[ConversationSummary]:
+        """Fold turns that fell out of the window (ids below before_id) into the summary.
+
+        Only turns newer than the last summarized id are read, so each update
+        costs the same no matter how long the conversation is. Reads and the
+        commit run in the offload pool; only the summarizer call is awaited here.
+        """
+        summary, rows = await run_sync(self._load_unsummarized, db, conversation_id, before_id)
+        if not rows:
+            return summary
+
+        text = await self.summarizer(summary.summary, [to_chat_message(row) for row in rows])
+        await run_sync(self._save_summary, db, summary, text, rows[-1].id)
+        return summary
+
+    def _load_unsummarized(self, db, conversation_id: int, before_id: Optional[int]):
+        summary = db.get(ConversationSummary, conversation_id)
+        if summary is None:
+            summary = ConversationSummary(conversation_id=conversation_id, summary="", summarized_through_id=0, token_count=0)
+            db.add(summary)
+
+        query = db.query(MessageModel).filter(
+            MessageModel.conversation_id == conversation_id,
+            MessageModel.id > summary.summarized_through_id,
+            MessageModel.content != ""
+        )
+        if before_id is not None:
+            query = query.filter(MessageModel.id < before_id)
+
+        return summary, query.order_by(MessageModel.id).limit(SUMMARY_BATCH_SIZE).all()
+
+    def _save_summary(self, db, summary: ConversationSummary, text: str, through_id: int):
+        summary.summary = text
+        summary.summarized_through_id = through_id
+        summary.token_count = count_tokens(text)
+        db.commit()
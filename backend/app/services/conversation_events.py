@@ -0,0 +1,91 @@
+"""
+conversation_events.py
+
+Per-user channel of conversation list changes.
+Every mutation endpoint publishes a small delta (created, updated, activated,
+deleted) so open sidebars stay current without polling or full-list reloads.
+
+Key Features:
+- One SSE connection per client carrying all of the user's conversation deltas
+- Published through shared state, so a change on any worker reaches every client
+- Ready event marks the point after which no delta is missed
+- Heartbeat comments keep idle connections open through proxies
+- Publishing never fails the mutation that triggered it
+- Open connection and published event counts in metrics
+
+"""
+
+import os
+from typing import Optional, Dict, Any, AsyncIterator, Awaitable, Callable
+
+from ..core.metrics import metrics
+from ..core.responses import dumps
+from ..core.shared_state import SharedState, shared_state
+
+CONVERSATION_EVENTS_HEARTBEAT_SECONDS = float(os.getenv("CONVERSATION_EVENTS_HEARTBEAT_SECONDS", "15"))
+
+# How often an idle connection checks whether its client is still there
+DISCONNECT_POLL_SECONDS = 1.0
+
+# Client reconnect delay, sent with the first event
+RETRY_MILLISECONDS = 3000
+
+EVENT_TYPES = ("created", "updated", "activated", "deleted")
+
+def channel_name(user_id: str) -> str:
+    return f"conversations:{user_id}"
+
+def format_event(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+def conversation_delta(conversation, *fields: str) -> Dict[str, Any]:
+    """Sidebar fields of a conversation; pass field names to send only those"""
+    fields = fields or ("title", "is_new", "is_active", "created_at", "updated_at")
+    return {"id": conversation.id, **{field: getattr(conversation, field) for field in fields}}
+
+class ConversationEvents:
+    def __init__(self, state: SharedState = shared_state, heartbeat_seconds: float = CONVERSATION_EVENTS_HEARTBEAT_SECONDS):
+        self.state = state
+        self.heartbeat_seconds = heartbeat_seconds
+        self.connections = 0
+
+    async def publish(self, user_id: str, event: str, data: Dict[str, Any]):
+        """Send a delta to all of the user's open connections"""
+        if event not in EVENT_TYPES:
+            raise ValueError(f"Unknown conversation event: {event}")
+        # Published already formatted, so connections forward it untouched
+        message = format_event(event, dumps(data).decode())
+        try:
+            await self.state.publish(channel_name(user_id), message)
+            metrics.inc("conversation_events.published")
+        except Exception as e:
+            # The change itself is committed; clients catch up on their next full load
+            print(f"Failed to publish conversation event {event}: {e}")
+
+    async def stream(self, user_id: str, is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None) -> AsyncIterator[str]:
+        """SSE events for one client, until it disconnects"""
+        subscription = await self.state.subscribe(channel_name(user_id))
+        self.connections += 1
+        metrics.set_gauge("conversation_events.connections", self.connections)
+        try:
+            # Subscribed: a list fetched after this event can't miss a delta
+            yield f"retry: {RETRY_MILLISECONDS}\n" + format_event("ready", "{}")
+            idle = 0.0
+            while True:
+                if is_disconnected and await is_disconnected():
+                    return
+                message = await subscription.get(timeout=DISCONNECT_POLL_SECONDS)
+                if message is None:
+                    idle += DISCONNECT_POLL_SECONDS
+                    if idle >= self.heartbeat_seconds:
+                        idle = 0.0
+                        yield ": ping\n\n"
+                    continue
+                idle = 0.0
+                yield message
+        finally:
+            self.connections -= 1
+            metrics.set_gauge("conversation_events.connections", self.connections)
+            await subscription.close()
+
+conversation_events = ConversationEvents()
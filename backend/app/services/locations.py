@@ -0,0 +1,131 @@
+"""
+locations.py
+
+Canonical forms for the free-form locations the assistant searches with.
+"Atlanta, GA", "atlanta ga" and "Atlanta, Georgia, USA" are one place to Yelp
+but three different search requests (and cache keys). Locations are
+normalized before they reach Yelp. The region Yelp reports for a search is
+also remembered, so a bare city ("atlanta") that Yelp placed in the same
+region as its state-qualified spelling ("atlanta ga") is searched as the
+latter. Region centers follow the results (they shift with the search
+term), so they never merge places whose names differ: a location that
+names its state is sent as written, and a bare name only becomes itself
+plus a state.
+
+Key Features:
+- Case, accents and punctuation normalized
+- US state names shortened to their postal codes when given as their own component ("Atlanta, Georgia"), a trailing ", USA" dropped
+- First region seen for each location memoized in shared state
+- Bare city names searched as the state-qualified spelling in the same region
+- Canonicalization and alias hits in metrics
+
+"""
+
+import os
+import re
+from typing import Optional, Dict, Any
+
+from ..core.metrics import metrics
+from ..core.shared_state import shared_state
+from .response_cache import strip_accents
+
+# How long a learned location -> region mapping is trusted; 0 disables bare-name aliasing
+YELP_REGION_TTL_SECONDS = float(os.getenv("YELP_REGION_TTL_SECONDS", "2592000"))
+# Region centers rounded to this many decimals (2 is about a kilometre) before comparing
+REGION_PRECISION = 2
+
+US_STATES = {
+    "alabama": "al", "alaska": "ak", "arizona": "az", "arkansas": "ar", "california": "ca",
+    "colorado": "co", "connecticut": "ct", "delaware": "de", "district of columbia": "dc",
+    "florida": "fl", "georgia": "ga", "hawaii": "hi", "idaho": "id", "illinois": "il",
+    "indiana": "in", "iowa": "ia", "kansas": "ks", "kentucky": "ky", "louisiana": "la",
+    "maine": "me", "maryland": "md", "massachusetts": "ma", "michigan": "mi", "minnesota": "mn",
+    "mississippi": "ms", "missouri": "mo", "montana": "mt", "nebraska": "ne", "nevada": "nv",
+    "new hampshire": "nh", "new jersey": "nj", "new mexico": "nm", "new york": "ny",
+    "north carolina": "nc", "north dakota": "nd", "ohio": "oh", "oklahoma": "ok", "oregon": "or",
+    "pennsylvania": "pa", "rhode island": "ri", "south carolina": "sc", "south dakota": "sd",
+    "tennessee": "tn", "texas": "tx", "utah": "ut", "vermont": "vt", "virginia": "va",
+    "washington": "wa", "west virginia": "wv", "wisconsin": "wi", "wyoming": "wy",
+}
+
+US_STATE_CODES = set(US_STATES.values())
+
+US_COUNTRY_NAMES = ("united states of america", "united states", "usa", "us")
+
+def normalize_text(text: str) -> str:
+    text = strip_accents(text.lower()).replace("&", " and ")
+    text = re.sub(r"[^a-z0-9\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+def canonical_location(location: Optional[str]) -> Optional[str]:
+    """Normalized location: "Atlanta, Georgia, USA" -> "atlanta ga"; a bare state or city name is kept"""
+    if not location:
+        return location
+    parts = [part for part in (normalize_text(part) for part in location.split(",")) if part]
+    if not parts:
+        return None
+
+    # Only whole comma-separated components are rewritten, so "West Virginia",
+    # "Port Washington" and "New York" stay places instead of gaining a state code
+    if len(parts) > 1 and parts[-1] in US_COUNTRY_NAMES:
+        parts.pop()
+    if len(parts) > 1 and parts[-1] in US_STATES:
+        parts[-1] = US_STATES[parts[-1]]
+    return " ".join(parts)
+
+def without_state(location: str) -> Optional[str]:
+    """"atlanta ga" -> "atlanta"; None if the location doesn't end in a state code"""
+    place, _, state = location.rpartition(" ")
+    return place if place and state in US_STATE_CODES else None
+
+def region_key(region: Optional[Dict[str, Any]]) -> Optional[str]:
+    center = (region or {}).get("center") or {}
+    latitude, longitude = center.get("latitude"), center.get("longitude")
+    if latitude is None or longitude is None:
+        return None
+    return f"{round(latitude, REGION_PRECISION)},{round(longitude, REGION_PRECISION)}"
+
+class LocationResolver:
+    """Canonicalizes locations and qualifies bare city names with the state Yelp placed them in"""
+
+    def __init__(self, ttl_seconds: float = YELP_REGION_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+
+    async def resolve(self, location: Optional[str]) -> Optional[str]:
+        """The spelling to search with: canonical, or "<city> <state>" for a bare city in a known region"""
+        canonical = canonical_location(location)
+        if canonical != location:
+            metrics.inc("locations.canonicalized")
+        if not canonical or self.ttl_seconds <= 0 or without_state(canonical):
+            # A location that names its state is never rewritten
+            return canonical
+
+        region = await shared_state.get(f"yelp_region:{canonical}")
+        if region is None:
+            return canonical
+        qualified = await shared_state.get(f"yelp_region_location:{region}")
+        # Same region isn't enough (nearby places share one); it must be this city plus a state
+        if qualified and without_state(qualified) == canonical:
+            metrics.inc("locations.aliased")
+            return qualified
+        return canonical
+
+    async def learn(self, location: str, region: Optional[Dict[str, Any]]):
+        """Remember the region a search for `location` (as sent to Yelp) first came back with"""
+        key = region_key(region)
+        if not location or key is None or self.ttl_seconds <= 0:
+            return
+        # First result wins: the center moves with the search term, and the mapping shouldn't
+        await shared_state.set(f"yelp_region:{location}", key, ttl=self.ttl_seconds, only_if_absent=True)
+        if without_state(location):
+            await shared_state.set(f"yelp_region_location:{key}", location, ttl=self.ttl_seconds, only_if_absent=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "canonicalized": metrics.get("locations.canonicalized"),
+            "aliased": metrics.get("locations.aliased"),
+        }
+
+location_resolver = LocationResolver()
+
+metrics.register_collector("locations", location_resolver.stats)
@@ -0,0 +1,78 @@
+"""
+prompts.py
+
+Shared assistant instructions and tool schemas.
+Used by every chat engine so all of them behave the same way.
+
+Key Features:
+- Chef Ava system instructions
+- search_restaurants function tool schema
+- Personal greeting text
+
+"""
+
+ASSISTANT_NAME = "Restaurant Assistant"
+
+ASSISTANT_INSTRUCTIONS = """You are Chef Ava, a helpful restaurant assistant. Help users find restaurants and answer questions about food and dining.
+                When users ask about specific restaurants or cuisines, use the search_restaurants function to find relevant options.
+
+                Important notes about restaurant search functionality:
+                - The search_restaurants function will display restaurant cards in the chat interface automatically
+                - Each restaurant card shows the name, rating, reviews, photos, price level, hours, and location
+                - Users can click on restaurant cards to visit their Yelp pages
+                - No need to describe restaurant details that are already visible in the cards
+                - Focus on providing context, recommendations, and insights about the restaurants shown
+
+                Guidelines for restaurant searches:
+                - Use between 1-5 results (k parameter) depending on how many restaurants you assume the user wants to see.
+                - Always include relevant search parameters like cuisine, price range, etc.
+                - Important! Be mindful that you will send this query to Yelp's search bar, do not just input anything there like 'romantic restaurant' if the user asked for a great date place. Instead use your own judgement to decide what type of restaurants would be good for dates, and search that there instead, like 'fancy italian', for example. Usually you want one or 2 adjectives and a cuisine type like style search queries.
+                - Location can be specified by city or address
+
+                Remember to:
+                - Maintain a natural conversation while leveraging the visual restaurant cards
+                - Refer to people by first name only
+                - Provide thoughtful recommendations and local insights
+                - Keep responses focused and concise since details are in the cards"""
+
+SEARCH_RESTAURANTS_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "search_restaurants",
+        "description": "Search for restaurants and display the results as cards in chat",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "term": {
+                    "type": "string",
+                    "description": "Search term for Yelp search bar (e.g. cuisine type, restaurant name, etc)"
+                },
+                "location": {
+                    "type": "string",
+                    "description": "Location to search in (city, address, etc) - Cannot be just a country name, needs to be a city or address. For best results, use 'Atlanta, GA' format for US cities and 'São Paulo, Brazil' type format for international. City and State vs City and Country. Use the exact spellings of the city and country name with the accents."
+                },
+                "price": {
+                    "type": "string",
+                    "description": "Price level (1-4 dollar signs)",
+                    "enum": ["$", "$$", "$$$", "$$$$"]
+                },
+                "k": {
+                    "type": "integer",
+                    "description": "Number of results to show (1-5)",
+                    "minimum": 1,
+                    "maximum": 5
+                },
+                "sort_by": {
+                    "type": "string",
+                    "description": "How to sort search results (always use best_match, unless the user explicitly asks to sort by distance/rating/review_count, like: give me the 3 closes restaurants to my address here, but if they say give me the 3 best restaurants, always use best_match).",
+                    "enum": ["best_match", "review_count", "distance"]
+                }
+            },
+            "required": ["term", "k"]
+        }
+    }
+}
+
+def personal_greeting(user_name: str) -> str:
+    """Greeting that tells the assistant the user's Google account name"""
+    return f"Hello! Just so you know, my name from my Google account is: {user_name}. Please use my name occasionally in our conversation to make it more personal."
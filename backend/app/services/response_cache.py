@@ -0,0 +1,188 @@
+"""
+response_cache.py
+
+Optional semantic cache for repeated restaurant questions.
+Serves near-duplicate questions about the same location from a cached reply.
+Replies can carry whatever the conversation told the model (names, diets,
+budgets), so entries are scoped to the user they were generated for.
+
+Key Features:
+- Query normalization (case, accents, punctuation, filler words)
+- Per-user, location-partitioned character n-gram similarity index
+- Tunable similarity threshold
+- TTL expiry and LRU eviction
+- Hit rate instrumentation
+- Fully opt-in (RESPONSE_CACHE_ENABLED)
+
+"""
+
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+from ..core.metrics import metrics
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.8"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+
+NGRAM_SIZE = 3
+
+FILLER_WORDS = {
+    "a", "an", "the", "some", "any", "me", "i", "im", "we", "us", "my", "our", "you", "your",
+    "can", "could", "would", "please", "show", "find", "give", "get", "recommend", "suggest",
+    "what", "whats", "where", "which", "are", "is", "there", "to", "for", "of", "place", "places",
+    "spot", "spots", "restaurant", "restaurants", "want", "looking", "good", "great", "eat",
+}
+
+# "... in Austin, TX", "... near Atlanta" at the end of the question
+LOCATION_PATTERN = re.compile(r"\b(?:in|near|around)\s+([^?!.]+?)\s*[?!.]*$", re.IGNORECASE)
+
+def strip_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+def normalize_text(text: str) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace"""
+    text = strip_accents(text.lower())
+    text = re.sub(r"[^a-z0-9$\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+def split_query(query: str) -> Tuple[str, Optional[str]]:
+    """Split a question into its normalized topic and normalized location"""
+    query = query.strip()
+    match = LOCATION_PATTERN.search(query)
+    if not match:
+        return normalize_text(query), None
+
+    location = normalize_text(match.group(1))
+    topic = normalize_text(query[:match.start()])
+    topic = " ".join(word for word in topic.split() if word not in FILLER_WORDS)
+    return topic, location or None
+
+def ngram_vector(text: str, n: int = NGRAM_SIZE) -> Counter:
+    padded = f" {text} "
+    return Counter(padded[i:i + n] for i in range(max(len(padded) - n + 1, 1)))
+
+def cosine_similarity(a: Counter, b: Counter) -> float:
+    if not a or not b:
+        return 0.0
+    dot = sum(count * b.get(gram, 0) for gram, count in a.items())
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm if norm else 0.0
+
+class CachedResponse:
+    def __init__(self, scope: Optional[str], topic: str, location: str, content: str, restaurant_search: Optional[Dict[str, Any]], created_at: float):
+        self.scope = scope
+        self.topic = topic
+        self.location = location
+        self.content = content
+        self.restaurant_search = restaurant_search
+        self.created_at = created_at
+        self.vector = ngram_vector(topic)
+
+class ResponseCache:
+    """LRU + TTL cache of replies, matched by topic similarity within a scope (user) and location"""
+
+    def __init__(
+        self,
+        enabled: bool = RESPONSE_CACHE_ENABLED,
+        threshold: float = RESPONSE_CACHE_THRESHOLD,
+        ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        clock=time.monotonic
+    ):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[Optional[str], str, str], CachedResponse]" = OrderedDict()
+        self._by_location: Dict[Tuple[Optional[str], str], set] = {}
+
+    def lookup(self, query: str, scope: Optional[str] = None) -> Optional[CachedResponse]:
+        """Return a cached reply for a near-duplicate question stored under the same scope, if any"""
+        if not self.enabled:
+            return None
+
+        topic, location = split_query(query)
+        if not location or not topic:
+            return None
+
+        with self._lock:
+            now = self.clock()
+            best, best_score = None, 0.0
+            vector = ngram_vector(topic)
+            for key in list(self._by_location.get((scope, location), ())):
+                entry = self._entries[key]
+                if now - entry.created_at > self.ttl_seconds:
+                    self._remove(key)
+                    continue
+                score = 1.0 if entry.topic == topic else cosine_similarity(vector, entry.vector)
+                if score > best_score:
+                    best, best_score = entry, score
+
+            if best is not None and best_score >= self.threshold:
+                self._entries.move_to_end((best.scope, best.location, best.topic))
+                self.hits += 1
+                metrics.inc("response_cache.hits")
+                return best
+
+            self.misses += 1
+            metrics.inc("response_cache.misses")
+            return None
+
+    def store(self, query: str, content: str, restaurant_search: Optional[Dict[str, Any]], scope: Optional[str] = None):
+        """Cache a reply for a self-contained question (one that names a location), visible only within scope"""
+        if not self.enabled or not content:
+            return
+
+        topic, location = split_query(query)
+        if not location or not topic:
+            return
+
+        with self._lock:
+            key = (scope, location, topic)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CachedResponse(scope, topic, location, content, restaurant_search, self.clock())
+            self._by_location.setdefault(key[:2], set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Tuple[Optional[str], str, str]):
+        self._entries.pop(key, None)
+        keys = self._by_location.get(key[:2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_location[key[:2]]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_location.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+response_cache = ResponseCache()
+metrics.register_collector("response_cache", response_cache.stats)
@@ -0,0 +1,370 @@
+"""
+retention.py
+
+Archiving of old conversations and database compaction.
+Conversations untouched for RETENTION_DAYS have their messages moved out of
+the hot tables into compressed per-user archive files. The conversation row
+stays, so the sidebar is unchanged and get_conversation reads the archive on
+demand. Each run then hands the freed pages back with an incremental VACUUM.
+
+Archived messages are read-only history: they no longer show up in message
+search or the top restaurant searches, and editing or deleting one returns
+404. New messages in the conversation are served and indexed as usual.
+
+Key Features:
+- One gzip member per archived conversation, appended to the user's file
+- Archive index table (path, offset, length), so a read is a single seek
+- Conversations that get new messages later are re-archived as a whole
+- Archive files rewritten once most of their bytes belong to deleted conversations
+- Incremental VACUUM and ANALYZE every run (auto_vacuum switched on once)
+- Reclaimed database and archive bytes in each run's report and in metrics
+- Scheduled from the app lifespan (only when retention is configured); one worker per interval via a shared lock
+
+"""
+
+import asyncio
+import gzip
+import hashlib
+import os
+import re
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any
+
+from sqlalchemy import func, text, exists
+from sqlalchemy.orm import selectinload
+
+from ..core.database import SessionLocal
+from ..core.metrics import metrics
+from ..core.offload import run_sync
+from ..core.responses import dumps, loads
+from ..core.shared_state import SharedState, shared_state
+from ..models.database_models import (
+    Conversation as ConversationModel,
+    Message as MessageModel,
+    ConversationArchive,
+    utcnow
+)
+from .yelp_snapshots import yelp_snapshots
+
+# 0 keeps every conversation in the hot tables (compaction still runs)
+RETENTION_DAYS = float(os.getenv("RETENTION_DAYS", "0"))
+RETENTION_ARCHIVE_DIR = os.getenv("RETENTION_ARCHIVE_DIR", "./archive")
+# 0 disables the scheduled job. Unset, it runs daily only when RETENTION_DAYS is set:
+# compaction switches SQLite's auto_vacuum mode with a full VACUUM, so it is never a silent default
+RETENTION_INTERVAL_SECONDS = float(os.getenv("RETENTION_INTERVAL_SECONDS") or (86400 if RETENTION_DAYS > 0 else 0))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "200"))
+RETENTION_VACUUM_PAGES = int(os.getenv("RETENTION_VACUUM_PAGES", "5000"))
+
+# Keeps startup quick; the first run happens this long after boot
+FIRST_RUN_DELAY_SECONDS = 60
+# An archive file is rewritten once more than this share of it is dead
+COMPACT_DEAD_RATIO = 0.5
+
+# archive_filename(), or its rewrite by compaction ("<name>-<8 hex>.gz"); nothing else in the directory is ours
+ARCHIVE_FILE_PATTERN = re.compile(r"^[0-9a-f]{24}(-[0-9a-f]{8})?\.gz$")
+
+def archive_filename(user_id: str) -> str:
+    # Google ids are safe file names, but nothing guarantees it
+    return hashlib.sha256(user_id.encode()).hexdigest()[:24] + ".gz"
+
+def message_payload(message: MessageModel) -> Dict[str, Any]:
+    """A message as get_conversation serves it"""
+    return {
+        "id": message.id,
+        "content": message.content,
+        "sender": message.sender,
+        "timestamp": message.timestamp,
+        "is_edited": message.is_edited,
+        "conversation_id": message.conversation_id,
+        "restaurant_search": message.load_restaurant_search(),
+        "restaurant_snapshot": yelp_snapshots.serialize(message.snapshot),
+    }
+
+class RetentionService:
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        archive_dir: str = RETENTION_ARCHIVE_DIR,
+        retention_days: float = RETENTION_DAYS,
+        batch_size: int = RETENTION_BATCH_SIZE,
+        vacuum_pages: int = RETENTION_VACUUM_PAGES,
+        interval_seconds: float = RETENTION_INTERVAL_SECONDS,
+        state: SharedState = shared_state
+    ):
+        self.session_factory = session_factory
+        self.archive_dir = archive_dir
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+        self.interval_seconds = interval_seconds
+        self.state = state
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _full_path(self, path: str) -> str:
+        return os.path.join(self.archive_dir, path)
+
+    # --- Archive files --------------------------------------------------------
+
+    def _append(self, path: str, data: bytes) -> int:
+        """Append one member to an archive file and return its offset"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        with open(self._full_path(path), "ab") as f:
+            offset = f.tell()
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        return offset
+
+    def _read_member(self, path: str, offset: int, length: int) -> Dict[str, Any]:
+        with open(self._full_path(path), "rb") as f:
+            f.seek(offset)
+            return loads(gzip.decompress(f.read(length)))
+
+    def load(self, conversation_id: int) -> List[Dict[str, Any]]:
+        """Archived messages of a conversation (empty if it has none)"""
+        for attempt in range(2):
+            with self.session_factory() as db:
+                archive = db.get(ConversationArchive, conversation_id)
+                if archive is None:
+                    return []
+                try:
+                    document = self._read_member(archive.path, archive.offset, archive.length)
+                except FileNotFoundError:
+                    # Compaction moved it between our lookup and the read
+                    if attempt:
+                        raise
+                    continue
+            metrics.inc("retention.archive_reads")
+            return document["messages"]
+        return []
+
+    # --- Archiving ------------------------------------------------------------
+
+    @staticmethod
+    def _idle_since(cutoff: Optional[datetime]) -> list:
+        """Conditions for a conversation that can be archived: inactive and, with a cutoff, untouched since"""
+        conditions = [ConversationModel.is_active.isnot(True)]
+        if cutoff is not None:
+            conditions.append(func.coalesce(ConversationModel.updated_at, ConversationModel.created_at) < cutoff)
+        return conditions
+
+    def candidates(self, cutoff: datetime) -> List[int]:
+        """Inactive conversations with hot messages, untouched since cutoff, oldest first"""
+        last_change = func.coalesce(ConversationModel.updated_at, ConversationModel.created_at)
+        with self.session_factory() as db:
+            rows = (
+                db.query(ConversationModel.id)
+                .filter(
+                    *self._idle_since(cutoff),
+                    exists().where(MessageModel.conversation_id == ConversationModel.id)
+                )
+                .order_by(last_change)
+                .limit(self.batch_size)
+                .all()
+            )
+        return [row[0] for row in rows]
+
+    def archive_conversation(self, conversation_id: int, cutoff: Optional[datetime] = None) -> int:
+        """Move a conversation's messages to its user's archive file; returns how many moved.
+
+        The candidate checks are repeated here, since the conversation may have
+        been reopened since candidates() ran. Only the messages that were
+        written to the archive are deleted; anything newer stays hot.
+        """
+        with self.session_factory() as db:
+            conversation = (
+                db.query(ConversationModel)
+                .options(selectinload(ConversationModel.messages).selectinload(MessageModel.snapshot))
+                .filter(ConversationModel.id == conversation_id, *self._idle_since(cutoff))
+                .first()
+            )
+            if conversation is None or not conversation.messages:
+                return 0
+
+            archive = conversation.archive
+            previous = []
+            if archive is not None:
+                previous = self._read_member(archive.path, archive.offset, archive.length)["messages"]
+            else:
+                # All of a user's archives share one file
+                existing = db.query(ConversationArchive.path)\
+                    .filter(ConversationArchive.user_id == conversation.user_id).first()
+                archive = ConversationArchive(
+                    conversation_id=conversation_id,
+                    user_id=conversation.user_id,
+                    path=existing[0] if existing else archive_filename(conversation.user_id)
+                )
+                db.add(archive)
+
+            moved = len(conversation.messages)
+            messages = previous + [message_payload(message) for message in conversation.messages]
+            data = gzip.compress(dumps({"conversation_id": conversation_id, "messages": messages}))
+            # Written before the commit: a crash leaves unreferenced bytes, never lost messages
+            archive.offset = self._append(archive.path, data)
+            archive.length = len(data)
+            archive.message_count = len(messages)
+            archive.archived_at = utcnow()
+
+            # Searches, snapshots and the search index go with the messages
+            archived_ids = [message.id for message in conversation.messages]
+            db.query(MessageModel).filter(MessageModel.id.in_(archived_ids))\
+                .delete(synchronize_session=False)
+            db.commit()
+        return moved
+
+    # --- Compaction -----------------------------------------------------------
+
+    def _rewrite(self, path: str) -> int:
+        """Copy the live members of an archive file to a new file; returns bytes saved"""
+        new_path = f"{path.split('-')[0].removesuffix('.gz')}-{uuid.uuid4().hex[:8]}.gz"
+        old_size = os.path.getsize(self._full_path(path))
+        with self.session_factory() as db:
+            archives = db.query(ConversationArchive)\
+                .filter(ConversationArchive.path == path)\
+                .order_by(ConversationArchive.offset).all()
+            try:
+                with open(self._full_path(path), "rb") as source, open(self._full_path(new_path), "wb") as target:
+                    for archive in archives:
+                        source.seek(archive.offset)
+                        data = source.read(archive.length)
+                        archive.offset = target.tell()
+                        archive.path = new_path
+                        target.write(data)
+                    target.flush()
+                    os.fsync(target.fileno())
+                db.commit()
+            except BaseException:
+                db.rollback()
+                os.remove(self._full_path(new_path))
+                raise
+        # Only unreferenced once the new offsets are committed
+        os.remove(self._full_path(path))
+        return old_size - os.path.getsize(self._full_path(new_path))
+
+    def compact_archives(self) -> int:
+        """Drop files and members of deleted conversations; returns bytes reclaimed"""
+        if not os.path.isdir(self.archive_dir):
+            return 0
+        with self.session_factory() as db:
+            live = dict(
+                db.query(ConversationArchive.path, func.sum(ConversationArchive.length))
+                .group_by(ConversationArchive.path).all()
+            )
+
+        reclaimed = 0
+        for name in os.listdir(self.archive_dir):
+            if not ARCHIVE_FILE_PATTERN.match(name):
+                continue
+            size = os.path.getsize(self._full_path(name))
+            if name not in live:
+                os.remove(self._full_path(name))
+                reclaimed += size
+            elif size - live[name] > size * COMPACT_DEAD_RATIO:
+                reclaimed += self._rewrite(name)
+        return reclaimed
+
+    def maintain_database(self) -> Dict[str, Any]:
+        """Incremental VACUUM and ANALYZE; reports the bytes handed back to the filesystem"""
+        with self.session_factory() as db:
+            engine = db.get_bind()
+
+        if engine.dialect.name != "sqlite":
+            # Postgres reclaims space with autovacuum; statistics are still worth refreshing
+            with engine.begin() as conn:
+                conn.execute(text("ANALYZE"))
+            return {"vacuum": None, "db_bytes_reclaimed": 0}
+
+        # VACUUM can't run inside a transaction
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+            pages_before = conn.exec_driver_sql("PRAGMA page_count").scalar()
+            if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+                # Incremental vacuum needs auto_vacuum=INCREMENTAL, which only a full VACUUM applies
+                print("Switching database to incremental auto-vacuum (one-time full VACUUM)")
+                conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.exec_driver_sql("VACUUM")
+                mode = "full"
+            else:
+                # execute() steps the pragma once (one page); executescript runs it to completion
+                conn.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)});")
+                mode = "incremental"
+            pages_after = conn.exec_driver_sql("PRAGMA page_count").scalar()
+            free_pages = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            conn.exec_driver_sql("ANALYZE")
+
+        return {
+            "vacuum": mode,
+            "db_bytes_reclaimed": (pages_before - pages_after) * page_size,
+            "db_size_bytes": pages_after * page_size,
+            "db_free_bytes": free_pages * page_size,
+        }
+
+    # --- Runs -----------------------------------------------------------------
+
+    async def run_once(self) -> Dict[str, Any]:
+        started = time.monotonic()
+        report: Dict[str, Any] = {"archived_conversations": 0, "archived_messages": 0}
+
+        if self.retention_days > 0:
+            cutoff = datetime.now(timezone.utc) - timedelta(days=self.retention_days)
+            for conversation_id in await run_sync(self.candidates, cutoff):
+                try:
+                    moved = await run_sync(self.archive_conversation, conversation_id, cutoff)
+                except Exception as e:
+                    print(f"Failed to archive conversation {conversation_id}: {e}")
+                    metrics.inc("retention.failed")
+                    continue
+                if moved:
+                    report["archived_conversations"] += 1
+                    report["archived_messages"] += moved
+
+        report["archive_bytes_reclaimed"] = await run_sync(self.compact_archives)
+        report.update(await run_sync(self.maintain_database))
+        report["seconds"] = round(time.monotonic() - started, 3)
+        report["finished_at"] = datetime.now(timezone.utc).isoformat()
+
+        self.last_report = report
+        metrics.inc("retention.runs")
+        metrics.inc("retention.archived_messages", report["archived_messages"])
+        metrics.inc("retention.bytes_reclaimed", report["db_bytes_reclaimed"] + report["archive_bytes_reclaimed"])
+        print(
+            f"Retention run: archived {report['archived_messages']} messages from "
+            f"{report['archived_conversations']} conversations, reclaimed "
+            f"{report['db_bytes_reclaimed']} database and {report['archive_bytes_reclaimed']} archive bytes"
+        )
+        return report
+
+    async def run_forever(self):
+        await asyncio.sleep(FIRST_RUN_DELAY_SECONDS)
+        while True:
+            # Held for (most of) the interval, so only one worker runs per interval
+            if await self.state.acquire_lock("retention", ttl=self.interval_seconds * 0.9):
+                try:
+                    await self.run_once()
+                except Exception as e:
+                    print(f"Retention run failed: {e}")
+                    metrics.inc("retention.failed")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self.interval_seconds > 0 and self._task is None:
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"retention_days": self.retention_days, "last_run": self.last_report}
+
+retention = RetentionService()
+
+metrics.register_collector("retention", retention.stats)
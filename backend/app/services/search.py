@@ -0,0 +1,200 @@
+"""
+search.py
+
+Full-text search over a user's conversation history.
+Indexes message text together with the restaurant search terms stored on
+bot messages, so "that ramen place in Austin" finds the right reply.
+
+Key Features:
+- SQLite FTS5 index kept current by triggers (insert, edit, delete)
+- Postgres fallback using generated tsvector columns and GIN indexes
+- Prefix matching on every query word (with 2/3-character prefix indexes)
+- BM25 / ts_rank ranking with search terms weighted above body text
+- HTML-escaped snippets with <mark> highlights, and offset pagination
+- Idempotent install with backfill of existing messages
+
+"""
+
+import html
+import re
+import time
+from typing import Dict, Any, List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+# Private-use characters the database wraps matches in; swapped for the tags
+# only after the message text is escaped, so stored markup is never returned as HTML
+MATCH_START = "\ue000"
+MATCH_END = "\ue001"
+SNIPPET_TOKENS = 16
+
+# Restaurant search terms count double in the ranking
+TERMS_WEIGHT = 2.0
+
+# Searchable text of a message's restaurant search
+SQLITE_TERMS_SQL = (
+    "coalesce((SELECT trim(coalesce(term, '') || ' ' || coalesce(location, '')) "
+    "FROM restaurant_searches WHERE message_id = {id}), '')"
+)
+
+SQLITE_TABLE = """CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content, search_terms, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+)"""
+
+# Triggers are always recreated so an existing index picks up changes to them
+SQLITE_TRIGGERS = {
+    "messages_fts_insert": f"""AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content, search_terms)
+        VALUES (new.id, new.content, {SQLITE_TERMS_SQL.format(id='new.id')});
+    END""",
+    "messages_fts_update": f"""AFTER UPDATE OF content ON messages BEGIN
+        DELETE FROM messages_fts WHERE rowid = old.id;
+        INSERT INTO messages_fts(rowid, content, search_terms)
+        VALUES (new.id, new.content, {SQLITE_TERMS_SQL.format(id='new.id')});
+    END""",
+    "messages_fts_delete": """AFTER DELETE ON messages BEGIN
+        DELETE FROM messages_fts WHERE rowid = old.id;
+    END""",
+    "restaurant_searches_fts_insert": f"""AFTER INSERT ON restaurant_searches BEGIN
+        UPDATE messages_fts SET search_terms = {SQLITE_TERMS_SQL.format(id='new.message_id')} WHERE rowid = new.message_id;
+    END""",
+    "restaurant_searches_fts_update": f"""AFTER UPDATE ON restaurant_searches BEGIN
+        UPDATE messages_fts SET search_terms = {SQLITE_TERMS_SQL.format(id='new.message_id')} WHERE rowid = new.message_id;
+    END""",
+    "restaurant_searches_fts_delete": """AFTER DELETE ON restaurant_searches BEGIN
+        UPDATE messages_fts SET search_terms = '' WHERE rowid = old.message_id;
+    END""",
+}
+
+SQLITE_BACKFILL = f"""
+    INSERT INTO messages_fts(rowid, content, search_terms)
+    SELECT id, content, {SQLITE_TERMS_SQL.format(id='messages.id')} FROM messages
+"""
+
+# Generated columns need no triggers: Postgres recomputes them on every write
+POSTGRES_TERMS_SQL = "coalesce(term, '') || ' ' || coalesce(location, '')"
+
+POSTGRES_SCHEMA = [
+    """ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        to_tsvector('english', coalesce(content, ''))
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_messages_search_vector ON messages USING GIN (search_vector)",
+    f"""ALTER TABLE restaurant_searches ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        to_tsvector('english', {POSTGRES_TERMS_SQL})
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_restaurant_searches_search_vector ON restaurant_searches USING GIN (search_vector)",
+]
+
+def install_search_index(engine: Engine):
+    """Create the search index (and fill it from existing messages) if it doesn't exist yet"""
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'")).first()
+            conn.execute(text(SQLITE_TABLE))
+            for name, body in SQLITE_TRIGGERS.items():
+                conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+                conn.execute(text(f"CREATE TRIGGER {name} {body}"))
+            if not exists:
+                conn.execute(text(SQLITE_BACKFILL))
+                print("Built full-text search index for messages")
+        elif engine.dialect.name == "postgresql":
+            for statement in POSTGRES_SCHEMA:
+                conn.execute(text(statement))
+        else:
+            print(f"Full-text search is not supported on {engine.dialect.name}")
+
+def query_words(query: str) -> List[str]:
+    """Words from free-form user input; operators and punctuation are dropped"""
+    return re.findall(r"\w+", query.lower())
+
+def sqlite_match_query(words: List[str]) -> str:
+    # Each word quoted (no FTS syntax injection) and prefix-matched
+    return " ".join(f'"{word}"*' for word in words)
+
+def postgres_tsquery(words: List[str]) -> str:
+    return " & ".join(f"{word}:*" for word in words)
+
+SQLITE_SEARCH = f"""
+    SELECT m.id AS message_id, m.conversation_id, c.title AS conversation_title, m.sender, m.timestamp,
+           snippet(messages_fts, 0, '{MATCH_START}', '{MATCH_END}', '…', {SNIPPET_TOKENS}) AS snippet,
+           highlight(messages_fts, 1, '{MATCH_START}', '{MATCH_END}') AS search_terms,
+           bm25(messages_fts, 1.0, {TERMS_WEIGHT}) AS rank
+    FROM messages_fts
+    JOIN messages m ON m.id = messages_fts.rowid
+    JOIN conversations c ON c.id = m.conversation_id
+    WHERE messages_fts MATCH :match AND c.user_id = :user_id
+    ORDER BY rank, m.id DESC
+    LIMIT :limit OFFSET :offset
+"""
+
+SQLITE_COUNT = """
+    SELECT count(*) FROM messages_fts
+    JOIN messages m ON m.id = messages_fts.rowid
+    JOIN conversations c ON c.id = m.conversation_id
+    WHERE messages_fts MATCH :match AND c.user_id = :user_id
+"""
+
+# Terms weigh more than body text ('A' vs default 'D' weight)
+POSTGRES_SEARCH = f"""
+    SELECT m.id AS message_id, m.conversation_id, c.title AS conversation_title, m.sender, m.timestamp,
+           ts_headline('english', m.content, q,
+                       'StartSel={MATCH_START}, StopSel={MATCH_END}, MaxWords={SNIPPET_TOKENS}, MinWords=5') AS snippet,
+           CASE WHEN rs.id IS NOT NULL THEN
+               ts_headline('english', {POSTGRES_TERMS_SQL.replace('term', 'rs.term').replace('location', 'rs.location')}, q,
+                           'StartSel={MATCH_START}, StopSel={MATCH_END}, HighlightAll=true')
+           END AS search_terms,
+           -ts_rank(m.search_vector || setweight(coalesce(rs.search_vector, ''::tsvector), 'A'), q) AS rank
+    FROM messages m
+    JOIN conversations c ON c.id = m.conversation_id
+    LEFT JOIN restaurant_searches rs ON rs.message_id = m.id,
+         to_tsquery('english', :match) q
+    WHERE (m.search_vector @@ q OR rs.search_vector @@ q) AND c.user_id = :user_id
+    ORDER BY rank, m.id DESC
+    LIMIT :limit OFFSET :offset
+"""
+
+POSTGRES_COUNT = """
+    SELECT count(*) FROM messages m
+    JOIN conversations c ON c.id = m.conversation_id
+    LEFT JOIN restaurant_searches rs ON rs.message_id = m.id,
+         to_tsquery('english', :match) q
+    WHERE (m.search_vector @@ q OR rs.search_vector @@ q) AND c.user_id = :user_id
+"""
+
+def highlighted_html(marked: str) -> str:
+    """Escape message text, then turn the database's match markers into <mark> tags"""
+    return html.escape(marked).replace(MATCH_START, HIGHLIGHT_START).replace(MATCH_END, HIGHLIGHT_END)
+
+def search_messages(db: Session, user_id: str, query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+    """Ranked, highlighted, paginated search over one user's messages"""
+    started = time.perf_counter()
+    words = query_words(query)
+    result = {"query": query, "total": 0, "limit": limit, "offset": offset, "results": [], "took_ms": 0.0}
+    if not words:
+        return result
+
+    if db.get_bind().dialect.name == "postgresql":
+        search_sql, count_sql, match = POSTGRES_SEARCH, POSTGRES_COUNT, postgres_tsquery(words)
+    else:
+        search_sql, count_sql, match = SQLITE_SEARCH, SQLITE_COUNT, sqlite_match_query(words)
+
+    params = {"match": match, "user_id": user_id}
+    rows = db.execute(text(search_sql), {**params, "limit": limit, "offset": offset}).mappings().all()
+    result["total"] = db.execute(text(count_sql), params).scalar() or 0
+    result["results"] = [{
+        "message_id": row["message_id"],
+        "conversation_id": row["conversation_id"],
+        "conversation_title": row["conversation_title"],
+        "sender": row["sender"],
+        "timestamp": row["timestamp"],
+        "snippet": highlighted_html(row["snippet"] or ""),
+        "search_terms": highlighted_html((row["search_terms"] or "").strip()) or None,
+        # Lower is better for both backends (bm25 and negated ts_rank)
+        "rank": row["rank"],
+    } for row in rows]
+    result["took_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
@@ -0,0 +1,311 @@
+"""
+stream_registry.py
+
+Registry of in-flight bot replies for resumable SSE streams.
+Decouples reply generation from the client connection so a dropped
+connection can reattach without starting a new assistant run.
+
+Key Features:
+- Sequential event ids for every SSE event
+- Bounded per-reply ring buffer of recent events
+- Replay from Last-Event-ID, then live tail
+- Snapshot fallback when the requested events were evicted
+- Grace period before an abandoned reply is cancelled
+- Finished replies linger briefly for late reconnects
+- Optional mirroring to shared state so another worker can resume a reply
+
+"""
+
+import asyncio
+import json
+import os
+from collections import deque
+from typing import Optional, Dict, Any, AsyncIterator, Awaitable, Callable, Union
+
+from ..core.shared_state import SharedState, shared_state
+
+STREAM_BUFFER_SIZE = int(os.getenv("STREAM_BUFFER_SIZE", "256"))
+STREAM_RESUME_GRACE_SECONDS = float(os.getenv("STREAM_RESUME_GRACE_SECONDS", "15"))
+STREAM_LINGER_SECONDS = float(os.getenv("STREAM_LINGER_SECONDS", "60"))
+# Lifetime of mirrored events and snapshots, refreshed on every write
+STREAM_SHARED_TTL_SECONDS = float(os.getenv("STREAM_SHARED_TTL_SECONDS", "600"))
+
+# How often a waiting subscriber checks whether its client is still there
+DISCONNECT_POLL_SECONDS = 1.0
+
+def format_event(event_id: int, data: str) -> str:
+    return f"id: {event_id}\ndata: {data}\n\n"
+
+def events_key(message_id: int) -> str:
+    return f"stream:{message_id}:events"
+
+def snapshot_key(message_id: int) -> str:
+    return f"stream:{message_id}:snapshot"
+
+def watchers_key(message_id: int) -> str:
+    return f"stream:{message_id}:watchers"
+
+def channel_name(message_id: int) -> str:
+    return f"stream:{message_id}"
+
+class ReplyStream:
+    """Event log for one bot reply: a bounded replay buffer plus the reply state so far"""
+
+    def __init__(self, message_id: int, user_id: str, max_events: int = STREAM_BUFFER_SIZE):
+        self.message_id = message_id
+        self.user_id = user_id
+        self.events = deque(maxlen=max_events)  # (event_id, data)
+        self.last_event_id = 0
+        self.content_parts = []
+        self.restaurant_search = None
+        self.done = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        # Set when the reply is mirrored to shared state; None marks the end
+        self.mirror_queue: Optional[asyncio.Queue] = None
+
+    def publish(self, payload: Union[Dict[str, Any], str]) -> int:
+        """Append an event (a dict sent as JSON, or a raw string like [DONE])"""
+        data = payload if isinstance(payload, str) else json.dumps(payload)
+        if isinstance(payload, dict):
+            if "content" in payload:
+                self.content_parts.append(payload["content"])
+            if "restaurant_search" in payload:
+                self.restaurant_search = payload["restaurant_search"]
+
+        self.last_event_id += 1
+        self.events.append((self.last_event_id, data))
+        if self.mirror_queue is not None:
+            self.mirror_queue.put_nowait((self.last_event_id, data))
+        self._notify()
+        return self.last_event_id
+
+    def finish(self):
+        if self.done:
+            return
+        self.done = True
+        if self.mirror_queue is not None:
+            self.mirror_queue.put_nowait(None)
+        self._notify()
+
+    def _notify(self):
+        # Wake everyone waiting on the current event and start a fresh one
+        wakeup, self._wakeup = self._wakeup, asyncio.Event()
+        wakeup.set()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "message_id": self.message_id,
+            "content": "".join(self.content_parts),
+            "restaurant_search": self.restaurant_search,
+            "done": self.done,
+        }
+
+    async def subscribe(
+        self,
+        last_event_id: int = 0,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> AsyncIterator[str]:
+        """Yield formatted SSE events after last_event_id, then follow the live reply"""
+        cursor = last_event_id
+        while True:
+            pending = [(i, data) for i, data in self.events if i > cursor]
+            oldest_buffered = self.events[0][0] if self.events else self.last_event_id + 1
+
+            if cursor < oldest_buffered - 1:
+                # Events the client missed were evicted; send the whole reply state instead
+                cursor = self.last_event_id
+                yield format_event(cursor, json.dumps({"resume_snapshot": self.snapshot()}))
+                if self.done:
+                    yield format_event(cursor, "[DONE]")
+                    return
+                continue
+
+            for event_id, data in pending:
+                yield format_event(event_id, data)
+                cursor = event_id
+
+            if pending:
+                continue
+            if self.done:
+                return
+            if is_disconnected and await is_disconnected():
+                return
+
+            wakeup = self._wakeup
+            if self.last_event_id == cursor and not self.done:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=DISCONNECT_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+class StreamRegistry:
+    def __init__(
+        self,
+        grace_seconds: float = STREAM_RESUME_GRACE_SECONDS,
+        linger_seconds: float = STREAM_LINGER_SECONDS,
+        state: Optional[SharedState] = None
+    ):
+        self.grace_seconds = grace_seconds
+        self.linger_seconds = linger_seconds
+        # Shared state to mirror replies into; None keeps replies process-local
+        self.state = state
+        self._streams: Dict[int, ReplyStream] = {}
+        self._tasks = set()
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def create(self, message_id: int, user_id: str) -> ReplyStream:
+        stream = ReplyStream(message_id, user_id)
+        self._streams[message_id] = stream
+        if self.state is not None:
+            stream.mirror_queue = asyncio.Queue()
+            self._spawn(self._mirror(stream))
+        return stream
+
+    def get(self, message_id: int) -> Optional[ReplyStream]:
+        return self._streams.get(message_id)
+
+    def start(self, stream: ReplyStream, producer: Awaitable[None]):
+        """Run the reply producer independently of any client connection"""
+        async def run():
+            try:
+                await producer
+            finally:
+                stream.finish()
+                asyncio.get_running_loop().call_later(self.linger_seconds, self._remove, stream)
+
+        stream.task = asyncio.create_task(run())
+
+    async def attach(
+        self,
+        stream: ReplyStream,
+        last_event_id: int = 0,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> AsyncIterator[str]:
+        """Follow a reply; when the last subscriber leaves early the reply is cancelled after a grace period"""
+        stream.subscribers += 1
+        try:
+            async for event in stream.subscribe(last_event_id, is_disconnected):
+                yield event
+        finally:
+            stream.subscribers -= 1
+            if stream.subscribers == 0 and not stream.done:
+                asyncio.get_running_loop().call_later(self.grace_seconds, self._cancel_if_abandoned, stream)
+
+    def _cancel_if_abandoned(self, stream: ReplyStream):
+        if stream.subscribers == 0 and not stream.done and stream.task:
+            if self.state is not None:
+                # A client may be following this reply from another worker
+                self._spawn(self._cancel_if_unwatched(stream))
+                return
+            print(f"No client reattached to reply {stream.message_id}, cancelling it")
+            stream.task.cancel()
+
+    async def _cancel_if_unwatched(self, stream: ReplyStream):
+        try:
+            watched = await self.state.get(watchers_key(stream.message_id)) is not None
+        except Exception as e:
+            print(f"Error checking remote watchers for reply {stream.message_id}: {e}")
+            watched = False
+        if watched:
+            asyncio.get_running_loop().call_later(self.grace_seconds, self._cancel_if_abandoned, stream)
+        elif stream.subscribers == 0 and not stream.done:
+            print(f"No client reattached to reply {stream.message_id}, cancelling it")
+            stream.task.cancel()
+
+    async def _mirror(self, stream: ReplyStream):
+        """Copy events to shared state in order: bounded event list, snapshot and pub/sub"""
+        ttl = STREAM_SHARED_TTL_SECONDS
+        finished = False
+        while not finished:
+            batch = [await stream.mirror_queue.get()]
+            while not stream.mirror_queue.empty():
+                batch.append(stream.mirror_queue.get_nowait())
+            finished = batch[-1] is None
+            events = [json.dumps(item) for item in batch if item is not None]
+
+            snapshot = {**stream.snapshot(), "user_id": stream.user_id, "last_event_id": stream.last_event_id}
+            snapshot["done"] = finished
+            try:
+                if events:
+                    await self.state.list_append(events_key(stream.message_id), events, stream.events.maxlen, ttl=ttl)
+                await self.state.set_json(snapshot_key(stream.message_id), snapshot, ttl=ttl)
+                for event in events + ([json.dumps(None)] if finished else []):
+                    await self.state.publish(channel_name(stream.message_id), event)
+            except Exception as e:
+                print(f"Error mirroring reply {stream.message_id}: {e}")
+
+    async def find_remote(self, message_id: int) -> Optional[Dict[str, Any]]:
+        """Snapshot of a reply mirrored by any worker, if shared state is enabled"""
+        if self.state is None:
+            return None
+        return await self.state.get_json(snapshot_key(message_id))
+
+    async def attach_remote(
+        self,
+        message_id: int,
+        last_event_id: int = 0,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> AsyncIterator[str]:
+        """Follow a reply produced on another worker through shared state"""
+        subscription = await self.state.subscribe(channel_name(message_id))
+        try:
+            # Subscribed first so nothing published from here on is missed
+            await self.state.set(watchers_key(message_id), "1", ttl=DISCONNECT_POLL_SECONDS * 3)
+            snapshot = await self.state.get_json(snapshot_key(message_id)) or {}
+            buffered = [json.loads(item) for item in await self.state.list_range(events_key(message_id))]
+
+            cursor = last_event_id
+            oldest_buffered = buffered[0][0] if buffered else snapshot.get("last_event_id", 0) + 1
+            if cursor < oldest_buffered - 1:
+                cursor = snapshot.get("last_event_id", 0)
+                public = {k: snapshot.get(k) for k in ("message_id", "content", "restaurant_search", "done")}
+                yield format_event(cursor, json.dumps({"resume_snapshot": public}))
+                if snapshot.get("done"):
+                    yield format_event(cursor, "[DONE]")
+                    return
+
+            for event_id, data in buffered:
+                if event_id > cursor:
+                    yield format_event(event_id, data)
+                    cursor = event_id
+            if snapshot.get("done") and cursor >= snapshot.get("last_event_id", 0):
+                return
+
+            loop = asyncio.get_running_loop()
+            watched_at = loop.time()
+            while True:
+                if loop.time() - watched_at >= DISCONNECT_POLL_SECONDS:
+                    # Keeps the producing worker from treating the reply as abandoned
+                    await self.state.set(watchers_key(message_id), "1", ttl=DISCONNECT_POLL_SECONDS * 3)
+                    watched_at = loop.time()
+                message = await subscription.get(timeout=DISCONNECT_POLL_SECONDS)
+                if message is None:
+                    if is_disconnected and await is_disconnected():
+                        return
+                    continue
+                item = json.loads(message)
+                if item is None:
+                    return
+                event_id, data = item
+                if event_id > cursor:
+                    yield format_event(event_id, data)
+                    cursor = event_id
+        finally:
+            await subscription.close()
+
+    def _remove(self, stream: ReplyStream):
+        if self._streams.get(stream.message_id) is stream:
+            del self._streams[stream.message_id]
+
+    def active_count(self) -> int:
+        return sum(1 for s in self._streams.values() if not s.done)
+
+# Mirroring only pays off when other workers can see the state
+stream_registry = StreamRegistry(state=shared_state if shared_state.is_shared else None)
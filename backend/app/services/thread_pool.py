@@ -0,0 +1,105 @@
+"""
+thread_pool.py
+
+Per-user pool of OpenAI threads created ahead of time.
+Each pooled thread already holds the user's personal greeting, so giving a
+new conversation a thread is a database operation instead of two upstream
+round trips (threads.create, then messages.create for the greeting).
+
+Key Features:
+- Pool kept in the database, shared by all workers and kept across restarts
+- Atomic take: two workers never hand out the same thread
+- Topped up in the background whenever a user starts a conversation
+- Threads older than THREAD_POOL_MAX_AGE_SECONDS are retired (deleted upstream)
+- Hit rate (takes served from the pool) in metrics
+
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any
+
+from ..core.database import SessionLocal
+from ..core.metrics import metrics
+from ..models.database_models import PooledThread
+
+# Ready threads kept per user; 0 disables the pool
+THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", "1"))
+THREAD_POOL_MAX_AGE_SECONDS = float(os.getenv("THREAD_POOL_MAX_AGE_SECONDS", "604800"))
+
+class ThreadPool:
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        size: int = THREAD_POOL_SIZE,
+        max_age_seconds: float = THREAD_POOL_MAX_AGE_SECONDS
+    ):
+        self.session_factory = session_factory
+        self.size = size
+        self.max_age_seconds = max_age_seconds
+
+    def _cutoff(self) -> datetime:
+        return datetime.now(timezone.utc) - timedelta(seconds=self.max_age_seconds)
+
+    def take(self, user_id: str) -> Optional[str]:
+        """A ready thread for the user, removed from the pool; None on a miss"""
+        if self.size <= 0:
+            return None
+        with self.session_factory() as db:
+            candidates = db.query(PooledThread.thread_id)\
+                .filter(PooledThread.user_id == user_id, PooledThread.created_at >= self._cutoff())\
+                .order_by(PooledThread.created_at)\
+                .limit(self.size + 1)\
+                .all()
+            for (thread_id,) in candidates:
+                # Whoever deletes the row owns the thread
+                taken = db.query(PooledThread).filter(PooledThread.thread_id == thread_id)\
+                    .delete(synchronize_session=False)
+                db.commit()
+                if taken:
+                    metrics.inc("thread_pool.hits")
+                    return thread_id
+        metrics.inc("thread_pool.misses")
+        return None
+
+    def missing(self, user_id: str) -> int:
+        """How many threads it takes to fill the user's pool"""
+        if self.size <= 0:
+            return 0
+        with self.session_factory() as db:
+            ready = db.query(PooledThread)\
+                .filter(PooledThread.user_id == user_id, PooledThread.created_at >= self._cutoff())\
+                .count()
+        return max(0, self.size - ready)
+
+    def add(self, user_id: str, thread_id: str):
+        with self.session_factory() as db:
+            db.add(PooledThread(thread_id=thread_id, user_id=user_id))
+            db.commit()
+
+    def take_expired(self, limit: int = 20) -> List[str]:
+        """Remove threads past their age from the pool and return them for deletion upstream"""
+        with self.session_factory() as db:
+            expired = [row[0] for row in db.query(PooledThread.thread_id)
+                       .filter(PooledThread.created_at < self._cutoff())
+                       .limit(limit).all()]
+            if expired:
+                db.query(PooledThread).filter(PooledThread.thread_id.in_(expired))\
+                    .delete(synchronize_session=False)
+                db.commit()
+        metrics.inc("thread_pool.expired", len(expired))
+        return expired
+
+    def stats(self) -> Dict[str, Any]:
+        hits = metrics.get("thread_pool.hits")
+        misses = metrics.get("thread_pool.misses")
+        return {
+            "size": self.size,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+        }
+
+thread_pool = ThreadPool()
+
+metrics.register_collector("thread_pool", thread_pool.stats)
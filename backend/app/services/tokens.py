@@ -0,0 +1,62 @@
+"""
+tokens.py
+
+Token counting and history truncation helpers for chat prompts.
+Uses tiktoken when it is installed and a character heuristic otherwise.
+
+Key Features:
+- Per-message token estimates
+- Token-budgeted history truncation
+- Optional tiktoken integration
+
+"""
+
+from typing import List, Dict, Any
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _encoding = None
+
+# Fixed overhead the chat format adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def count_tokens(text: str) -> int:
+    """Count tokens in a string (approximately 4 characters per token without tiktoken)"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+def count_message_tokens(message: Dict[str, Any]) -> int:
+    """Count tokens for a single chat message including format overhead"""
+    tokens = MESSAGE_OVERHEAD_TOKENS + count_tokens(message.get("content") or "")
+    for call in message.get("tool_calls") or []:
+        tokens += count_tokens(call["function"]["name"]) + count_tokens(call["function"]["arguments"])
+    return tokens
+
+def truncate_history(messages: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+    """Keep the newest messages that fit within the token budget.
+
+    The last message (the user's current turn) is always kept, even if it
+    exceeds the budget on its own.
+    """
+    if not messages:
+        return []
+
+    kept = [messages[-1]]
+    used = count_message_tokens(messages[-1])
+    for message in reversed(messages[:-1]):
+        tokens = count_message_tokens(message)
+        if used + tokens > budget:
+            break
+        kept.append(message)
+        used += tokens
+
+    kept.reverse()
+    # A reply without the question it answers only confuses the model
+    while len(kept) > 1 and kept[0]["role"] != "user":
+        kept.pop(0)
+    return kept
@@ -0,0 +1,207 @@
+"""
+yelp_client.py
+
+Client for the Yelp Fusion API, shared by the Yelp router and background
+services (snapshots).
+
+Key Features:
+- Search parameter building and paginated searches with result filtering
+- Request retrying for reliability
+- Circuit breaker, jittered retries and optional hedged GETs
+- Response cache shared between workers, one upstream fetch per miss
+- Search locations canonicalized, so spellings of one city share cached results
+- Upstream failures surfaced as HTTPException
+
+"""
+
+from fastapi import HTTPException
+from typing import Optional
+import httpx
+import os
+import time
+from urllib.parse import urlencode
+from ..core.resilience import (
+    UpstreamError, CircuitOpenError, DeadlineExceeded, RetryPolicy, LatencyTracker,
+    call_with_retry, deadline_timeout, get_breaker, hedged
+)
+from ..core.shared_state import shared_state
+from .locations import location_resolver
+
+YELP_API_KEY=os.getenv("YELP_API_KEY")
+
+YELP_API_BASE_URL = os.getenv("YELP_API_BASE_URL", "https://api.yelp.com/v3")
+
+# Per-attempt timeout, further capped by the request deadline
+YELP_TIMEOUT_SECONDS = float(os.getenv("YELP_TIMEOUT_SECONDS", "10"))
+YELP_MAX_ATTEMPTS = int(os.getenv("YELP_MAX_ATTEMPTS", "3"))
+# Send a second copy of a slow GET once it passes the observed p95 latency
+YELP_HEDGE_ENABLED = os.getenv("YELP_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+YELP_HEDGE_DELAY_SECONDS = float(os.getenv("YELP_HEDGE_DELAY_SECONDS", "1.0"))
+# 0 disables the response cache
+YELP_CACHE_TTL_SECONDS = float(os.getenv("YELP_CACHE_TTL_SECONDS", "600"))
+
+yelp_breaker = get_breaker("yelp")
+yelp_retry = RetryPolicy(attempts=YELP_MAX_ATTEMPTS)
+yelp_latency = LatencyTracker()
+
+def convert_price_to_yelp_format(price: str) -> str:
+    """Convert dollar signs to Yelp's number format"""
+    if not price:
+        return None
+    
+    # Map dollar signs to numbers
+    price_map = {
+        "$": "1",
+        "$$": "2",
+        "$$$": "3",
+        "$$$$": "4"
+    }
+    return price_map.get(price)
+
+def build_search_params(term: Optional[str], location: str, price: Optional[str], sort_by: Optional[str], desired_count: int) -> dict:
+    """Yelp search parameters for a restaurant search"""
+    params = {
+        "term": term,
+        "location": location,
+        "sort_by": sort_by,
+        "limit": min(desired_count * 3, 50),  # Triple the requested amount, max 50
+    }
+
+    # Add price if specified
+    if price:
+        yelp_price = convert_price_to_yelp_format(price)
+        if yelp_price:
+            params["price"] = yelp_price
+
+    # Remove None values
+    return {k: v for k, v in params.items() if v is not None}
+
+async def _yelp_get(url: str, headers: dict, params: dict = None):
+    """Single GET attempt against the Yelp API"""
+    started = time.monotonic()
+    async with httpx.AsyncClient() as client:
+        response = await client.get(
+            url,
+            headers=headers,
+            params=params,
+            timeout=deadline_timeout(YELP_TIMEOUT_SECONDS)
+        )
+    yelp_latency.record(time.monotonic() - started)
+
+    print(f"Response Status: {response.status_code}")
+    if response.status_code != 200:
+        print(f"Error Response: {response.text}")
+        raise UpstreamError(response.status_code, response.text)
+    return response.json()
+
+async def make_yelp_request(path: str, params: dict = None):
+    """Make a request to Yelp API"""
+    headers = {
+        "Authorization": f"Bearer {YELP_API_KEY}",
+        "Accept": "application/json",
+    }
+    
+    url = f"{YELP_API_BASE_URL}{path}"
+    print(f"\n=== YELP API REQUEST ===")
+    print(f"URL: {url}")
+    print(f"Params: {params}")
+
+    def attempt():
+        if YELP_HEDGE_ENABLED:
+            delay = yelp_latency.percentile(0.95) or YELP_HEDGE_DELAY_SECONDS
+            return hedged(lambda: _yelp_get(url, headers, params), delay, name="yelp")
+        return _yelp_get(url, headers, params)
+
+    def fetch():
+        # Every Yelp call is a GET, so retrying is safe
+        return call_with_retry(attempt, breaker=yelp_breaker, policy=yelp_retry)
+
+    try:
+        if YELP_CACHE_TTL_SECONDS > 0:
+            key = f"yelp:{path}?{urlencode(sorted((params or {}).items()))}"
+            return await shared_state.cached(key, fetch, ttl=YELP_CACHE_TTL_SECONDS)
+        return await fetch()
+
+    except UpstreamError as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=f"Yelp API error: {e.detail}"
+        )
+    except CircuitOpenError as e:
+        print("Yelp circuit is open, failing fast")
+        raise HTTPException(
+            status_code=503,
+            detail="Yelp API is temporarily unavailable",
+            headers={"Retry-After": str(max(1, round(e.retry_after)))}
+        )
+    except (httpx.TimeoutException, DeadlineExceeded):
+        print("Request timed out")
+        raise HTTPException(
+            status_code=504,
+            detail="Request to Yelp API timed out"
+        )
+    except httpx.RequestError as e:
+        print(f"Request error: {str(e)}")
+        raise HTTPException(
+            status_code=502,
+            detail=f"Error making request to Yelp API: {str(e)}"
+        )
+    except Exception as e:
+        print(f"Unexpected error: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Unexpected error: {str(e)}"
+        )
+
+async def fetch_businesses_with_retry(params: dict, desired_count: int) -> dict:
+    """Fetch businesses with retries and pagination until we get enough valid results"""
+    all_businesses = []
+    offset = 0
+    max_attempts = 3  # Limit the number of pagination attempts
+
+    # "Atlanta, GA" and "atlanta georgia" become one search (and one cache key)
+    location = await location_resolver.resolve(params.get("location"))
+    params = {**params, "location": location}
+    
+    while len(all_businesses) < desired_count and max_attempts > 0:
+        try:
+            # Update offset in params
+            current_params = {**params, 'offset': offset}
+            print(f"Fetching businesses with params: {current_params}")
+            
+            response = await make_yelp_request("/businesses/search", current_params)
+            
+            if not response or 'businesses' not in response:
+                break
+            if offset == 0:
+                await location_resolver.learn(location, response.get('region'))
+                
+            # Filter valid businesses
+            valid_businesses = [
+                b for b in response['businesses']
+                if b.get('review_count', 0) > 0  # Has reviews
+                and b.get('rating') is not None  # Has rating
+                and b.get('name')  # Has name
+                and b not in all_businesses  # No duplicates
+            ]
+            
+            all_businesses.extend(valid_businesses)
+            
+            # If we didn't get any valid businesses or there are no more results
+            if not valid_businesses or not response['businesses']:
+                break
+                
+            offset += len(response['businesses'])
+            max_attempts -= 1
+            
+        except HTTPException:
+            # Upstream failures (including an open circuit) fail the search instead of returning nothing
+            raise
+        except Exception as e:
+            print(f"Error in fetch attempt: {str(e)}")
+            break
+    
+    return {
+        'businesses': all_businesses[:desired_count],
+        'total': len(all_businesses)
+    }
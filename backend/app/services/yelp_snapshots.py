@@ -0,0 +1,183 @@
+"""
+yelp_snapshots.py
+
+Stored Yelp results for bot messages.
+When a reply includes a restaurant search, the businesses it resolved to are
+saved with the message, so reopening a conversation shows the same cards
+without re-running every search against Yelp.
+
+Key Features:
+- Compact per-message snapshot (ids, names, ratings, photos, fetched_at)
+- Captured through the background task queue once a reply is saved
+- Staleness threshold with optional background refresh (empty snapshots always count as stale)
+- Bounded concurrency for per-business detail lookups
+- Duplicate captures of the same message collapsed
+- Capture and refresh counters in metrics
+- Database writes in the offload pool, off the event loop
+
+"""
+
+import asyncio
+import os
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+
+from fastapi import HTTPException
+
+from .yelp_client import build_search_params, fetch_businesses_with_retry, make_yelp_request
+from ..core.database import SessionLocal
+from ..core.metrics import metrics
+from ..core.offload import run_sync
+from ..core.responses import Fragment
+from ..core.task_queue import task_queue
+from ..models.database_models import Message as MessageModel, Conversation as ConversationModel, YelpSnapshot
+
+# Snapshots older than this are served but flagged stale (and refreshed if enabled)
+YELP_SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv("YELP_SNAPSHOT_MAX_AGE_SECONDS", "86400"))
+YELP_SNAPSHOT_REFRESH = os.getenv("YELP_SNAPSHOT_REFRESH", "true").lower() in ("1", "true", "yes")
+YELP_SNAPSHOT_DETAIL_CONCURRENCY = int(os.getenv("YELP_SNAPSHOT_DETAIL_CONCURRENCY", "4"))
+
+# What the restaurant cards need; everything else Yelp returns is dropped
+BUSINESS_FIELDS = (
+    "id", "name", "rating", "review_count", "price", "image_url", "url",
+    "categories", "location", "coordinates", "hours",
+)
+MAX_PHOTOS = 3
+
+def compact_business(business: dict, details: Optional[dict] = None) -> dict:
+    merged = {**business, **(details or {})}
+    compact = {field: merged[field] for field in BUSINESS_FIELDS if merged.get(field) is not None}
+    photos = merged.get("photos") or ([merged["image_url"]] if merged.get("image_url") else [])
+    compact["photos"] = photos[:MAX_PHOTOS]
+    return compact
+
+def desired_count(search: dict) -> int:
+    # Same bounds the frontend applies to k
+    k = search.get("k")
+    return max(1, min(int(k), 5)) if k else 20
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; they were written in UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+class YelpSnapshotService:
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        max_age_seconds: float = YELP_SNAPSHOT_MAX_AGE_SECONDS,
+        refresh_enabled: bool = YELP_SNAPSHOT_REFRESH,
+        detail_concurrency: int = YELP_SNAPSHOT_DETAIL_CONCURRENCY
+    ):
+        self.session_factory = session_factory
+        self.max_age_seconds = max_age_seconds
+        self.refresh_enabled = refresh_enabled
+        self.detail_concurrency = detail_concurrency
+        self._in_flight: set = set()
+
+    def is_stale(self, snapshot: YelpSnapshot, now: Optional[datetime] = None) -> bool:
+        """Older than the max age, or empty (nothing was found, or the search failed)"""
+        if not snapshot.load_businesses():
+            return True
+        now = now or datetime.now(timezone.utc)
+        return (now - _as_utc(snapshot.fetched_at)).total_seconds() > self.max_age_seconds
+
+    def serialize(self, snapshot: Optional[YelpSnapshot]) -> Optional[Dict[str, Any]]:
+        if snapshot is None:
+            return None
+        return {
+            # Stored as compact JSON already; spliced into the response without decoding
+            "businesses": Fragment(snapshot.businesses or "[]"),
+            "fetched_at": _as_utc(snapshot.fetched_at).isoformat(),
+            "stale": self.is_stale(snapshot),
+        }
+
+    def needs_refresh(self, message: MessageModel, search: Optional[dict]) -> bool:
+        """Bot message with a search whose snapshot is missing or stale"""
+        if not self.refresh_enabled or not search or message.sender != "bot":
+            return False
+        return message.snapshot is None or self.is_stale(message.snapshot)
+
+    async def fetch(self, search: dict) -> List[dict]:
+        """Resolve a restaurant search the way the frontend does: search, then details per business"""
+        count = desired_count(search)
+        params = build_search_params(search.get("term"), search.get("location"), search.get("price"), search.get("sort_by"), count)
+        data = await fetch_businesses_with_retry(params, count)
+
+        semaphore = asyncio.Semaphore(self.detail_concurrency)
+
+        async def with_details(business: dict) -> dict:
+            async with semaphore:
+                try:
+                    details = await make_yelp_request(f"/businesses/{business['id']}")
+                except HTTPException as e:
+                    print(f"Snapshot details failed for {business['id']}: {e.detail}")
+                    details = None
+            return compact_business(business, details)
+
+        return list(await asyncio.gather(*(with_details(b) for b in data["businesses"])))
+
+    async def capture(self, message_id: int, search: dict) -> Optional[List[dict]]:
+        """Fetch and store the snapshot for one message; concurrent calls for it are dropped"""
+        if message_id in self._in_flight:
+            return None
+        if not search or not search.get("location"):
+            return None
+
+        self._in_flight.add(message_id)
+        try:
+            businesses = await self.fetch(search)
+        except Exception as e:
+            metrics.inc("yelp_snapshots.failed")
+            print(f"Failed to capture Yelp snapshot for message {message_id}: {e}")
+            return None
+        finally:
+            self._in_flight.discard(message_id)
+
+        if not businesses:
+            # Nothing to show (or a failed search): keep the last good result, or leave the
+            # message without a snapshot so the next open tries again
+            metrics.inc("yelp_snapshots.empty")
+            print(f"No businesses for message {message_id}; snapshot not stored")
+            return None
+
+        refreshed = await run_sync(self._store, message_id, businesses)
+        if refreshed is None:
+            # Deleted while we were fetching
+            return None
+        metrics.inc("yelp_snapshots.refreshed" if refreshed else "yelp_snapshots.captured")
+        print(f"Stored Yelp snapshot for message {message_id} ({len(businesses)} businesses)")
+        return businesses
+
+    def _store(self, message_id: int, businesses: List[dict]) -> Optional[bool]:
+        """Save a snapshot; True if it replaced one, None if the message is gone"""
+        with self.session_factory() as db:
+            message = db.get(MessageModel, message_id)
+            if message is None:
+                return None
+            refreshed = message.snapshot is not None
+            if not refreshed:
+                message.snapshot = YelpSnapshot()
+            message.snapshot.save_businesses(businesses)
+            message.snapshot.fetched_at = datetime.now(timezone.utc)
+            ConversationModel.touch(db, message.conversation_id)
+            db.commit()
+        return refreshed
+
+    async def refresh_many(self, items: Iterable[Tuple[int, dict]]):
+        """Capture one after another, so opening a long conversation doesn't burst Yelp"""
+        for message_id, search in items:
+            await self.capture(message_id, search)
+
+    def schedule(self, message_id: int, search: dict):
+        """Capture through the task queue (persisted, so a restart doesn't lose it)"""
+        return task_queue.enqueue(
+            "yelp_snapshot", {"message_id": message_id, "search": search},
+            key=f"yelp_snapshot:{message_id}", persist=True
+        )
+
+yelp_snapshots = YelpSnapshotService()
+
+async def capture_snapshot(message_id: int, search: dict):
+    await yelp_snapshots.capture(message_id, search)
+
+task_queue.register("yelp_snapshot", capture_snapshot)
@@ -0,0 +1,20 @@
+"""
+Shared pytest fixtures.
+"""
+
+import pytest
+from contextlib import contextmanager
+
+from app.core.query_profiler import track_queries
+
+@pytest.fixture
+def query_budget():
+    """Fail if a block issues more SQL statements than allowed: `with query_budget(5): ...`"""
+
+    @contextmanager
+    def budget(limit: int):
+        with track_queries() as stats:
+            yield stats
+        assert stats.count <= limit, f"{stats.count} queries, budget {limit}:\n" + "\n".join(stats.statements)
+
+    return budget
@@ -0,0 +1,96 @@
+"""
+Local stand-in for Google's OAuth certificate endpoint.
+Serves a self-signed signing certificate in the same format as
+https://www.googleapis.com/oauth2/v1/certs and mints ID tokens signed with
+its key, so sign-in can be exercised without Google (point GOOGLE_CERTS_URL
+at certs_url).
+"""
+
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt
+
+KEY_ID = "fake-google-key"
+
+class FakeGoogleCertsServer:
+    """Threaded HTTP server for the certificate endpoint, plus a token minter"""
+
+    def __init__(self):
+        self.requests = []
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "fake-google")])
+        now = datetime.now(timezone.utc)
+        certificate = x509.CertificateBuilder()\
+            .subject_name(name).issuer_name(name)\
+            .public_key(key.public_key())\
+            .serial_number(x509.random_serial_number())\
+            .not_valid_before(now - timedelta(days=1))\
+            .not_valid_after(now + timedelta(days=1))\
+            .sign(key, hashes.SHA256())
+        self._certs = json.dumps({
+            KEY_ID: certificate.public_bytes(serialization.Encoding.PEM).decode()
+        }).encode()
+        key_pem = key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        )
+        self._signer = crypt.RSASigner.from_string(key_pem, key_id=KEY_ID)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def certs_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/oauth2/v1/certs"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def make_token(self, audience: str, sub: str, email: str, name: str, ttl: int = 3600,
+                   issuer: str = "https://accounts.google.com") -> str:
+        """An ID token as Google would issue it for the given user"""
+        now = int(time.time())
+        payload = {
+            "iss": issuer,
+            "aud": audience,
+            "sub": sub,
+            "email": email,
+            "name": name,
+            "picture": f"https://lh3.example.com/{sub}.jpg",
+            "iat": now,
+            "exp": now + ttl,
+        }
+        return jwt.encode(self._signer, payload).decode()
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with fake._lock:
+                    fake.requests.append(self.path)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(fake._certs)))
+                self.end_headers()
+                self.wfile.write(fake._certs)
+
+        return Handler
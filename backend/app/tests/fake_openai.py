@@ -0,0 +1,273 @@
+"""
+Local fake OpenAI server for tests.
+Serves canned streaming chat completions and Assistants threads/runs over real
+HTTP, and records every request.
+"""
+
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def text_reply(text: str, chunk_size: int = 8) -> dict:
+    """Script a streamed text reply"""
+    return {"text": text, "chunk_size": chunk_size}
+
+def tool_reply(arguments: dict, name: str = "search_restaurants") -> dict:
+    """Script a streamed search_restaurants tool call"""
+    return {"tool_call": {"name": name, "arguments": json.dumps(arguments)}}
+
+class FakeOpenAIServer:
+    """Threaded HTTP server speaking the subset of the OpenAI API the app uses"""
+
+    def __init__(self, run_polls: int = 2):
+        self.requests = []
+        self.chat_scripts = []
+        # Replies for Assistants runs, consumed in order (same format as chat_scripts)
+        self.run_scripts = []
+        # Number of retrieve calls a run stays in_progress before finishing
+        self.run_polls = run_polls
+        self.threads = {}
+        self.runs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def calls(self, method: str = None, path_prefix: str = "") -> list:
+        with self._lock:
+            return [
+                r for r in self.requests
+                if (method is None or r["method"] == method) and r["path"].startswith(path_prefix)
+            ]
+
+    def _record(self, method: str, path: str, body: dict):
+        with self._lock:
+            self.requests.append({"method": method, "path": path, "body": body})
+
+    def _next_chat_script(self) -> dict:
+        with self._lock:
+            if self.chat_scripts:
+                return self.chat_scripts.pop(0)
+        return text_reply("Hello from the fake server!")
+
+    def _next_id(self, prefix: str) -> str:
+        return f"{prefix}_{next(self._ids)}"
+
+    # --- Assistants API state -------------------------------------------
+
+    def _create_thread(self, messages: list) -> dict:
+        thread_id = self._next_id("thread")
+        with self._lock:
+            self.threads[thread_id] = []
+        for message in messages or []:
+            self._add_message(thread_id, message["role"], message["content"])
+        return {"id": thread_id, "object": "thread", "created_at": int(time.time()), "metadata": {}}
+
+    def _add_message(self, thread_id: str, role: str, content: str) -> dict:
+        message = {
+            "id": self._next_id("msg"),
+            "object": "thread.message",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "role": role,
+            "content": [{"type": "text", "text": {"value": content, "annotations": []}}],
+        }
+        with self._lock:
+            self.threads.setdefault(thread_id, []).append(message)
+        return message
+
+    def _create_run(self, thread_id: str, body: dict) -> dict:
+        for message in body.get("additional_messages") or []:
+            self._add_message(thread_id, message["role"], message["content"])
+        with self._lock:
+            script = self.run_scripts.pop(0) if self.run_scripts else text_reply("Hello from the fake assistant!")
+        run = {
+            "id": self._next_id("run"),
+            "object": "thread.run",
+            "thread_id": thread_id,
+            "assistant_id": body.get("assistant_id"),
+            "status": "queued",
+            "polls": 0,
+            "script": script,
+        }
+        with self._lock:
+            self.runs[run["id"]] = run
+        return self._public_run(run)
+
+    def _poll_run(self, run_id: str) -> dict:
+        with self._lock:
+            run = self.runs[run_id]
+            if run["status"] in ("queued", "in_progress"):
+                run["polls"] += 1
+                run["status"] = "in_progress"
+                if run["polls"] >= self.run_polls:
+                    run["status"] = "requires_action" if "tool_call" in run["script"] else "completed"
+            finished = run["status"] == "completed" and not run.get("replied")
+            if finished:
+                run["replied"] = True
+        if finished:
+            self._add_message(run["thread_id"], "assistant", run["script"].get("text", ""))
+        return self._public_run(run)
+
+    def _submit_tool_outputs(self, run_id: str) -> dict:
+        with self._lock:
+            run = self.runs[run_id]
+            run["script"] = text_reply(run["script"].get("text", "Here you go!"))
+            run["status"] = "in_progress"
+            run["polls"] = 0
+        return self._public_run(run)
+
+    def _cancel_run(self, run_id: str) -> dict:
+        with self._lock:
+            run = self.runs[run_id]
+            run["status"] = "cancelled"
+        return self._public_run(run)
+
+    def _public_run(self, run: dict) -> dict:
+        public = {k: v for k, v in run.items() if k not in ("polls", "script", "replied")}
+        if run["status"] == "requires_action":
+            call = run["script"]["tool_call"]
+            public["required_action"] = {
+                "type": "submit_tool_outputs",
+                "submit_tool_outputs": {"tool_calls": [{
+                    "id": "call_fake", "type": "function",
+                    "function": {"name": call["name"], "arguments": call["arguments"]},
+                }]},
+            }
+        return public
+
+    def _route(self, method: str, path: str, body: dict):
+        path = path.split("?")[0]
+        if method == "POST" and path == "/v1/assistants":
+            return {"id": "asst_fake", "object": "assistant", "model": body.get("model"), "tools": []}
+        if method == "POST" and path == "/v1/threads":
+            return self._create_thread(body.get("messages"))
+        if method == "POST" and path == "/v1/threads/runs":
+            thread = self._create_thread((body.get("thread") or {}).get("messages"))
+            return self._create_run(thread["id"], body)
+
+        match = re.fullmatch(r"/v1/threads/([^/]+)", path)
+        if match and method == "DELETE":
+            with self._lock:
+                deleted = self.threads.pop(match.group(1), None) is not None
+            return {"id": match.group(1), "object": "thread.deleted", "deleted": deleted}
+
+        match = re.fullmatch(r"/v1/threads/([^/]+)/messages", path)
+        if match and method == "POST":
+            return self._add_message(match.group(1), body["role"], body["content"])
+        if match and method == "GET":
+            with self._lock:
+                messages = list(reversed(self.threads.get(match.group(1), [])))
+            return {"object": "list", "data": messages, "has_more": False}
+
+        match = re.fullmatch(r"/v1/threads/([^/]+)/runs", path)
+        if match and method == "POST":
+            return self._create_run(match.group(1), body)
+
+        match = re.fullmatch(r"/v1/threads/([^/]+)/runs/([^/]+)(/submit_tool_outputs|/cancel)?", path)
+        if match and match.group(2) in self.runs:
+            action = match.group(3)
+            if method == "GET" and not action:
+                return self._poll_run(match.group(2))
+            if method == "POST" and action == "/submit_tool_outputs":
+                return self._submit_tool_outputs(match.group(2))
+            if method == "POST" and action == "/cancel":
+                return self._cancel_run(match.group(2))
+        return None
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _read_body(self) -> dict:
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                return json.loads(raw) if raw else {}
+
+            def _send_json(self, payload: dict, status: int = 200):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = self._read_body()
+                fake._record("POST", self.path, body)
+                if self.path == "/v1/chat/completions":
+                    return self._stream_chat(fake._next_chat_script())
+                self._respond(fake._route("POST", self.path, body))
+
+            def do_GET(self):
+                fake._record("GET", self.path, {})
+                self._respond(fake._route("GET", self.path, {}))
+
+            def do_DELETE(self):
+                fake._record("DELETE", self.path, {})
+                self._respond(fake._route("DELETE", self.path, {}))
+
+            def _respond(self, payload):
+                if payload is None:
+                    return self._send_json({"error": {"message": f"Unknown path {self.path}"}}, status=404)
+                self._send_json(payload)
+
+            def _stream_chat(self, script: dict):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+
+                def chunk(delta: dict, finish_reason=None):
+                    payload = {
+                        "id": "chatcmpl-fake",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": "fake-model",
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+                    self.wfile.flush()
+
+                chunk({"role": "assistant", "content": ""})
+                if "tool_call" in script:
+                    call = script["tool_call"]
+                    chunk({"tool_calls": [{
+                        "index": 0, "id": "call_fake", "type": "function",
+                        "function": {"name": call["name"], "arguments": ""},
+                    }]})
+                    arguments = call["arguments"]
+                    for i in range(0, len(arguments), 10):
+                        chunk({"tool_calls": [{"index": 0, "function": {"arguments": arguments[i:i + 10]}}]})
+                    chunk({}, finish_reason="tool_calls")
+                else:
+                    text, size = script["text"], script["chunk_size"]
+                    for i in range(0, len(text), size):
+                        chunk({"content": text[i:i + size]})
+                    chunk({}, finish_reason="stop")
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
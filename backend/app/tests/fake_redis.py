@@ -0,0 +1,168 @@
+"""
+Local Redis-compatible stand-in for tests.
+Speaks enough RESP2 for the shared-state backend: strings with expiry,
+compare-and-delete via EVAL, bounded lists and pub/sub.
+"""
+
+import socketserver
+import threading
+import time
+
+def encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return f":{value}\r\n".encode()
+    if isinstance(value, list):
+        return f"*{len(value)}\r\n".encode() + b"".join(encode(v) for v in value)
+    data = value.encode() if isinstance(value, str) else value
+    return f"${len(data)}\r\n".encode() + data + b"\r\n"
+
+OK = b"+OK\r\n"
+
+class FakeRedisServer:
+    """Threaded TCP server holding one in-memory keyspace"""
+
+    def __init__(self):
+        self.commands = []
+        # Seconds to wait before each reply
+        self.reply_delay = 0
+        self._values = {}
+        self._expires = {}
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"redis://{host}:{port}/0"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _live(self, key):
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self._values.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._values
+
+    def execute(self, args, connection):
+        name = args[0].upper()
+        with self._lock:
+            self.commands.append(name)
+            if name in ("PING", "SELECT", "AUTH"):
+                return OK
+            if name == "GET":
+                return encode(self._values[args[1]] if self._live(args[1]) else None)
+            if name == "SET":
+                key, value, options = args[1], args[2], [a.upper() for a in args[3:]]
+                if "NX" in options and self._live(key):
+                    return encode(None)
+                self._values[key] = value
+                self._expires.pop(key, None)
+                if "PX" in options:
+                    self._expires[key] = time.monotonic() + int(args[3 + options.index("PX") + 1]) / 1000
+                if "EX" in options:
+                    self._expires[key] = time.monotonic() + int(args[3 + options.index("EX") + 1])
+                return OK
+            if name == "DEL":
+                return encode(sum(1 for key in args[1:] if self._values.pop(key, None) is not None))
+            if name == "EVAL":
+                # The only script the app sends: delete KEYS[1] if it equals ARGV[1]
+                key, value = args[3], args[4]
+                if self._live(key) and self._values[key] == value:
+                    del self._values[key]
+                    return encode(1)
+                return encode(0)
+            if name == "RPUSH":
+                if not self._live(args[1]):
+                    self._values[args[1]] = []
+                self._values[args[1]].extend(args[2:])
+                return encode(len(self._values[args[1]]))
+            if name == "LTRIM":
+                items = self._values.get(args[1], [])
+                start, stop = int(args[2]), int(args[3])
+                stop = len(items) if stop == -1 else stop + 1
+                self._values[args[1]] = items[start:stop] if start >= 0 else items[max(len(items) + start, 0):stop]
+                return OK
+            if name == "LRANGE":
+                return encode(list(self._values[args[1]]) if self._live(args[1]) else [])
+            if name == "PEXPIRE":
+                if not self._live(args[1]):
+                    return encode(0)
+                self._expires[args[1]] = time.monotonic() + int(args[2]) / 1000
+                return encode(1)
+            if name == "PUBLISH":
+                subscribers = list(self._subscribers.get(args[1], ()))
+            elif name == "SUBSCRIBE":
+                self._subscribers.setdefault(args[1], []).append(connection)
+                return encode(["subscribe", args[1], 1])
+            else:
+                return f"-ERR unknown command '{name}'\r\n".encode()
+
+        # PUBLISH: write outside the keyspace lock
+        delivered = 0
+        for subscriber in subscribers:
+            try:
+                subscriber.send(encode(["message", args[1], args[2]]))
+                delivered += 1
+            except OSError:
+                pass
+        return encode(delivered)
+
+    def disconnect(self, connection):
+        with self._lock:
+            for subscribers in self._subscribers.values():
+                if connection in subscribers:
+                    subscribers.remove(connection)
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def setup(self):
+                super().setup()
+                self.send_lock = threading.Lock()
+
+            def send(self, data: bytes):
+                with self.send_lock:
+                    self.wfile.write(data)
+                    self.wfile.flush()
+
+            def read_command(self):
+                line = self.rfile.readline()
+                if not line:
+                    return None
+                count = int(line[1:-2])
+                args = []
+                for _ in range(count):
+                    length = int(self.rfile.readline()[1:-2])
+                    args.append(self.rfile.read(length + 2)[:-2].decode())
+                return args
+
+            def handle(self):
+                try:
+                    while True:
+                        args = self.read_command()
+                        if args is None:
+                            return
+                        if fake.reply_delay:
+                            time.sleep(fake.reply_delay)
+                        self.send(fake.execute(args, self))
+                except (ConnectionError, OSError, ValueError):
+                    pass
+                finally:
+                    fake.disconnect(self)
+
+        return Handler
@@ -0,0 +1,112 @@
+"""
+Local fault-injecting Yelp stub for tests.
+Serves canned business search/details/reviews responses (and placeholder
+images under /images/) and can be told to fail or stall specific requests.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Served for any /images/ path, standing in for Yelp's photo CDN
+FAKE_IMAGE = b"\xff\xd8\xff\xe0" + bytes(16 * 1024)
+
+def make_business(i: int) -> dict:
+    return {
+        "id": f"biz-{i}",
+        "name": f"Restaurant {i}",
+        "rating": 4.5,
+        "review_count": 10 + i,
+        "price": "$$",
+        "image_url": f"https://s3-media.example.com/biz-{i}.jpg",
+        "url": f"https://www.yelp.com/biz/biz-{i}",
+        "categories": [{"alias": "ramen", "title": "Ramen"}],
+        "coordinates": {"latitude": 30.27, "longitude": -97.74},
+        "location": {"address1": f"{i} Main St", "city": "Austin"},
+        "distance": 1234.5,
+        "transactions": ["pickup"],
+    }
+
+class FakeYelpServer:
+    """Threaded HTTP server for the Yelp Fusion endpoints the app uses"""
+
+    def __init__(self):
+        self.requests = []
+        # Faults consumed in order, one per request: {"status": 503} or {"delay": 1.5}
+        self.faults = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v3"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _next_fault(self) -> dict:
+        with self._lock:
+            return self.faults.pop(0) if self.faults else {}
+
+    def _route(self, path: str):
+        path = path.split("?")[0]
+        if path == "/v3/businesses/search":
+            region = {"center": {"latitude": 30.2672, "longitude": -97.7431}}
+            return {"businesses": [make_business(i) for i in range(10)], "total": 10, "region": region}
+        parts = path.split("/")
+        if len(parts) == 4 and parts[2] == "businesses":
+            photos = [f"https://s3-media.example.com/{parts[3]}-{n}.jpg" for n in range(5)]
+            return {**make_business(0), "id": parts[3], "photos": photos, "hours": [{"is_open_now": True}]}
+        if len(parts) == 5 and parts[4] == "reviews":
+            return {"reviews": [{"id": "r1", "rating": 5, "text": "Great!"}], "total": 1}
+        return None
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with fake._lock:
+                    fake.requests.append(self.path)
+                fault = fake._next_fault()
+                if "delay" in fault:
+                    time.sleep(fault["delay"])
+
+                if self.path.startswith("/images/"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "image/jpeg")
+                    self.send_header("Content-Length", str(len(FAKE_IMAGE)))
+                    self.end_headers()
+                    self.wfile.write(FAKE_IMAGE)
+                    return
+
+                payload = fake._route(self.path)
+                status = fault.get("status", 200 if payload is not None else 404)
+                if status != 200:
+                    payload = {"error": {"code": "FAULT", "description": f"Injected {status}"}}
+
+                body = json.dumps(payload).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up on a stalled request
+                    pass
+
+        return Handler
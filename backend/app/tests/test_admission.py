@@ -0,0 +1,100 @@
+"""
+Tests for admission control of reply streams.
+"""
+
+import asyncio
+import time
+import pytest
+from fastapi import HTTPException
+
+from app.api import messages
+from app.models.database_models import User
+from app.models.message import MessageCreate
+from app.services.admission import AdmissionController, AdmissionRejected
+
+@pytest.mark.asyncio
+async def test_same_conversation_runs_one_reply_at_a_time():
+    controller = AdmissionController(max_per_user=5, max_per_conversation=1, rate_per_minute=6000, burst=10)
+    first = await controller.acquire("u1", 1)
+
+    waiter = asyncio.create_task(controller.acquire("u1", 1))
+    other = await controller.acquire("u1", 2)
+    await asyncio.sleep(0.05)
+    assert not waiter.done()
+    assert controller.stats()["queue_depth"] == 1
+
+    first.release()
+    second = await asyncio.wait_for(waiter, timeout=1)
+    assert controller.stats()["active"] == 2
+    second.release()
+    other.release()
+    assert controller.stats()["active"] == 0
+
+@pytest.mark.asyncio
+async def test_per_user_limit_applies_across_conversations():
+    controller = AdmissionController(max_per_user=2, max_per_conversation=1, queue_timeout=0.1)
+    await controller.acquire("u1", 1)
+    await controller.acquire("u1", 2)
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire("u1", 3)
+    assert rejected.value.retry_after >= 1
+
+    # Other users are unaffected
+    await controller.acquire("u2", 4)
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_immediately():
+    controller = AdmissionController(max_per_conversation=1, queue_size=1, queue_timeout=5)
+    await controller.acquire("u1", 1)
+    waiter = asyncio.create_task(controller.acquire("u1", 1))
+    await asyncio.sleep(0.01)
+
+    start = time.monotonic()
+    with pytest.raises(AdmissionRejected):
+        await controller.acquire("u2", 1)
+    assert time.monotonic() - start < 0.1
+    waiter.cancel()
+
+@pytest.mark.asyncio
+async def test_token_bucket_paces_new_replies():
+    # 1200/min = one token every 50 ms after a burst of 2
+    controller = AdmissionController(max_per_user=10, max_per_conversation=10, rate_per_minute=1200, burst=2)
+    start = time.monotonic()
+    for _ in range(4):
+        (await controller.acquire("u1", 1)).release()
+    assert time.monotonic() - start >= 0.09
+
+@pytest.mark.asyncio
+async def test_stream_endpoint_returns_429_with_retry_after(monkeypatch):
+    controller = AdmissionController(max_per_conversation=1, queue_size=0)
+    monkeypatch.setattr(messages, "admission", controller)
+    monkeypatch.setattr(messages, "owns_conversation", lambda db, conversation_id, user_id: True)
+    await controller.acquire("u1", 1)
+
+    with pytest.raises(HTTPException) as error:
+        await messages.create_streaming_message(
+            message=MessageCreate(content="Tacos?", conversation_id=1),
+            request=None,
+            current_user=User(id="u1", email="ava@example.com", name="Test User"),
+            db=None
+        )
+    assert error.value.status_code == 429
+    assert int(error.value.headers["Retry-After"]) >= 1
+
+@pytest.mark.asyncio
+async def test_foreign_conversation_is_rejected_before_admission(monkeypatch):
+    controller = AdmissionController(max_per_conversation=1, queue_size=0)
+    monkeypatch.setattr(messages, "admission", controller)
+    monkeypatch.setattr(messages, "owns_conversation", lambda db, conversation_id, user_id: False)
+
+    for _ in range(2):
+        with pytest.raises(HTTPException) as error:
+            await messages.create_streaming_message(
+                message=MessageCreate(content="Tacos?", conversation_id=1),
+                request=None,
+                current_user=User(id="u1", email="ava@example.com", name="Test User"),
+                db=None
+            )
+        assert error.value.status_code == 404
+    # No slot was taken, so the conversation's owner still gets in
+    (await controller.acquire("u2", 1)).release()
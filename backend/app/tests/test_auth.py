@@ -0,0 +1,55 @@
+"""
+Tests for Google sign-in against a local certificate server: tokens are
+verified with the certificates at GOOGLE_CERTS_URL, and tokens for another
+audience or from another issuer are rejected.
+"""
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api import auth
+from app.auth import oauth
+from app.core.database import Base
+from app.models.database_models import User
+from app.tests.fake_google import FakeGoogleCertsServer
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+
+@pytest.mark.asyncio
+async def test_login_verifies_tokens_with_configured_certs(db, monkeypatch):
+    with FakeGoogleCertsServer() as google:
+        monkeypatch.setattr(oauth, "GOOGLE_CERTS_URL", google.certs_url)
+        token = google.make_token(oauth.GOOGLE_CLIENT_ID, "g-1", "ava@example.com", "Ava Smith")
+
+        user = await auth.google_login(auth.TokenRequest(token=token), db=db)
+        assert (user.id, user.name) == ("g-1", "Ava Smith")
+        assert db.get(User, "g-1").email == "ava@example.com"
+        assert google.requests == ["/oauth2/v1/certs"]
+
+        other = google.make_token("someone-else", "g-2", "bo@example.com", "Bo")
+        with pytest.raises(HTTPException) as error:
+            await auth.google_login(auth.TokenRequest(token=other), db=db)
+        assert error.value.status_code == 401
+
+@pytest.mark.asyncio
+async def test_tokens_from_another_issuer_are_rejected(db, monkeypatch):
+    with FakeGoogleCertsServer() as google:
+        monkeypatch.setattr(oauth, "GOOGLE_CERTS_URL", google.certs_url)
+        token = google.make_token(oauth.GOOGLE_CLIENT_ID, "g-3", "cy@example.com", "Cy", issuer="https://evil.example.com")
+
+        with pytest.raises(HTTPException) as error:
+            await auth.google_login(auth.TokenRequest(token=token), db=db)
+        assert error.value.status_code == 401
+        assert db.get(User, "g-3") is None
+
+        with pytest.raises(HTTPException) as error:
+            await oauth.get_current_user(token=token, db=db)
+        assert error.value.status_code == 401
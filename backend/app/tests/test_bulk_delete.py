@@ -0,0 +1,135 @@
+"""
+Tests for conversation deletion: database cascades, the cascade migration
+for existing SQLite databases, and inline and background bulk deletes.
+"""
+
+import asyncio
+from datetime import datetime, timezone
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api import messages
+from app.core.database import Base
+from app.core.migrations import run_migrations
+from app.core.shared_state import MemoryState
+from app.models.database_models import User, Conversation, Message, RestaurantSearch, YelpSnapshot
+from app.models.message import BulkDeleteRequest
+from app.services import bulk_delete
+from app.services.bulk_delete import BulkDeleter
+from app.services.conversation_events import ConversationEvents
+from app.services.search import install_search_index
+
+def add_conversation(db, conversation_id: int, user_id: str, message_count: int):
+    db.add(Conversation(id=conversation_id, title=f"Conversation {conversation_id}", user_id=user_id, is_new=False))
+    for i in range(message_count):
+        message = Message(conversation_id=conversation_id, sender="bot", content=f"ramen spot {i}")
+        message.save_restaurant_search({"term": "ramen", "location": "Austin, TX", "k": 1})
+        message.snapshot = YelpSnapshot(businesses="[]", fetched_at=datetime.now(timezone.utc))
+        db.add(message)
+    db.commit()
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    install_search_index(engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        db.add_all([User(id="u1", email="ava@example.com", name="Ava"), User(id="u2", email="ben@example.com", name="Ben")])
+        db.commit()
+        add_conversation(db, 1, "u1", 3)
+        add_conversation(db, 2, "u1", 5)
+        add_conversation(db, 3, "u2", 2)
+    return factory
+
+@pytest.fixture
+def deleter(session_factory, monkeypatch):
+    service = BulkDeleter(session_factory=session_factory, chunk_size=2, pause_seconds=0)
+    monkeypatch.setattr(messages, "bulk_deleter", service)
+    monkeypatch.setattr(bulk_delete, "conversation_events", ConversationEvents(state=MemoryState()))
+    return service
+
+def counts(session_factory, user_id: str):
+    with session_factory() as db:
+        conversation_ids = [c.id for c in db.query(Conversation).filter(Conversation.user_id == user_id)]
+        message_ids = [m.id for m in db.query(Message).filter(Message.conversation_id.in_(conversation_ids))]
+        return (
+            len(conversation_ids),
+            len(message_ids),
+            db.query(RestaurantSearch).filter(RestaurantSearch.message_id.in_(message_ids)).count(),
+            db.query(YelpSnapshot).filter(YelpSnapshot.message_id.in_(message_ids)).count(),
+        )
+
+@pytest.mark.asyncio
+async def test_delete_conversation_cascades_in_database(session_factory, monkeypatch):
+    monkeypatch.setattr(messages, "conversation_events", ConversationEvents(state=MemoryState()))
+    with session_factory() as db:
+        user = db.get(User, "u1")
+        await messages.delete_conversation(2, current_user=user, db=db)
+        fts_rows = db.execute(text("SELECT count(*) FROM messages_fts")).scalar()
+
+    assert counts(session_factory, "u1") == (1, 3, 3, 3)
+    assert counts(session_factory, "u2") == (1, 2, 2, 2)
+    assert fts_rows == 5
+
+def test_migration_adds_cascade_to_existing_table():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id VARCHAR PRIMARY KEY, email VARCHAR, name VARCHAR, picture VARCHAR, created_at DATETIME)"))
+        conn.execute(text(
+            "CREATE TABLE conversations (id INTEGER PRIMARY KEY, title VARCHAR, created_at DATETIME, updated_at DATETIME, "
+            "is_active BOOLEAN, is_new BOOLEAN, thread_id VARCHAR UNIQUE, user_id VARCHAR REFERENCES users(id))"
+        ))
+        # Foreign key as created before ON DELETE CASCADE was declared
+        conn.execute(text(
+            "CREATE TABLE messages (id INTEGER PRIMARY KEY, conversation_id INTEGER REFERENCES conversations(id), "
+            "content VARCHAR NOT NULL, sender VARCHAR NOT NULL, timestamp DATETIME, is_edited BOOLEAN, restaurant_search TEXT)"
+        ))
+        conn.execute(text("INSERT INTO users (id) VALUES ('u1')"))
+        conn.execute(text("INSERT INTO conversations (id, title, user_id) VALUES (1, 'Conversation 1', 'u1')"))
+        conn.execute(text("INSERT INTO messages (id, conversation_id, content, sender) VALUES (1, 1, 'ramen time', 'bot')"))
+    Base.metadata.create_all(bind=engine)
+    install_search_index(engine)
+
+    run_migrations(engine)
+
+    with engine.begin() as conn:
+        keys = conn.execute(text("PRAGMA foreign_key_list(messages)")).mappings().all()
+        assert [key["on_delete"] for key in keys] == ["CASCADE"]
+        triggers = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'messages'")).all()
+        assert len(triggers) == 3
+        assert conn.execute(text("SELECT content FROM messages")).scalar() == "ramen time"
+
+        conn.execute(text("DELETE FROM conversations WHERE id = 1"))
+        assert conn.execute(text("SELECT count(*) FROM messages")).scalar() == 0
+        assert conn.execute(text("SELECT count(*) FROM messages_fts")).scalar() == 0
+
+@pytest.mark.asyncio
+async def test_small_bulk_delete_runs_inline(deleter, session_factory):
+    with session_factory() as db:
+        user = db.get(User, "u1")
+    # Another user's conversation id is ignored
+    result = await messages.bulk_delete_conversations(BulkDeleteRequest(conversation_ids=[1, 3]), current_user=user)
+
+    assert result == {"status": "deleted", "conversations": 1, "messages": 3}
+    assert counts(session_factory, "u1") == (1, 5, 5, 5)
+    assert counts(session_factory, "u2") == (1, 2, 2, 2)
+
+@pytest.mark.asyncio
+async def test_large_bulk_delete_runs_in_chunks(deleter, session_factory):
+    deleter.inline_limit = 0
+    with session_factory() as db:
+        user = db.get(User, "u1")
+    response = await messages.bulk_delete_conversations(BulkDeleteRequest(all=True), current_user=user)
+    assert response.status_code == 202
+
+    job = next(iter(deleter.jobs.values()))
+    await asyncio.gather(*deleter._tasks)
+
+    status = await messages.get_bulk_delete_job(job.id, current_user=user)
+    assert status["status"] == "completed"
+    assert status["total_messages"] == status["deleted_messages"] == 8
+    assert counts(session_factory, "u1") == (0, 0, 0, 0)
+    assert counts(session_factory, "u2") == (1, 2, 2, 2)
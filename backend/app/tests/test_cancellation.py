@@ -0,0 +1,126 @@
+"""
+Tests for cancellation when the SSE client disconnects mid-reply.
+Measures how much upstream and local work is left running after a disconnect.
+"""
+
+import asyncio
+import json
+import pytest
+from fastapi.responses import StreamingResponse
+from openai import OpenAI
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api import messages
+from app.core.database import Base
+from app.models.database_models import User, Conversation, Message
+from app.models.message import MessageCreate
+from app.services.chat_service import AssistantsEngine, ChatService
+from app.tests.fake_openai import FakeOpenAIServer
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        db.add(User(id="u1", email="ava@example.com", name="Test User"))
+        db.add(Conversation(id=1, title="Conversation 1", user_id="u1", is_new=False, thread_id="thread_existing"))
+        db.commit()
+    return factory
+
+class DisconnectingRequest:
+    """Stands in for a Request whose client goes away after a few checks"""
+
+    def __init__(self, connected_checks: int):
+        self.connected_checks = connected_checks
+
+    async def is_disconnected(self):
+        self.connected_checks -= 1
+        return self.connected_checks < 0
+
+class SlowEngine:
+    """Engine that streams one word every 10 ms and records how much it produced"""
+
+    def __init__(self):
+        self.produced = 0
+        self.closed = False
+
+    async def get_streaming_response(self, conversation_id, thread_id, message, db=None):
+        async def generate():
+            try:
+                for i in range(100):
+                    self.produced += 1
+                    yield f"data: {json.dumps({'content': f'word{i} '})}\n\n"
+                    await asyncio.sleep(0.01)
+                yield "data: [DONE]\n\n"
+            finally:
+                self.closed = True
+        return StreamingResponse(generate(), media_type="text/event-stream")
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_assistants_run_and_stops_polling():
+    with FakeOpenAIServer(run_polls=10_000) as fake:
+        engine = AssistantsEngine(client=OpenAI(api_key="test", base_url=fake.base_url, max_retries=0))
+        response = await engine.get_streaming_response(
+            conversation_id=1, thread_id="thread_existing", message="Tacos?", db=None
+        )
+
+        async def consume():
+            async for _ in response.body_iterator:
+                pass
+
+        task = asyncio.create_task(consume())
+        while len(fake.calls("GET", "/v1/threads/thread_existing/runs/")) < 3:
+            await asyncio.sleep(0.02)
+
+        # Starlette cancels the streaming task when the client disconnects
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        calls_at_disconnect = len(fake.requests)
+
+        await asyncio.sleep(0.5)
+        leftover = fake.requests[calls_at_disconnect:]
+
+        cancels = fake.calls("POST", "/v1/threads/thread_existing/runs/")
+        assert any(c["path"].endswith("/cancel") for c in cancels)
+        assert leftover == []
+        assert all(run["status"] == "cancelled" for run in fake.runs.values())
+
+@pytest.mark.asyncio
+async def test_disconnect_stops_engine_and_saves_partial_reply(session_factory, monkeypatch):
+    engine = SlowEngine()
+    monkeypatch.setattr(messages, "chat_service", ChatService(engine=engine))
+    monkeypatch.setattr(messages, "SessionLocal", session_factory)
+    # No resume grace period: an abandoned reply is cancelled right away
+    monkeypatch.setattr(messages.stream_registry, "grace_seconds", 0)
+
+    with session_factory() as db:
+        user = db.get(User, "u1")
+        response = await messages.create_streaming_message(
+            message=MessageCreate(content="Tell me about tacos", conversation_id=1),
+            request=DisconnectingRequest(connected_checks=5),
+            current_user=user,
+            db=db
+        )
+        events = [chunk async for chunk in response.body_iterator]
+        bot_message_id = db.query(Message).filter_by(conversation_id=1, sender="bot").one().id
+
+    producer = messages.stream_registry.get(bot_message_id).task
+    await asyncio.wait([producer], timeout=1)
+    produced_at_cancel = engine.produced
+    await asyncio.sleep(0.2)
+
+    # Leftover work: the engine stopped right after the disconnect and produced nothing more
+    assert producer.done()
+    assert engine.closed is True
+    assert engine.produced == produced_at_cancel < 100
+    assert not any("[DONE]" in e for e in events)
+
+    with session_factory() as db:
+        bot_message = db.get(Message, bot_message_id)
+        words = bot_message.content.split()
+        assert words
+        assert words == [f"word{i}" for i in range(len(words))]
@@ -0,0 +1,137 @@
+"""
+Tests for the Chat Completions engine.
+Runs the engine against a local fake OpenAI server and an in-memory database.
+"""
+
+import json
+import pytest
+from openai import AsyncOpenAI
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.models.database_models import User, Conversation, Message
+from app.services.completions_engine import CompletionsEngine
+from app.services.context_builder import ContextBuilder
+from app.services.tokens import truncate_history
+from app.tests.fake_openai import FakeOpenAIServer, text_reply, tool_reply
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(User(id="u1", email="ava@example.com", name="Gabriel Test"))
+    session.add(Conversation(id=1, title="Conversation 1", user_id="u1", is_new=False))
+    session.commit()
+    yield session
+    session.close()
+
+@pytest.fixture
+def fake_openai():
+    with FakeOpenAIServer() as server:
+        yield server
+
+def make_engine(server, db, token_budget=4000):
+    client = AsyncOpenAI(api_key="test", base_url=server.base_url, max_retries=0)
+    return CompletionsEngine(
+        client=client,
+        model="fake-model",
+        context_builder=ContextBuilder(token_budget=token_budget),
+        session_factory=sessionmaker(bind=db.get_bind())
+    )
+
+async def collect_events(response):
+    events = []
+    async for chunk in response.body_iterator:
+        if isinstance(chunk, bytes):
+            chunk = chunk.decode()
+        data = chunk[len("data: "):].strip()
+        events.append(data if data == "[DONE]" else json.loads(data))
+    return events
+
+def add_turn(db, user_text, bot_text):
+    db.add(Message(conversation_id=1, sender="user", content=user_text))
+    db.add(Message(conversation_id=1, sender="bot", content=bot_text))
+    db.commit()
+
+def test_truncate_history_keeps_newest_within_budget():
+    history = []
+    for i in range(10):
+        history.append({"role": "user", "content": f"question {i} " * 20})
+        history.append({"role": "assistant", "content": f"answer {i} " * 20})
+    history.append({"role": "user", "content": "latest question"})
+
+    kept = truncate_history(history, budget=200)
+
+    assert kept[-1]["content"] == "latest question"
+    assert kept[0]["role"] == "user"
+    assert len(kept) < len(history)
+    assert history[-len(kept):] == kept
+
+def test_truncate_history_always_keeps_current_message():
+    kept = truncate_history([{"role": "user", "content": "x" * 10000}], budget=10)
+    assert len(kept) == 1
+
+@pytest.mark.asyncio
+async def test_streams_reply_with_single_request(db, fake_openai):
+    add_turn(db, "Hi Ava", "Hi Gabriel!")
+    db.add(Message(conversation_id=1, sender="user", content="Any tacos in Austin?"))
+    db.add(Message(conversation_id=1, sender="bot", content=""))
+    db.commit()
+    fake_openai.chat_scripts.append(text_reply("Austin has great tacos."))
+
+    response = await make_engine(fake_openai, db).get_streaming_response(
+        conversation_id=1, thread_id=None, message="Any tacos in Austin?", db=db
+    )
+    events = await collect_events(response)
+
+    content = "".join(e["content"] for e in events if isinstance(e, dict) and "content" in e)
+    assert content == "Austin has great tacos."
+    assert events[-1] == "[DONE]"
+
+    calls = fake_openai.calls("POST", "/v1/chat/completions")
+    assert len(calls) == 1
+    body = calls[0]["body"]
+    assert body["stream"] is True
+    assert body["tools"][0]["function"]["name"] == "search_restaurants"
+    roles = [m["role"] for m in body["messages"]]
+    assert roles == ["system", "user", "assistant", "user"]
+    assert "Gabriel Test" in body["messages"][0]["content"]
+    assert body["messages"][-1]["content"] == "Any tacos in Austin?"
+
+@pytest.mark.asyncio
+async def test_tool_call_emits_restaurant_search(db, fake_openai):
+    search = {"term": "tacos", "location": "Austin, TX", "k": 3}
+    fake_openai.chat_scripts.extend([tool_reply(search), text_reply("Here are some picks.")])
+
+    response = await make_engine(fake_openai, db).get_streaming_response(
+        conversation_id=1, thread_id=None, message="Tacos in Austin", db=db
+    )
+    events = await collect_events(response)
+
+    assert {"restaurant_search": search} in events
+    content = "".join(e["content"] for e in events if isinstance(e, dict) and "content" in e)
+    assert content == "Here are some picks."
+
+    calls = fake_openai.calls("POST", "/v1/chat/completions")
+    assert len(calls) == 2
+    follow_up = calls[1]["body"]["messages"]
+    assert follow_up[-2]["tool_calls"][0]["function"]["name"] == "search_restaurants"
+    assert follow_up[-1] == {"role": "tool", "tool_call_id": "call_fake", "content": json.dumps({"status": "success"})}
+
+@pytest.mark.asyncio
+async def test_history_is_truncated_to_token_budget(db, fake_openai):
+    for i in range(50):
+        add_turn(db, f"question {i} " * 30, f"answer {i} " * 30)
+
+    response = await make_engine(fake_openai, db, token_budget=1500).get_streaming_response(
+        conversation_id=1, thread_id=None, message="newest question", db=db
+    )
+    await collect_events(response)
+
+    sent = fake_openai.calls("POST", "/v1/chat/completions")[0]["body"]["messages"]
+    assert sent[-1] == {"role": "user", "content": "newest question"}
+    assert 1 < len(sent) < 20
+    assert "question 0 " not in json.dumps(sent)
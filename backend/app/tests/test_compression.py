@@ -0,0 +1,92 @@
+"""
+Tests for negotiated response compression: encoding choice, size threshold,
+SSE exclusion, streamed flushing and encoding-specific ETags.
+"""
+
+import asyncio
+import gzip
+import zlib
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.core.compression import CompressionMiddleware, negotiate
+from app.core.responses import conditional_json
+
+LARGE = {"businesses": [{"id": f"biz-{i}", "name": f"Restaurant {i}", "rating": 4.5} for i in range(200)]}
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+    @app.get("/large")
+    async def large(request: Request):
+        return conditional_json(request, LARGE)
+
+    @app.get("/small")
+    async def small(request: Request):
+        return conditional_json(request, {"ok": True})
+
+    @app.get("/events")
+    async def events():
+        async def stream():
+            for i in range(3):
+                yield f"data: {{\"content\": \"chunk {i}\"}}\n\n"
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+def test_negotiate():
+    assert negotiate("gzip, deflate", ["br", "gzip"]) == "gzip"
+    assert negotiate("gzip, br", ["br", "gzip"]) == "br"
+    assert negotiate("br;q=0.5, gzip;q=0.8", ["br", "gzip"]) == "gzip"
+    assert negotiate("gzip;q=0, identity", ["gzip"]) is None
+    assert negotiate("*", ["gzip"]) == "gzip"
+    assert negotiate("", ["gzip"]) is None
+
+def test_large_json_is_gzipped():
+    client = TestClient(make_app())
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.json() == LARGE
+    assert int(response.headers["content-length"]) < len(response.content) / 3
+
+    plain = client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert response.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+
+def test_encoded_etag_revalidates():
+    client = TestClient(make_app())
+    etag = client.get("/large", headers={"Accept-Encoding": "gzip"}).headers["etag"]
+    revalidated = client.get("/large", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+
+def test_small_responses_and_sse_are_not_compressed():
+    client = TestClient(make_app())
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    events = client.get("/events", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in events.headers
+    assert events.text.count("data: ") == 3
+
+def test_streamed_json_is_flushed_per_chunk():
+    sent = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/x-ndjson")]})
+        for i in range(3):
+            await send({"type": "http.response.body", "body": f'{{"id": {i}}}\n'.encode(), "more_body": i < 2})
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(CompressionMiddleware(app, minimum_size=500)(scope, None, send))
+
+    chunks = [m["body"] for m in sent[1:]]
+    assert len(chunks) == 3
+    # Each chunk decodes on its own as soon as it arrives
+    decoder = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    assert decoder.decompress(chunks[0]) == b'{"id": 0}\n'
+    assert gzip.decompress(b"".join(chunks)) == b'{"id": 0}\n{"id": 1}\n{"id": 2}\n'
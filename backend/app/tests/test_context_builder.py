@@ -0,0 +1,104 @@
+"""
+Tests for the token-budgeted context builder and rolling conversation summary.
+"""
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.models.database_models import User, Conversation, Message, ConversationSummary
+from app.services.context_builder import ContextBuilder, ExtractiveSummarizer
+
+SYSTEM_PROMPT = "You are Chef Ava."
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(User(id="u1", email="ava@example.com", name="Test User"))
+    session.add(Conversation(id=1, title="Conversation 1", user_id="u1", is_new=False))
+    session.commit()
+    yield session
+    session.close()
+
+class RecordingSummarizer(ExtractiveSummarizer):
+    def __init__(self):
+        super().__init__(max_tokens=200)
+        self.batches = []
+
+    async def __call__(self, previous_summary, messages):
+        self.batches.append(messages)
+        return await super().__call__(previous_summary, messages)
+
+def add_turns(db, start, count):
+    for i in range(start, start + count):
+        db.add(Message(conversation_id=1, sender="user", content=f"question {i} about ramen"))
+        db.add(Message(conversation_id=1, sender="bot", content=f"answer {i} with ramen ideas"))
+    db.commit()
+
+def test_short_conversation_fits_without_summary(db):
+    add_turns(db, 0, 3)
+    window = ContextBuilder(token_budget=1000).build(db, 1, "question 3", SYSTEM_PROMPT)
+
+    assert [m["role"] for m in window.messages] == ["system", "user", "assistant", "user", "assistant", "user", "assistant", "user"]
+    assert window.needs_summary is False
+    assert window.token_count <= 1000
+
+@pytest.mark.asyncio
+async def test_dropped_turns_are_folded_into_persisted_summary(db):
+    add_turns(db, 0, 30)
+    builder = ContextBuilder(token_budget=300, summary_token_budget=100)
+
+    window = builder.build(db, 1, "what next?", SYSTEM_PROMPT)
+    assert window.needs_summary is True
+    assert window.token_count <= 300
+
+    await builder.update_summary(db, 1, window.oldest_kept_id)
+    summary = db.get(ConversationSummary, 1)
+    assert summary.summarized_through_id == window.oldest_kept_id - 1
+    assert "ramen" in summary.summary
+    assert summary.token_count <= 100
+
+    window = builder.build(db, 1, "what next?", SYSTEM_PROMPT)
+    assert "Summary of the earlier conversation" in window.messages[0]["content"]
+    assert window.token_count <= 300
+
+@pytest.mark.asyncio
+async def test_summary_updates_are_incremental(db):
+    summarizer = RecordingSummarizer()
+    builder = ContextBuilder(summarizer=summarizer, token_budget=200, summary_token_budget=50)
+
+    add_turns(db, 0, 10)
+    window = builder.build(db, 1, "next", SYSTEM_PROMPT)
+    await builder.update_summary(db, 1, window.oldest_kept_id)
+    first_through = db.get(ConversationSummary, 1).summarized_through_id
+
+    add_turns(db, 10, 5)
+    window = builder.build(db, 1, "next", SYSTEM_PROMPT)
+    await builder.update_summary(db, 1, window.oldest_kept_id)
+
+    # The second update only sees turns that were not summarized before
+    assert len(summarizer.batches) == 2
+    assert len(summarizer.batches[1]) == window.oldest_kept_id - 1 - first_through
+
+@pytest.mark.asyncio
+async def test_prompt_size_stays_flat_as_conversation_grows(db):
+    builder = ContextBuilder(token_budget=400, summary_token_budget=100, recent_message_limit=20)
+    sizes = []
+    for _ in range(4):
+        add_turns(db, 0, 100)
+        window = builder.build(db, 1, "next", SYSTEM_PROMPT)
+        while window.needs_summary and window.oldest_kept_id:
+            before = db.get(ConversationSummary, 1)
+            through = before.summarized_through_id if before else 0
+            await builder.update_summary(db, 1, window.oldest_kept_id)
+            if db.get(ConversationSummary, 1).summarized_through_id == through:
+                break
+            window = builder.build(db, 1, "next", SYSTEM_PROMPT)
+        sizes.append(window.token_count)
+
+    assert max(sizes) <= 400
+    assert max(sizes) - min(sizes) < 100
@@ -0,0 +1,78 @@
+"""
+Tests for the per-user conversation event channel: delivery, isolation
+between users, heartbeats, and publishing from the mutation endpoints.
+"""
+
+import asyncio
+import json
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api import messages
+from app.core.database import Base
+from app.core.shared_state import MemoryState
+from app.models.database_models import User
+from app.services.conversation_events import ConversationEvents
+
+def parse(event: str):
+    fields = dict(line.split(": ", 1) for line in event.strip().split("\n") if not line.startswith(("retry", ":")))
+    return fields["event"], json.loads(fields["data"])
+
+@pytest.fixture
+def events(monkeypatch):
+    service = ConversationEvents(state=MemoryState(), heartbeat_seconds=15)
+    monkeypatch.setattr(messages, "conversation_events", service)
+    return service
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([User(id="u1", email="ava@example.com", name="Ava"), User(id="u2", email="ben@example.com", name="Ben")])
+    db.commit()
+    return db
+
+@pytest.mark.asyncio
+async def test_deltas_reach_only_their_user(events):
+    mine = events.stream("u1")
+    theirs = events.stream("u2")
+    assert parse(await anext(mine)) == ("ready", {})
+    assert parse(await anext(theirs)) == ("ready", {})
+
+    await events.publish("u2", "deleted", {"id": 9})
+    await events.publish("u1", "updated", {"id": 1, "title": "Conversation 1"})
+    assert parse(await anext(mine)) == ("updated", {"id": 1, "title": "Conversation 1"})
+    assert parse(await anext(theirs)) == ("deleted", {"id": 9})
+
+    await mine.aclose()
+    await theirs.aclose()
+    assert events.connections == 0
+
+@pytest.mark.asyncio
+async def test_idle_connection_gets_heartbeats(events, monkeypatch):
+    monkeypatch.setattr("app.services.conversation_events.DISCONNECT_POLL_SECONDS", 0.01)
+    events.heartbeat_seconds = 0.02
+    stream = events.stream("u1")
+    await anext(stream)
+    assert await asyncio.wait_for(anext(stream), 1) == ": ping\n\n"
+    await stream.aclose()
+
+@pytest.mark.asyncio
+async def test_mutation_endpoints_publish(events, db):
+    user = db.get(User, "u1")
+    stream = events.stream("u1")
+    await anext(stream)
+
+    created = await messages.create_new_conversation(current_user=user, db=db)
+    event, data = parse(await anext(stream))
+    assert event == "created" and data["id"] == created["id"] and data["is_active"] is True
+
+    await messages.activate_conversation(created["id"], current_user=user, db=db)
+    assert parse(await anext(stream)) == ("activated", {"id": created["id"]})
+
+    await messages.delete_conversation(created["id"], current_user=user, db=db)
+    assert parse(await anext(stream)) == ("deleted", {"id": created["id"]})
+    await stream.aclose()
@@ -0,0 +1,87 @@
+"""
+Tests for location canonicalization and region aliasing in front of the
+Yelp search cache.
+"""
+
+import pytest
+
+from app.core.resilience import CircuitBreaker, RetryPolicy
+from app.core.shared_state import MemoryState
+from app.services import locations
+from app.services.locations import canonical_location
+from app.services import yelp_client
+from app.tests.fake_yelp import FakeYelpServer
+
+@pytest.fixture
+def fake_yelp(monkeypatch):
+    state = MemoryState()
+    with FakeYelpServer() as fake:
+        monkeypatch.setattr(yelp_client, "YELP_API_BASE_URL", fake.base_url)
+        monkeypatch.setattr(yelp_client, "yelp_breaker", CircuitBreaker("yelp", failure_threshold=3, reset_seconds=30))
+        monkeypatch.setattr(yelp_client, "yelp_retry", RetryPolicy(attempts=1))
+        monkeypatch.setattr(yelp_client, "YELP_HEDGE_ENABLED", False)
+        monkeypatch.setattr(yelp_client, "YELP_CACHE_TTL_SECONDS", 600)
+        monkeypatch.setattr(yelp_client, "shared_state", state)
+        monkeypatch.setattr(locations, "shared_state", state)
+        yield fake
+
+def test_canonical_location():
+    assert canonical_location("Atlanta, GA") == "atlanta ga"
+    assert canonical_location("  ATLANTA,   Georgia ") == "atlanta ga"
+    assert canonical_location("Atlanta, Georgia, USA") == "atlanta ga"
+    assert canonical_location("Charleston, West Virginia") == "charleston wv"
+    assert canonical_location("São Paulo, Brazil") == "sao paulo brazil"
+    # A state or city on its own is left alone
+    assert canonical_location("New York") == "new york"
+    assert canonical_location("Washington") == "washington"
+    assert canonical_location("West Virginia") == "west virginia"
+    assert canonical_location("West Virginia, USA") == "west virginia"
+    # A state name inside a place name isn't a state
+    assert canonical_location("Port Washington") == "port washington"
+    assert canonical_location("Port Washington, NY") == "port washington ny"
+    assert canonical_location("Downtown Washington") == "downtown washington"
+    assert canonical_location("Austin Texas") == "austin texas"
+    assert canonical_location(" , ") is None
+
+async def search(location: str) -> dict:
+    params = yelp_client.build_search_params("ramen", location, None, None, 3)
+    return await yelp_client.fetch_businesses_with_retry(params, 3)
+
+def searched_locations(fake) -> list:
+    return [path for path in fake.requests if path.startswith("/v3/businesses/search")]
+
+@pytest.mark.asyncio
+async def test_spellings_of_one_city_share_cached_results(fake_yelp):
+    await search("Austin, TX")
+    await search("austin tx")
+    await search("Austin, Texas, USA")
+    assert len(searched_locations(fake_yelp)) == 1
+
+    # A new spelling costs one search; its region matches, so later uses share the first spelling's results
+    await search("Austin")
+    await search("austin")
+    await search("AUSTIN")
+    requests = searched_locations(fake_yelp)
+    assert len(requests) == 2
+    assert "location=austin&" in requests[1]
+
+@pytest.mark.asyncio
+async def test_nearby_places_are_never_merged(fake_yelp):
+    # The fake reports the same region for every search, as Yelp can for places a few blocks apart
+    for location in ("Mission District, San Francisco, CA", "SoMa, San Francisco, CA",
+                     "Kansas City, MO", "Kansas City, KS", "Austin, TX", "Round Rock", "Round Rock"):
+        await search(location)
+
+    requests = searched_locations(fake_yelp)
+    sent = [path.split("location=")[1].split("&")[0] for path in requests]
+    assert sent == ["mission+district+san+francisco+ca", "soma+san+francisco+ca",
+                    "kansas+city+mo", "kansas+city+ks", "austin+tx", "round+rock"]
+
+@pytest.mark.asyncio
+async def test_first_region_seen_is_kept(fake_yelp):
+    resolver = locations.location_resolver
+    await resolver.learn("austin", {"center": {"latitude": 30.2672, "longitude": -97.7431}})
+    await resolver.learn("austin", {"center": {"latitude": 30.4, "longitude": -97.9}})
+    await resolver.learn("austin tx", {"center": {"latitude": 30.27, "longitude": -97.74}})
+
+    assert await resolver.resolve("Austin") == "austin tx"
@@ -135,6 +135,30 @@ def test_edit_message(client):
     assert edit_response.json()["content"] == "Updated message"
     assert edit_response.json()["is_edited"] is True
 
+def test_conversation_etags(client):
+    """Test that unchanged histories and sidebars are answered with 304"""
+    conversation_id = client.post("/api/messages/new-conversation").json()["id"]
+    client.post("/api/messages/stream", json={"content": "Original message", "conversation_id": conversation_id})
+
+    url = f"/api/messages/conversations/{conversation_id}"
+    first = client.get(url)
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "private, no-cache"
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    # Editing a message changes the conversation's ETag
+    user_message = next(m for m in first.json()["messages"] if m["sender"] == "user")
+    client.put(f"/api/messages/{user_message['id']}", json={"content": "Updated message"})
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+    sidebar = client.get("/api/messages/conversations")
+    sidebar_etag = sidebar.headers["etag"]
+    assert client.get("/api/messages/conversations", headers={"If-None-Match": sidebar_etag}).status_code == 304
+    client.delete(url)
+    assert client.get("/api/messages/conversations", headers={"If-None-Match": sidebar_etag}).status_code == 200
+
 def test_delete_message(client):
     """Test deleting a user message"""
     # Create a conversation and message first
@@ -198,4 +222,101 @@ def test_delete_conversation(client):
     
     # Verify it's gone
     conversations = client.get("/api/messages/conversations")
-    assert not any(c["id"] == conversation_id for c in conversations.json())
\ No newline at end of file
+    assert not any(c["id"] == conversation_id for c in conversations.json())
+
+def test_cached_reply_skips_chat_service(client, monkeypatch):
+    """Test that a near-duplicate question is answered from the response cache"""
+    from app.api import messages
+    from app.services.response_cache import ResponseCache
+
+    cache = ResponseCache(enabled=True)
+    search = {"term": "tacos", "location": "Austin, TX", "k": 3}
+    cache.store("Best tacos in Austin, TX", "Here are my favorite taco spots.", search, scope="test123")
+    monkeypatch.setattr(messages, "response_cache", cache)
+
+    async def fail_if_called(*args, **kwargs):
+        raise AssertionError("chat service should not be called on a cache hit")
+    monkeypatch.setattr(messages.chat_service, "get_streaming_response", fail_if_called)
+    scheduled = []
+    monkeypatch.setattr(messages.yelp_snapshots, "schedule", lambda message_id, search: scheduled.append(search))
+
+    conversation_id = client.get("/api/messages/conversations").json()[0]["id"]
+    response = client.post("/api/messages/stream",
+        json={
+            "content": "what are the best taco spots in austin tx?",
+            "conversation_id": conversation_id
+        }
+    )
+    assert response.status_code == 200
+    assert '"restaurant_search": {"term": "tacos"' in response.text
+    assert "Here are my favorite taco spots." in response.text
+    assert cache.stats()["hits"] == 1
+    assert scheduled == [search]
+
+    metrics = client.get("/api/metrics").json()
+    assert "response_cache" in metrics
+
+def test_cached_reply_not_served_to_another_user(client, monkeypatch):
+    """Test that a reply cached for one user never answers another user's question"""
+    from fastapi.responses import StreamingResponse
+    from app.api import messages
+    from app.services.response_cache import ResponseCache
+
+    cache = ResponseCache(enabled=True)
+    cache.store("Best tacos in Austin, TX", "Maria, these fit your gluten-free diet.", {"term": "tacos", "location": "Austin, TX"}, scope="someone-else")
+    monkeypatch.setattr(messages, "response_cache", cache)
+    monkeypatch.setattr(messages, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(messages.yelp_snapshots, "schedule", lambda message_id, search: None)
+
+    async def assistant_reply(conversation_id, thread_id, message, db=None):
+        async def body():
+            yield 'data: {"content": "From the assistant."}\n\n'
+            yield 'data: [DONE]\n\n'
+        return StreamingResponse(body(), media_type="text/event-stream")
+    monkeypatch.setattr(messages.chat_service, "get_streaming_response", assistant_reply)
+
+    conversation_id = client.get("/api/messages/conversations").json()[0]["id"]
+    response = client.post("/api/messages/stream",
+        json={"content": "what are the best taco spots in austin tx?", "conversation_id": conversation_id}
+    )
+    assert "From the assistant." in response.text
+    assert "gluten-free" not in response.text
+    assert cache.stats()["hits"] == 0
+
+def test_cached_reply_not_used_in_conversation_with_thread(client, monkeypatch):
+    """Test that a conversation with an Assistants thread gets every turn from the assistant"""
+    from fastapi.responses import StreamingResponse
+    from app.api import messages
+    from app.services.response_cache import ResponseCache
+
+    cache = ResponseCache(enabled=True)
+    cache.store("Best tacos in Austin, TX", "Here are my favorite taco spots.", {"term": "tacos", "location": "Austin, TX"}, scope="test123")
+    monkeypatch.setattr(messages, "response_cache", cache)
+    monkeypatch.setattr(messages, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(messages.yelp_snapshots, "schedule", lambda message_id, search: None)
+
+    runs = []
+    async def assistant_reply(conversation_id, thread_id, message, db=None):
+        runs.append((thread_id, message))
+        async def body():
+            yield 'data: {"content": "From the assistant."}\n\n'
+            yield 'data: [DONE]\n\n'
+        return StreamingResponse(body(), media_type="text/event-stream")
+    monkeypatch.setattr(messages.chat_service, "get_streaming_response", assistant_reply)
+
+    with TestingSessionLocal() as db:
+        conversation = db.query(Conversation).first()
+        conversation.thread_id = "thread_abc"
+        db.commit()
+        conversation_id = conversation.id
+
+    for content in ("what are the best taco spots in austin tx?", "which one is open late?"):
+        response = client.post("/api/messages/stream", json={"content": content, "conversation_id": conversation_id})
+        assert "From the assistant." in response.text
+
+    # Both turns went through the thread, so the follow-up run knows what was said before
+    assert runs == [
+        ("thread_abc", "what are the best taco spots in austin tx?"),
+        ("thread_abc", "which one is open late?"),
+    ]
+    assert cache.stats()["hits"] == 0
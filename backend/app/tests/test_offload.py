@@ -0,0 +1,63 @@
+"""
+Tests for the offload pool and the loop-stall watchdog: blocking calls run
+off the event loop with the caller's context, and stalls are recorded with
+the stack that caused them.
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+import pytest
+
+from app.core.offload import Offloader
+from app.core.profiler import LoopWatchdog
+
+request_tag = contextvars.ContextVar("request_tag", default=None)
+
+def blocking_call(seconds: float):
+    time.sleep(seconds)
+    return threading.current_thread().name, request_tag.get()
+
+def block_the_loop():
+    time.sleep(0.3)
+
+@pytest.mark.asyncio
+async def test_run_sync_keeps_the_loop_responsive():
+    offloader = Offloader(max_workers=2)
+    request_tag.set("req-1")
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    try:
+        results = await asyncio.gather(*(offloader.run_sync(blocking_call, 0.2) for _ in range(3)))
+    finally:
+        task.cancel()
+
+    # Three calls on two threads: the third waited its turn, the loop kept ticking throughout
+    assert ticks >= 20
+    assert all(name.startswith("offload") for name, _ in results)
+    assert all(tag == "req-1" for _, tag in results)
+    assert offloader.stats() == {"threads": 2, "running": 0, "queued": 0}
+
+@pytest.mark.asyncio
+async def test_watchdog_records_stall_with_stack():
+    watchdog = LoopWatchdog(threshold_ms=100)
+    watchdog.start()
+    try:
+        await asyncio.sleep(0.05)
+        block_the_loop()
+        await asyncio.sleep(0.1)
+    finally:
+        await watchdog.stop()
+
+    [stall] = watchdog.recent
+    assert stall["duration_ms"] >= 100
+    assert any("block_the_loop" in frame for frame in stall["stack"])
+    assert watchdog.stats()["stalls"] == 1
@@ -0,0 +1,72 @@
+"""
+Tests for the sampling profiler: collapsed stacks of busy threads, event
+loop lag and blocking-call detection, and the admin-only endpoint.
+"""
+
+import asyncio
+import threading
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import metrics as metrics_api
+from app.auth import oauth
+from app.core.profiler import ProfileSession
+from app.models.database_models import User
+
+def busy_work(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+def block_the_loop():
+    time.sleep(0.3)
+
+@pytest.mark.asyncio
+async def test_profile_finds_hot_code_and_blocking_calls():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_work, args=(stop,), name="busy")
+    worker.start()
+
+    async def blocker():
+        await asyncio.sleep(0.1)
+        block_the_loop()
+
+    try:
+        task = asyncio.create_task(blocker())
+        session = await ProfileSession(0.6, interval_ms=5, blocking_threshold_ms=100).run()
+        await task
+    finally:
+        stop.set()
+        worker.join()
+
+    lines = session.collapsed().splitlines()
+    assert any(line.startswith("busy;") and "busy_work" in line for line in lines)
+    # Idle threads (like the loop waiting in select) are left out
+    assert not any(line.rsplit(";", 1)[-1].startswith("select (selectors.py") for line in lines)
+
+    [episode] = session.blocking
+    assert any("block_the_loop" in frame for frame in episode["stack"])
+    assert episode["duration_ms"] >= 100
+    assert session.loop_lag()["max_ms"] >= 200
+
+def make_client(monkeypatch, email: str) -> TestClient:
+    monkeypatch.setattr(oauth, "ADMIN_EMAILS", {"ops@example.com"})
+    app = FastAPI()
+    app.include_router(metrics_api.router, prefix="/api/metrics")
+    app.dependency_overrides[oauth.get_current_user] = lambda: User(id="u1", email=email, name="Ops")
+    return TestClient(app)
+
+def test_profile_endpoint_is_admin_only(monkeypatch):
+    response = make_client(monkeypatch, "ava@example.com").get("/api/metrics/profile?seconds=0.1")
+    assert response.status_code == 403
+
+    client = make_client(monkeypatch, "OPS@example.com")
+    response = client.get("/api/metrics/profile?seconds=0.2")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert int(response.headers["x-profile-samples"]) > 0
+    assert "x-loop-lag-max-ms" in response.headers
+
+    report = client.get("/api/metrics/profile?seconds=0.2&format=json").json()
+    assert set(report) >= {"samples", "loop_lag", "blocking", "collapsed"}
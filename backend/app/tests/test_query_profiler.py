@@ -0,0 +1,91 @@
+"""
+Tests for SQL query profiling: per-request counts in debug headers, slow
+queries with their plans, and query budgets for the sidebar and new
+conversation endpoints.
+"""
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api import messages
+from app.core import query_profiler
+from app.core.database import Base
+from app.core.query_profiler import QueryProfilerMiddleware, track_queries
+from app.core.shared_state import MemoryState
+from app.models.database_models import User, Conversation, Message
+from app.services.conversation_events import ConversationEvents
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(messages, "conversation_events", ConversationEvents(state=MemoryState()))
+    monkeypatch.setattr(messages.chat_service, "prepare_conversation", lambda conversation_id: None)
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(id="u1", email="ava@example.com", name="Ava"))
+    db.commit()
+    return db
+
+def add_conversations(db, count: int):
+    for _ in range(count):
+        conversation = Conversation(title="Tacos", user_id="u1", is_new=False, is_active=False)
+        db.add(conversation)
+        db.flush()
+        for i in range(3):
+            message = Message(conversation_id=conversation.id, sender="bot" if i % 2 else "user", content="tacos")
+            if i % 2:
+                message.save_restaurant_search({"term": "tacos", "location": "Austin, TX", "k": 1})
+            db.add(message)
+    db.commit()
+
+async def load_sidebar(db):
+    user = db.get(User, "u1")
+    request = Request({"type": "http", "headers": []})
+    with track_queries() as stats:
+        await messages.get_conversations(request, current_user=user, db=db)
+    db.expire_all()
+    return stats.count
+
+@pytest.mark.asyncio
+async def test_sidebar_queries_do_not_grow_with_conversations(db):
+    add_conversations(db, 1)
+    few = await load_sidebar(db)
+    add_conversations(db, 20)
+    assert await load_sidebar(db) == few <= 5
+
+@pytest.mark.asyncio
+async def test_new_conversation_query_budget(db, query_budget):
+    add_conversations(db, 10)
+    user = db.get(User, "u1")
+    # Look for an unused new conversation, deactivate the others, insert
+    with query_budget(3):
+        created = await messages.create_new_conversation(current_user=user, db=db)
+    with query_budget(3):
+        again = await messages.create_new_conversation(current_user=user, db=db)
+    assert again["id"] == created["id"]
+    db.expire_all()
+    assert [c.id for c in db.query(Conversation).filter(Conversation.is_active == True)] == [created["id"]]
+
+def test_debug_headers_and_slow_query_plans(db, monkeypatch):
+    monkeypatch.setattr(query_profiler, "SLOW_QUERY_MS", 0)
+    app = FastAPI()
+    app.add_middleware(QueryProfilerMiddleware, headers=True)
+
+    @app.get("/users")
+    def users():
+        db.execute(text("SELECT count(*) FROM users"))
+        db.execute(text("SELECT * FROM conversations WHERE user_id = :user"), {"user": "u1"})
+        return {"ok": True}
+
+    response = TestClient(app).get("/users")
+    assert response.headers["x-db-query-count"] == "2"
+    assert float(response.headers["x-db-query-time-ms"]) >= 0
+
+    with track_queries() as stats:
+        db.execute(text("SELECT * FROM conversations WHERE user_id = :user"), {"user": "u1"})
+    [slow] = stats.slow
+    assert "ix_conversations_user_id" in slow["plan"] or "SCAN" in slow["plan"]
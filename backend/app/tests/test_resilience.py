@@ -0,0 +1,133 @@
+"""
+Tests for the resilience layer: retries, circuit breaking, hedging and
+deadlines, exercised against a local fault-injecting Yelp stub.
+"""
+
+import time
+import pytest
+from fastapi import HTTPException
+
+from app.core.resilience import (
+    CircuitBreaker, RetryPolicy, CircuitOpenError, call_with_retry, deadline_scope
+)
+from app.services import yelp_client
+from app.tests.fake_yelp import FakeYelpServer
+
+@pytest.fixture
+def fake_yelp(monkeypatch):
+    with FakeYelpServer() as fake:
+        monkeypatch.setattr(yelp_client, "YELP_API_BASE_URL", fake.base_url)
+        monkeypatch.setattr(yelp_client, "yelp_breaker", CircuitBreaker("yelp", failure_threshold=3, reset_seconds=30))
+        monkeypatch.setattr(yelp_client, "yelp_retry", RetryPolicy(attempts=3, base_delay=0.01, max_delay=0.02))
+        monkeypatch.setattr(yelp_client, "YELP_HEDGE_ENABLED", False)
+        monkeypatch.setattr(yelp_client, "YELP_CACHE_TTL_SECONDS", 0)
+        yield fake
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_retried(fake_yelp):
+    fake_yelp.faults = [{"status": 503}, {"status": 502}]
+    data = await yelp_client.make_yelp_request("/businesses/biz-1")
+    assert data["id"] == "biz-1"
+    assert len(fake_yelp.requests) == 3
+    assert yelp_client.yelp_breaker.state == "closed"
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried(fake_yelp):
+    fake_yelp.faults = [{"status": 404}]
+    with pytest.raises(HTTPException) as error:
+        await yelp_client.make_yelp_request("/businesses/missing")
+    assert error.value.status_code == 404
+    assert len(fake_yelp.requests) == 1
+    assert yelp_client.yelp_breaker.failures == 0
+
+@pytest.mark.asyncio
+async def test_breaker_opens_and_fails_fast(fake_yelp):
+    fake_yelp.faults = [{"status": 500}] * 3
+    with pytest.raises(HTTPException):
+        await yelp_client.make_yelp_request("/businesses/biz-1")
+    assert yelp_client.yelp_breaker.state == "open"
+
+    with pytest.raises(HTTPException) as error:
+        await yelp_client.make_yelp_request("/businesses/biz-1")
+    assert error.value.status_code == 503
+    assert "Retry-After" in error.value.headers
+    assert len(fake_yelp.requests) == 3
+
+@pytest.mark.asyncio
+async def test_slow_get_is_hedged(fake_yelp, monkeypatch):
+    monkeypatch.setattr(yelp_client, "YELP_HEDGE_ENABLED", True)
+    monkeypatch.setattr(yelp_client, "YELP_HEDGE_DELAY_SECONDS", 0.05)
+    fake_yelp.faults = [{"delay": 1.0}]
+
+    start = time.monotonic()
+    data = await yelp_client.make_yelp_request("/businesses/search", {"location": "Austin"})
+    assert len(data["businesses"]) == 10
+    assert time.monotonic() - start < 0.5
+    assert len(fake_yelp.requests) == 2
+
+@pytest.mark.asyncio
+async def test_request_deadline_bounds_upstream_wait(fake_yelp):
+    fake_yelp.faults = [{"delay": 2.0}]
+    start = time.monotonic()
+    with deadline_scope(0.2):
+        with pytest.raises(HTTPException) as error:
+            await yelp_client.make_yelp_request("/businesses/biz-1")
+    assert error.value.status_code == 504
+    assert time.monotonic() - start < 1.0
+
+@pytest.mark.asyncio
+async def test_breaker_half_open_trial():
+    now = [0.0]
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=10, clock=lambda: now[0])
+
+    async def fail():
+        raise TimeoutError()
+
+    with pytest.raises(TimeoutError):
+        await call_with_retry(fail, breaker=breaker)
+    with pytest.raises(CircuitOpenError):
+        await call_with_retry(lambda: "ok", breaker=breaker)
+
+    now[0] = 11.0
+    assert breaker.state == "half_open"
+    assert await call_with_retry(lambda: "ok", breaker=breaker) == "ok"
+    assert breaker.state == "closed"
+
+@pytest.mark.asyncio
+async def test_half_open_breaker_allows_a_single_trial():
+    now = [0.0]
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=10, clock=lambda: now[0])
+    breaker.record_failure()
+    now[0] = 11.0
+
+    async def trial():
+        # Everyone else is turned away while the trial is in flight
+        with pytest.raises(CircuitOpenError):
+            await call_with_retry(lambda: "ok", breaker=breaker)
+        raise TimeoutError()
+
+    with pytest.raises(TimeoutError):
+        await call_with_retry(trial, breaker=breaker)
+    assert breaker.state == "open"
+
+    now[0] = 22.0
+    assert await call_with_retry(lambda: "ok", breaker=breaker) == "ok"
+    assert breaker.state == "closed"
+
+@pytest.mark.asyncio
+async def test_open_circuit_fails_search_fast(fake_yelp):
+    fake_yelp.faults = [{"status": 500}] * 3
+    params = yelp_client.build_search_params("ramen", "Austin, TX", None, None, 3)
+    with pytest.raises(HTTPException):
+        await yelp_client.fetch_businesses_with_retry(params, 3)
+    assert yelp_client.yelp_breaker.state == "open"
+
+    with pytest.raises(HTTPException) as error:
+        await yelp_client.fetch_businesses_with_retry(params, 3)
+    assert error.value.status_code == 503
+
+def test_backoff_is_jittered_and_bounded():
+    policy = RetryPolicy(base_delay=0.2, max_delay=1.0)
+    delays = [policy.backoff(attempt) for attempt in range(1, 10) for _ in range(20)]
+    assert all(0 <= d <= 1.0 for d in delays)
+    assert len(set(delays)) > 1
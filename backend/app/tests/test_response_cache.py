@@ -0,0 +1,83 @@
+"""
+Tests for the semantic response cache.
+"""
+
+from app.services.response_cache import ResponseCache, split_query
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def make_cache(**kwargs):
+    return ResponseCache(enabled=True, **kwargs)
+
+def test_split_query_normalizes_topic_and_location():
+    assert split_query("What are the best tacos in Austin, TX?") == ("best tacos", "austin tx")
+    assert split_query("best TACOS in austin tx") == ("best tacos", "austin tx")
+    assert split_query("Sushi near São Paulo, Brazil") == ("sushi", "sao paulo brazil")
+    assert split_query("what about cheaper ones?")[1] is None
+
+def test_near_duplicate_question_hits():
+    cache = make_cache()
+    search = {"term": "tacos", "location": "Austin, TX", "k": 3}
+    cache.store("Best tacos in Austin, TX", "Try these!", search)
+
+    hit = cache.lookup("what are the best taco spots in austin tx?")
+
+    assert hit is not None
+    assert hit.content == "Try these!"
+    assert hit.restaurant_search == search
+
+def test_entries_are_scoped_per_user():
+    cache = make_cache()
+    cache.store("Best tacos in Austin, TX", "Ava, try these!", None, scope="u1")
+
+    assert cache.lookup("Best tacos in Austin, TX", scope="u2") is None
+    assert cache.lookup("Best tacos in Austin, TX") is None
+    assert cache.lookup("Best tacos in Austin, TX", scope="u1").content == "Ava, try these!"
+
+def test_different_location_or_topic_misses():
+    cache = make_cache()
+    cache.store("Best tacos in Austin, TX", "Try these!", None)
+
+    assert cache.lookup("Best tacos in Houston, TX") is None
+    assert cache.lookup("Best sushi in Austin, TX") is None
+
+def test_questions_without_location_are_not_cached():
+    cache = make_cache()
+    cache.store("what about cheaper ones?", "Sure!", None)
+    assert cache.lookup("what about cheaper ones?") is None
+    assert cache.stats()["entries"] == 0
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = make_cache(ttl_seconds=60, clock=clock)
+    cache.store("Best tacos in Austin", "Try these!", None)
+
+    clock.now = 61
+    assert cache.lookup("Best tacos in Austin") is None
+    assert cache.stats()["entries"] == 0
+
+def test_least_recently_used_entry_is_evicted():
+    cache = make_cache(max_entries=2)
+    cache.store("Best tacos in Austin", "tacos", None)
+    cache.store("Best ramen in Austin", "ramen", None)
+    cache.lookup("Best tacos in Austin")
+    cache.store("Best pizza in Austin", "pizza", None)
+
+    assert cache.lookup("Best tacos in Austin") is not None
+    assert cache.lookup("Best ramen in Austin") is None
+
+def test_hit_rate_and_disabled_cache():
+    cache = make_cache()
+    cache.store("Best tacos in Austin", "tacos", None)
+    cache.lookup("Best tacos in Austin")
+    cache.lookup("Best ramen in Austin")
+    assert cache.stats()["hit_rate"] == 0.5
+
+    disabled = ResponseCache(enabled=False)
+    disabled.store("Best tacos in Austin", "tacos", None)
+    assert disabled.lookup("Best tacos in Austin") is None
@@ -0,0 +1,46 @@
+"""
+Tests for the fast JSON response path: parity with FastAPI's default
+encoding, pre-serialized fragments, and the stdlib fallback.
+"""
+
+import json
+import pytest
+from datetime import datetime, timezone
+from fastapi.encoders import jsonable_encoder
+
+from app.core import responses
+from app.core.responses import FastJSONResponse, Fragment, dumps
+
+PAYLOAD = {
+    "id": 1,
+    "created_at": datetime(2024, 5, 1, 12, 30, 15, 123456),
+    "updated_at": datetime(2024, 5, 2, 8, 0, tzinfo=timezone.utc),
+    "title": "Ramen in Austin — “best” picks",
+    "messages": [{"id": 2, "content": "Hi\nthere", "restaurant_search": None, "is_edited": False}],
+}
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def encoder(request, monkeypatch):
+    if request.param == "stdlib":
+        monkeypatch.setattr(responses, "orjson", None)
+    return request.param
+
+def test_matches_default_encoding(encoder):
+    assert json.loads(dumps(PAYLOAD)) == jsonable_encoder(PAYLOAD)
+
+def test_fragments_are_spliced_verbatim(encoder):
+    stored = '[{"id":"biz-0","name":"Ramen Tatsu-Ya"}]'
+    body = dumps({"snapshot": {"businesses": Fragment(stored)}, "other": [Fragment(b"3"), "x"]})
+    assert stored.encode() in body
+    assert json.loads(body) == {"snapshot": {"businesses": json.loads(stored)}, "other": [3, "x"]}
+
+def test_user_text_cannot_forge_a_fragment(encoder):
+    # Looks like a placeholder, but without the per-call nonce
+    tricky = "\x00deadbeefdeadbeef:0\x00"
+    body = dumps({"content": tricky, "snapshot": Fragment("[1]")})
+    assert json.loads(body) == {"content": tricky, "snapshot": [1]}
+
+def test_response_renders_bytes():
+    response = FastJSONResponse(PAYLOAD)
+    assert response.media_type == "application/json"
+    assert json.loads(response.body)["created_at"] == "2024-05-01T12:30:15.123456"
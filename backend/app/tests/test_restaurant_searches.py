@@ -0,0 +1,87 @@
+"""
+Tests for structured restaurant searches: model round trip, migration of
+legacy JSON rows, and the top-searches query.
+"""
+
+import json
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api import messages
+from app.core.database import Base
+from app.core.migrations import run_migrations
+from app.models.database_models import User, Conversation, Message, RestaurantSearch
+from app.models.message import Message as MessageSchema
+from app.services.search import install_search_index, search_messages
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add(User(id="u1", email="ava@example.com", name="Test User"))
+        db.add(Conversation(id=1, title="Conversation 1", user_id="u1", is_new=False))
+        db.commit()
+    return engine
+
+def test_search_round_trip(engine):
+    db = sessionmaker(bind=engine)()
+    params = {"term": "ramen", "location": "Austin, TX", "k": 3, "sort_by": "best_match"}
+    message = Message(conversation_id=1, sender="bot", content="Try these!")
+    message.save_restaurant_search(params)
+    db.add(message)
+    db.commit()
+
+    stored = db.query(RestaurantSearch).one()
+    assert (stored.message_id, stored.term, stored.k, stored.price) == (message.id, "ramen", 3, None)
+    assert message.load_restaurant_search() == params
+    assert MessageSchema.model_validate(message).restaurant_search == params
+
+    message.save_restaurant_search({"term": "pho", "k": 2})
+    db.commit()
+    assert db.query(RestaurantSearch).one().term == "pho"
+
+    message.save_restaurant_search(None)
+    db.commit()
+    assert db.query(RestaurantSearch).count() == 0
+
+def test_migration_moves_legacy_json(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO messages (id, conversation_id, sender, content, restaurant_search) VALUES "
+            "(1, 1, 'bot', 'Tacos!', :a), (2, 1, 'bot', 'Broken', 'not json'), (3, 1, 'user', 'Hi', NULL)"
+        ), {"a": json.dumps({"term": "tacos", "location": "Austin, TX", "k": "5", "price": "$$"})})
+    install_search_index(engine)
+
+    run_migrations(engine)
+    run_migrations(engine)  # already applied: no-op
+
+    db = sessionmaker(bind=engine)()
+    assert db.query(RestaurantSearch).count() == 1
+    assert db.get(Message, 1).load_restaurant_search() == {"term": "tacos", "location": "Austin, TX", "k": 5, "price": "$$"}
+    assert db.get(Message, 2).load_restaurant_search() is None
+    legacy = db.execute(text("SELECT count(*) FROM messages WHERE restaurant_search IS NOT NULL")).scalar()
+    assert legacy == 0
+
+    # The search index follows the moved terms
+    assert [r["message_id"] for r in search_messages(db, "u1", "tacos austin")["results"]] == [1]
+
+@pytest.mark.asyncio
+async def test_top_searches(engine):
+    db = sessionmaker(bind=engine)()
+    for term, location in [("ramen", "Austin, TX")] * 3 + [("tacos", "Austin, TX")] * 2 + [("pizza", "Boston, MA")]:
+        message = Message(conversation_id=1, sender="bot", content="...")
+        message.save_restaurant_search({"term": term, "location": location, "k": 3})
+        db.add(message)
+    db.commit()
+
+    user = db.get(User, "u1")
+    top = await messages.top_restaurant_searches(location=None, limit=2, current_user=user, db=db)
+    assert top == [
+        {"location": "Austin, TX", "term": "ramen", "count": 3},
+        {"location": "Austin, TX", "term": "tacos", "count": 2},
+    ]
+    boston = await messages.top_restaurant_searches(location="Boston, MA", limit=10, current_user=user, db=db)
+    assert boston == [{"location": "Boston, MA", "term": "pizza", "count": 1}]
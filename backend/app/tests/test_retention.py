@@ -0,0 +1,187 @@
+"""
+Tests for retention: archiving old conversations, reading them back through
+get_conversation, archive compaction, and database vacuuming.
+"""
+
+import os
+import pytest
+from datetime import datetime, timedelta, timezone
+from fastapi import BackgroundTasks, Request
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api import messages
+from app.core.database import Base
+from app.core.responses import loads
+from app.core.shared_state import MemoryState
+from app.models.database_models import User, Conversation, Message, ConversationArchive, YelpSnapshot
+from app.services.retention import RetentionService
+from app.services.search import install_search_index
+
+OLD = datetime.now(timezone.utc) - timedelta(days=120)
+
+def add_conversation(db, conversation_id: int, user_id: str, updated_at: datetime, message_count: int = 3):
+    db.add(Conversation(
+        id=conversation_id, title=f"Conversation {conversation_id}", user_id=user_id,
+        is_new=False, is_active=False, updated_at=updated_at
+    ))
+    for i in range(message_count):
+        message = Message(conversation_id=conversation_id, sender="user" if i % 2 == 0 else "bot", content=f"ramen question {i}")
+        if i % 2:
+            message.save_restaurant_search({"term": "ramen", "location": "Austin, TX", "k": 1})
+            message.snapshot = YelpSnapshot(businesses='[{"id":"biz-0"}]', fetched_at=updated_at)
+        db.add(message)
+    db.commit()
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    install_search_index(engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        db.add(User(id="u1", email="ava@example.com", name="Ava"))
+        db.commit()
+        add_conversation(db, 1, "u1", OLD)
+        add_conversation(db, 2, "u1", OLD)
+        add_conversation(db, 3, "u1", datetime.now(timezone.utc))
+    return factory
+
+@pytest.fixture
+def retention(session_factory, tmp_path, monkeypatch):
+    service = RetentionService(
+        session_factory=session_factory, archive_dir=str(tmp_path), retention_days=90, state=MemoryState()
+    )
+    monkeypatch.setattr(messages, "retention", service)
+    return service
+
+async def load_conversation(session_factory, conversation_id: int):
+    with session_factory() as db:
+        user = db.get(User, "u1")
+        request = Request({"type": "http", "headers": []})
+        response = await messages.get_conversation(conversation_id, BackgroundTasks(), request, current_user=user, db=db)
+    return loads(response.body), response.headers["etag"]
+
+@pytest.mark.asyncio
+async def test_old_conversations_are_archived_and_still_readable(retention, session_factory):
+    before, etag_before = await load_conversation(session_factory, 1)
+
+    report = await retention.run_once()
+    assert (report["archived_conversations"], report["archived_messages"]) == (2, 6)
+
+    with session_factory() as db:
+        assert db.query(Message).filter(Message.conversation_id.in_([1, 2])).count() == 0
+        assert db.query(Message).filter(Message.conversation_id == 3).count() == 3
+        assert db.query(YelpSnapshot).count() == 1
+        assert db.execute(text("SELECT count(*) FROM messages_fts")).scalar() == 3
+        archives = db.query(ConversationArchive).order_by(ConversationArchive.conversation_id).all()
+        # One file per user
+        assert archives[0].path == archives[1].path
+        assert os.listdir(retention.archive_dir) == [archives[0].path]
+
+    after, etag_after = await load_conversation(session_factory, 1)
+    assert after["messages"] == before["messages"]
+    assert etag_after != etag_before
+
+@pytest.mark.asyncio
+async def test_new_messages_are_merged_and_rearchived(retention, session_factory):
+    await retention.run_once()
+    with session_factory() as db:
+        db.add(Message(conversation_id=1, sender="user", content="still open?"))
+        db.commit()
+
+    result, _ = await load_conversation(session_factory, 1)
+    assert [m["content"] for m in result["messages"]][-2:] == ["ramen question 2", "still open?"]
+
+    assert retention.archive_conversation(1) == 1
+    with session_factory() as db:
+        assert db.get(ConversationArchive, 1).message_count == 4
+    result, _ = await load_conversation(session_factory, 1)
+    assert len(result["messages"]) == 4
+
+def test_messages_sent_while_archiving_stay_hot(retention, session_factory, monkeypatch):
+    append = retention._append
+
+    def reopen_then_append(path, data):
+        # The user reopens the conversation and sends a message after it was read
+        with session_factory() as db:
+            db.get(Conversation, 1).is_active = True
+            db.add(Message(conversation_id=1, sender="user", content="are you there?"))
+            db.commit()
+        return append(path, data)
+
+    monkeypatch.setattr(retention, "_append", reopen_then_append)
+    assert retention.archive_conversation(1, OLD + timedelta(days=1)) == 3
+    with session_factory() as db:
+        assert [m.content for m in db.query(Message).filter(Message.conversation_id == 1)] == ["are you there?"]
+
+    # Reopened, so a later run leaves it alone
+    monkeypatch.setattr(retention, "_append", append)
+    assert retention.archive_conversation(1, OLD + timedelta(days=1)) == 0
+
+@pytest.mark.asyncio
+async def test_deleted_archives_are_compacted(retention, session_factory, monkeypatch):
+    # Both archives are about the same size, so deleting one leaves the file about half dead
+    monkeypatch.setattr("app.services.retention.COMPACT_DEAD_RATIO", 0.25)
+    await retention.run_once()
+    with session_factory() as db:
+        db.query(Conversation).filter(Conversation.id == 1).delete()
+        db.commit()
+        path = db.get(ConversationArchive, 2).path
+        assert db.get(ConversationArchive, 1) is None
+    size = os.path.getsize(os.path.join(retention.archive_dir, path))
+
+    report = await retention.run_once()
+    assert report["archive_bytes_reclaimed"] > 0
+    with session_factory() as db:
+        new_path = db.get(ConversationArchive, 2).path
+    assert new_path != path and os.listdir(retention.archive_dir) == [new_path]
+    assert os.path.getsize(os.path.join(retention.archive_dir, new_path)) < size
+    result, _ = await load_conversation(session_factory, 2)
+    assert len(result["messages"]) == 3
+
+    with session_factory() as db:
+        db.query(Conversation).filter(Conversation.id == 2).delete()
+        db.commit()
+    await retention.run_once()
+    assert os.listdir(retention.archive_dir) == []
+
+@pytest.mark.asyncio
+async def test_compaction_leaves_other_files_alone(retention):
+    # Files the service didn't write, even ones that look like archives
+    for name in ("backup.gz", "0123456789abcdef01234567.tar.gz", "notes.txt"):
+        with open(os.path.join(retention.archive_dir, name), "wb") as f:
+            f.write(b"keep me")
+
+    await retention.run_once()
+    assert {"backup.gz", "0123456789abcdef01234567.tar.gz", "notes.txt"} <= set(os.listdir(retention.archive_dir))
+
+@pytest.mark.asyncio
+async def test_vacuum_reports_reclaimed_space(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    service = RetentionService(session_factory=factory, archive_dir=str(tmp_path / "archive"), retention_days=0)
+    with factory() as db:
+        db.add(User(id="u1", email="ava@example.com", name="Ava"))
+        add_conversation(db, 1, "u1", OLD, message_count=0)
+        db.add_all([Message(conversation_id=1, sender="user", content="x" * 2000) for _ in range(200)])
+        db.commit()
+
+    def delete_messages():
+        with factory() as db:
+            db.query(Message).delete()
+            db.commit()
+
+    delete_messages()
+    first = await service.run_once()
+    assert first["vacuum"] == "full" and first["db_bytes_reclaimed"] > 0
+
+    with factory() as db:
+        db.add_all([Message(conversation_id=1, sender="user", content="x" * 2000) for _ in range(200)])
+        db.commit()
+    delete_messages()
+    second = await service.run_once()
+    assert second["vacuum"] == "incremental" and second["db_bytes_reclaimed"] > 0
+    assert service.stats()["last_run"] == second
@@ -0,0 +1,96 @@
+"""
+Tests for full-text search over conversation history (SQLite FTS5).
+"""
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api import messages
+from app.core.database import Base
+from app.models.database_models import User, Conversation, Message
+from app.services.search import install_search_index, search_messages
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        User(id="u1", email="ava@example.com", name="Test User"),
+        User(id="u2", email="bob@example.com", name="Other User"),
+        Conversation(id=1, title="Conversation 1", user_id="u1", is_new=False),
+        Conversation(id=2, title="Conversation 2", user_id="u1", is_new=False),
+        Conversation(id=3, title="Conversation 1", user_id="u2", is_new=False),
+    ])
+    session.add_all([
+        Message(id=1, conversation_id=1, sender="user", content="Any good noodle spots in Austin?"),
+        Message(id=2, conversation_id=1, sender="bot", content="Here are some places I think you'll love!",
+                restaurant_search='{"term": "ramen", "location": "Austin, TX", "k": 5}'),
+        Message(id=3, conversation_id=2, sender="user", content="I had amazing ramen at Ramen Tatsu-ya last month"),
+        Message(id=4, conversation_id=3, sender="user", content="ramen ramen ramen"),
+    ])
+    session.commit()
+    # Installed after the rows exist, so this also exercises the backfill
+    install_search_index(engine)
+    yield session
+    session.close()
+
+def test_search_ranks_highlights_and_scopes_to_user(db):
+    result = search_messages(db, "u1", "ramen")
+    ids = [r["message_id"] for r in result["results"]]
+    assert sorted(ids) == [2, 3]
+    assert result["total"] == 2
+
+    by_id = {r["message_id"]: r for r in result["results"]}
+    assert by_id[2]["search_terms"].startswith("<mark>ramen</mark>")
+    assert "<mark>Ramen</mark>" in by_id[3]["snippet"]
+
+def test_snippets_escape_stored_markup(db):
+    db.add(Message(id=5, conversation_id=1, sender="user", content='<img src=x onerror="alert(1)"> sushi & <b>tea</b>'))
+    db.commit()
+
+    [hit] = search_messages(db, "u1", "sushi")["results"]
+    assert "<img" not in hit["snippet"] and "<b>" not in hit["snippet"]
+    assert "&lt;img" in hit["snippet"] and "&amp;" in hit["snippet"]
+    assert "<mark>sushi</mark>" in hit["snippet"]
+
+def test_search_uses_prefixes_and_requires_all_words(db):
+    assert [r["message_id"] for r in search_messages(db, "u1", "noodl aus")["results"]] == [1]
+    assert search_messages(db, "u1", "ramen houston")["total"] == 0
+    # Quotes and operators in user input can't break the FTS query
+    assert search_messages(db, "u1", 'ramen" AND (')["total"] == 0
+    assert search_messages(db, "u1", '"ramen')["total"] == 2
+
+def test_index_follows_edits_and_deletes(db):
+    message = db.get(Message, 3)
+    message.content = "Tacos at Veracruz were great"
+    db.commit()
+    assert [r["message_id"] for r in search_messages(db, "u1", "ramen")["results"]] == [2]
+    assert [r["message_id"] for r in search_messages(db, "u1", "veracruz")["results"]] == [3]
+
+    new_message = Message(conversation_id=2, sender="bot", content="More tacos", restaurant_search='{"term": "birria"}')
+    db.add(new_message)
+    db.commit()
+    assert [r["message_id"] for r in search_messages(db, "u1", "birria")["results"]] == [new_message.id]
+
+    db.delete(db.get(Message, 2))
+    db.commit()
+    assert search_messages(db, "u1", "ramen")["total"] == 0
+
+def test_pagination(db):
+    for i in range(25):
+        db.add(Message(conversation_id=2, sender="user", content=f"pizza question {i}"))
+    db.commit()
+
+    first = search_messages(db, "u1", "pizza", limit=10, offset=0)
+    last = search_messages(db, "u1", "pizza", limit=10, offset=20)
+    assert first["total"] == 25
+    assert len(first["results"]) == 10 and len(last["results"]) == 5
+    assert not {r["message_id"] for r in first["results"]} & {r["message_id"] for r in last["results"]}
+
+@pytest.mark.asyncio
+async def test_search_endpoint(db):
+    result = await messages.search_conversations(q="tatsu", limit=20, offset=0, current_user=db.get(User, "u1"), db=db)
+    assert result["results"][0]["conversation_title"] == "Conversation 2"
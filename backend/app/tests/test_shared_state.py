@@ -0,0 +1,180 @@
+"""
+Tests for the shared-state backends (in-memory and Redis protocol) and the
+features built on them: Yelp response cache, token cache and resuming a
+reply on another worker.
+"""
+
+import asyncio
+import json
+import time
+import pytest
+import pytest_asyncio
+
+from app.auth import oauth
+from app.core.shared_state import MemoryState, RedisState
+from app.services import yelp_client
+from app.services.stream_registry import StreamRegistry
+from app.tests.fake_redis import FakeRedisServer
+from app.tests.fake_yelp import FakeYelpServer
+
+@pytest.fixture
+def redis_server():
+    with FakeRedisServer() as server:
+        yield server
+
+@pytest_asyncio.fixture(params=["memory", "redis"])
+async def make_state(request, redis_server):
+    """Factory for per-worker state handles that all see the same data"""
+    shared_memory = MemoryState()
+    created = []
+
+    def make():
+        if request.param == "memory":
+            return shared_memory
+        state = RedisState(redis_server.url)
+        created.append(state)
+        return state
+
+    yield make
+    for state in created:
+        await state.close()
+
+@pytest.mark.asyncio
+async def test_primitives(make_state):
+    state = make_state()
+    assert await state.set("k", "v", ttl=0.1)
+    assert not await state.set("k", "other", only_if_absent=True)
+    assert await state.get("k") == "v"
+    await asyncio.sleep(0.15)
+    assert await state.get("k") is None
+
+    token = await state.acquire_lock("job", ttl=5)
+    assert token and await state.acquire_lock("job", ttl=5) is None
+    await state.release_lock("job", "not-the-holder")
+    assert await state.acquire_lock("job", ttl=5) is None
+    await state.release_lock("job", token)
+    assert await state.acquire_lock("job", ttl=5)
+
+    await state.list_append("events", ["1", "2", "3"], max_len=4)
+    await state.list_append("events", ["4", "5"], max_len=4)
+    assert await state.list_range("events") == ["2", "3", "4", "5"]
+
+    subscription = await state.subscribe("news")
+    await make_state().publish("news", "hello")
+    assert await subscription.get(timeout=1) == "hello"
+    await subscription.close()
+
+@pytest.mark.asyncio
+async def test_cancelled_command_does_not_leak_its_reply(redis_server):
+    state = RedisState(redis_server.url)
+    await state.set("a", "1")
+    await state.set("b", "2")
+
+    redis_server.reply_delay = 0.2
+    # Written, then cancelled before the reply arrives
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(state.get("a"), timeout=0.05)
+    redis_server.reply_delay = 0
+
+    assert await state.get("b") == "2"
+    await state.close()
+
+@pytest.mark.asyncio
+async def test_memory_state_sweeps_expired_keys():
+    now = [0.0]
+    state = MemoryState(clock=lambda: now[0], sweep_seconds=60)
+    for i in range(100):
+        await state.set(f"token:{i}", "claims", ttl=30)
+    await state.set("kept", "v")
+
+    now[0] = 61
+    # Any write past the sweep interval drops keys nobody read again
+    await state.set("token:new", "claims", ttl=30)
+    assert set(state._values) == {"kept", "token:new"}
+    assert set(state._expires) == {"token:new"}
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_fetch(make_state):
+    workers = [make_state() for _ in range(3)]
+    fetches = 0
+
+    async def fetch():
+        nonlocal fetches
+        fetches += 1
+        await asyncio.sleep(0.1)
+        return {"answer": 42}
+
+    results = await asyncio.gather(*(w.cached("key", fetch, ttl=60) for w in workers * 2))
+    assert results == [{"answer": 42}] * 6
+    assert fetches == 1
+
+@pytest.mark.asyncio
+async def test_reply_started_on_one_worker_resumes_on_another(make_state):
+    worker_a = StreamRegistry(grace_seconds=0.05, linger_seconds=60, state=make_state())
+    worker_b = StreamRegistry(state=make_state())
+
+    stream = worker_a.create(41, "u1")
+
+    async def produce():
+        for i in range(10):
+            stream.publish({"content": f"w{i} "})
+            await asyncio.sleep(0.03)
+        stream.publish("[DONE]")
+
+    worker_a.start(stream, produce())
+
+    # The client reads a few events from worker A, then its connection drops
+    received = []
+    events = worker_a.attach(stream)
+    async for event in events:
+        received.append(event)
+        if len(received) == 3:
+            break
+    await events.aclose()
+    last_id = int(received[-1].split("\n")[0][4:])
+
+    # It reconnects through a load balancer that routes it to worker B
+    assert worker_b.get(41) is None
+    snapshot = await worker_b.find_remote(41)
+    assert snapshot["user_id"] == "u1"
+    resumed = [event async for event in worker_b.attach_remote(41, last_id)]
+
+    parsed = [(int(e.split("\n")[0][4:]), e.split("\n")[1][6:]) for e in received + resumed]
+    assert [event_id for event_id, _ in parsed] == list(range(1, 12))
+    content = "".join(json.loads(data)["content"] for _, data in parsed if data != "[DONE]")
+    assert content == "".join(f"w{i} " for i in range(10))
+    assert parsed[-1][1] == "[DONE]"
+
+    # Worker A kept producing because worker B was watching
+    await asyncio.wait_for(stream.task, timeout=1)
+    assert not stream.task.cancelled()
+
+@pytest.mark.asyncio
+async def test_yelp_responses_are_cached_and_single_flight(monkeypatch):
+    with FakeYelpServer() as fake:
+        monkeypatch.setattr(yelp_client, "YELP_API_BASE_URL", fake.base_url)
+        monkeypatch.setattr(yelp_client, "YELP_CACHE_TTL_SECONDS", 60)
+        monkeypatch.setattr(yelp_client, "shared_state", MemoryState())
+        fake.faults = [{"delay": 0.2}]
+
+        params = {"location": "Austin", "term": "ramen"}
+        results = await asyncio.gather(*(yelp_client.make_yelp_request("/businesses/search", dict(params)) for _ in range(5)))
+        assert all(r == results[0] for r in results)
+        await yelp_client.make_yelp_request("/businesses/search", {"term": "ramen", "location": "Austin"})
+        assert len(fake.requests) == 1
+
+@pytest.mark.asyncio
+async def test_verified_tokens_are_cached(monkeypatch):
+    calls = []
+
+    def verify(token, request, audience=None, certs_url=None, clock_skew_in_seconds=0):
+        calls.append(token)
+        return {"iss": "accounts.google.com", "sub": "u1", "exp": time.time() + 3600}
+
+    monkeypatch.setattr(oauth.id_token, "verify_token", verify)
+    monkeypatch.setattr(oauth, "shared_state", MemoryState())
+
+    assert (await oauth.verify_token("token-a"))["sub"] == "u1"
+    assert (await oauth.verify_token("token-a"))["sub"] == "u1"
+    await oauth.verify_token("token-b")
+    assert calls == ["token-a", "token-b"]
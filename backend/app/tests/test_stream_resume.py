@@ -0,0 +1,164 @@
+"""
+Tests for resumable reply streams (event ids, ring buffer and Last-Event-ID replay).
+"""
+
+import asyncio
+import json
+import pytest
+from fastapi.responses import StreamingResponse
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api import messages
+from app.core.database import Base
+from app.models.database_models import User, Conversation
+from app.models.message import MessageCreate
+from app.services.chat_service import ChatService
+from app.services.stream_registry import ReplyStream
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        db.add(User(id="u1", email="ava@example.com", name="Test User"))
+        db.add(Conversation(id=1, title="Conversation 1", user_id="u1", is_new=False, thread_id="thread_1"))
+        db.commit()
+    return factory
+
+class FakeRequest:
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+
+    async def is_disconnected(self):
+        return False
+
+class CountingEngine:
+    """Engine that streams a fixed reply and counts how many replies it generated"""
+
+    def __init__(self, words: int = 20):
+        self.words = words
+        self.calls = 0
+
+    async def get_streaming_response(self, conversation_id, thread_id, message, db=None):
+        self.calls += 1
+
+        async def generate():
+            for i in range(self.words):
+                yield f"data: {json.dumps({'content': f'w{i} '})}\n\n"
+                await asyncio.sleep(0.005)
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(generate(), media_type="text/event-stream")
+
+def parse(event: str):
+    lines = dict(line.split(": ", 1) for line in event.strip().split("\n"))
+    data = lines["data"]
+    return int(lines["id"]) if "id" in lines else None, (data if data == "[DONE]" else json.loads(data))
+
+async def drain(stream: ReplyStream, last_event_id: int = 0):
+    return [parse(e) async for e in stream.subscribe(last_event_id)]
+
+@pytest.mark.asyncio
+async def test_replay_from_last_event_id():
+    stream = ReplyStream(message_id=7, user_id="u1", max_events=10)
+    for i in range(5):
+        stream.publish({"content": f"w{i} "})
+    stream.publish("[DONE]")
+    stream.finish()
+
+    events = await drain(stream, last_event_id=3)
+    assert events == [(4, {"content": "w3 "}), (5, {"content": "w4 "}), (6, "[DONE]")]
+
+@pytest.mark.asyncio
+async def test_evicted_events_are_replaced_by_snapshot():
+    stream = ReplyStream(message_id=7, user_id="u1", max_events=3)
+    stream.publish({"restaurant_search": {"term": "ramen"}})
+    for i in range(5):
+        stream.publish({"content": f"w{i} "})
+
+    subscriber = asyncio.create_task(drain(stream, last_event_id=1))
+    await asyncio.sleep(0.01)
+    stream.publish({"content": "w5 "})
+    stream.publish("[DONE]")
+    stream.finish()
+    events = await subscriber
+
+    event_id, first = events[0]
+    assert event_id == 6
+    assert first["resume_snapshot"]["content"] == "w0 w1 w2 w3 w4 "
+    assert first["resume_snapshot"]["restaurant_search"] == {"term": "ramen"}
+    assert events[1:] == [(7, {"content": "w5 "}), (8, "[DONE]")]
+
+@pytest.mark.asyncio
+async def test_resume_after_dropped_connection_reuses_the_same_run(session_factory, monkeypatch):
+    engine = CountingEngine(words=20)
+    monkeypatch.setattr(messages, "chat_service", ChatService(engine=engine))
+    monkeypatch.setattr(messages, "SessionLocal", session_factory)
+
+    with session_factory() as db:
+        user = db.get(User, "u1")
+        response = await messages.create_streaming_message(
+            message=MessageCreate(content="Ramen please", conversation_id=1),
+            request=FakeRequest(),
+            current_user=user,
+            db=db
+        )
+
+        # Read a few events, then drop the connection
+        received = []
+        async for event in response.body_iterator:
+            received.append(parse(event))
+            if len(received) == 6:
+                break
+        await response.body_iterator.aclose()
+
+        bot_message_id = next(data["bot_message_id"] for _, data in received if isinstance(data, dict) and "bot_message_id" in data)
+        last_event_id = received[-1][0]
+
+        resumed = await messages.resume_streaming_message(
+            message_id=bot_message_id,
+            request=FakeRequest({"last-event-id": str(last_event_id)}),
+            current_user=user,
+            db=db
+        )
+        replayed = [parse(event) async for event in resumed.body_iterator]
+
+    ids = [event_id for event_id, _ in received + replayed]
+    assert ids == list(range(1, len(ids) + 1))
+    assert replayed[-1][1] == "[DONE]"
+
+    content = "".join(data["content"] for _, data in received + replayed if isinstance(data, dict) and "content" in data)
+    assert content == "".join(f"w{i} " for i in range(20))
+    assert engine.calls == 1
+
+@pytest.mark.asyncio
+async def test_resume_finished_reply_serves_stored_message(session_factory, monkeypatch):
+    monkeypatch.setattr(messages, "chat_service", ChatService(engine=CountingEngine(words=3)))
+    monkeypatch.setattr(messages, "SessionLocal", session_factory)
+    monkeypatch.setattr(messages.stream_registry, "linger_seconds", 0)
+
+    with session_factory() as db:
+        user = db.get(User, "u1")
+        response = await messages.create_streaming_message(
+            message=MessageCreate(content="Ramen please", conversation_id=1),
+            request=FakeRequest(),
+            current_user=user,
+            db=db
+        )
+        events = [parse(event) async for event in response.body_iterator]
+        bot_message_id = next(data["bot_message_id"] for _, data in events if isinstance(data, dict) and "bot_message_id" in data)
+        await asyncio.sleep(0.05)
+        assert messages.stream_registry.get(bot_message_id) is None
+
+        resumed = await messages.resume_streaming_message(
+            message_id=bot_message_id,
+            request=FakeRequest({"last-event-id": "2"}),
+            current_user=user,
+            db=db
+        )
+        replayed = [parse(event) async for event in resumed.body_iterator]
+
+    assert replayed[0][1]["resume_snapshot"]["content"] == "w0 w1 w2"
+    assert replayed[-1][1] == "[DONE]"
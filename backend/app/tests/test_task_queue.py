@@ -0,0 +1,172 @@
+"""
+Tests for the background task queue: retries, deduplication, the
+concurrency limit, persistence across restarts and drain, plus thread
+preparation for new conversations.
+"""
+
+import asyncio
+import pytest
+from openai import OpenAI
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.core.resilience import RetryPolicy, CircuitBreaker
+from app.core.task_queue import TaskQueue, SQLiteTaskStore, task_queue
+from app.models.database_models import User, Conversation
+from app.services import chat_service as chat_service_module
+from app.services.chat_service import AssistantsEngine, ChatService
+from app.services.prompts import personal_greeting
+from app.services.thread_pool import ThreadPool
+from app.tests.fake_openai import FakeOpenAIServer
+
+def make_queue(store=None, concurrency=2):
+    return TaskQueue(concurrency=concurrency, store=store, retry_policy=RetryPolicy(attempts=3, base_delay=0.01, max_delay=0.01))
+
+@pytest.mark.asyncio
+async def test_failed_jobs_are_retried_then_marked_failed():
+    queue = make_queue()
+    calls = {"flaky": 0, "broken": 0}
+
+    async def flaky():
+        calls["flaky"] += 1
+        if calls["flaky"] < 3:
+            raise RuntimeError("try again")
+        return "ok"
+
+    async def broken():
+        calls["broken"] += 1
+        raise RuntimeError("always")
+
+    queue.register("flaky", flaky)
+    queue.register("broken", broken)
+    flaky_job = queue.enqueue("flaky")
+    broken_job = queue.enqueue("broken")
+
+    assert await flaky_job.wait(1) and await broken_job.wait(1)
+    assert (flaky_job.status, flaky_job.result, flaky_job.attempts) == ("completed", "ok", 3)
+    assert (broken_job.status, broken_job.error, calls["broken"]) == ("failed", "always", 3)
+    await queue.drain()
+
+@pytest.mark.asyncio
+async def test_keys_dedupe_and_concurrency_is_bounded():
+    queue = make_queue(concurrency=2)
+    active, peak = 0, 0
+
+    async def work(n: int):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+
+    queue.register("work", work)
+    first = queue.enqueue("work", {"n": 0}, key="same")
+    assert queue.enqueue("work", {"n": 1}, key="same") is first
+    jobs = [first] + [queue.enqueue("work", {"n": n}) for n in range(2, 8)]
+
+    await asyncio.gather(*(job.wait(2) for job in jobs))
+    assert all(job.status == "completed" for job in jobs)
+    assert peak == 2
+    assert queue.find("same") is None
+    await queue.drain()
+
+@pytest.mark.asyncio
+async def test_persisted_jobs_survive_a_restart(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    done = []
+
+    async def record(value: str):
+        done.append(value)
+
+    queue = make_queue(store=SQLiteTaskStore(path))
+    queue.register("record", record)
+    queue.enqueue("record", {"value": "now"}, persist=True)
+    # Not due before shutdown: stays in the store
+    queue.enqueue("record", {"value": "later"}, delay=60, persist=True)
+    queue.enqueue("record", {"value": "memory only"}, delay=60)
+    await asyncio.sleep(0.05)
+    await queue.drain(timeout=1)
+    assert done == ["now"]
+
+    restarted = make_queue(store=SQLiteTaskStore(path))
+    restarted.register("record", record)
+    restarted.start()
+    [job] = list(restarted._jobs.values())
+    assert job.payload == {"value": "later"}
+
+    job.run_at = 0
+    restarted._push(job)
+    assert await job.wait(1)
+    assert done == ["now", "later"]
+    assert restarted.store.count("pending") == 0
+    await restarted.drain()
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_running_jobs():
+    queue = make_queue()
+    finished = []
+
+    async def slow():
+        await asyncio.sleep(0.1)
+        finished.append(True)
+
+    queue.register("slow", slow)
+    queue.enqueue("slow")
+    await asyncio.sleep(0.01)
+    await queue.drain(timeout=2)
+    assert finished == [True]
+
+@pytest.mark.asyncio
+async def test_drained_queue_rejects_jobs_until_started():
+    queue = make_queue()
+    done = []
+
+    async def record(value: str):
+        done.append(value)
+
+    queue.register("record", record)
+    queue.start()
+    await queue.drain()
+
+    late = queue.enqueue("record", {"value": "late"})
+    assert not await late.wait(0.1)
+    assert queue.stats()["workers"] == 0
+
+    queue.start()
+    job = queue.enqueue("record", {"value": "next"})
+    assert await job.wait(1)
+    assert done == ["next"]
+    await queue.drain()
+
+@pytest.mark.asyncio
+async def test_new_conversation_thread_is_prepared_in_background(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    with session_factory() as db:
+        db.add(User(id="u1", email="ava@example.com", name="Ava Smith"))
+        db.add(Conversation(id=1, title="New Conversation", user_id="u1"))
+        db.commit()
+    monkeypatch.setattr(chat_service_module, "SessionLocal", session_factory)
+    monkeypatch.setattr(chat_service_module, "openai_breaker", CircuitBreaker("openai"))
+    monkeypatch.setattr(chat_service_module, "thread_pool", ThreadPool(session_factory, size=0))
+
+    with FakeOpenAIServer(run_polls=1) as fake:
+        service = ChatService(engine=AssistantsEngine(client=OpenAI(api_key="test", base_url=fake.base_url, max_retries=0)))
+        # No app lifespan here, and an earlier test's shutdown leaves the shared queue drained
+        task_queue.start()
+        service.prepare_conversation(1)
+
+        # The first message waits for the preparation instead of making its own thread
+        with session_factory() as db:
+            response = await service.get_streaming_response(1, None, "Ramen?", db=db)
+            events = [chunk async for chunk in response.body_iterator]
+
+        with session_factory() as db:
+            thread_id = db.get(Conversation, 1).thread_id
+        assert len(fake.calls("POST", "/v1/threads")) - len(fake.calls("POST", "/v1/threads/")) == 1
+        contents = [m["content"][0]["text"]["value"] for m in fake.threads[thread_id]]
+        assert contents[:2] == [personal_greeting("Ava Smith"), "Ramen?"]
+        assert events[-1] == "data: [DONE]\n\n"
@@ -0,0 +1,150 @@
+"""
+Tests for the pool of pre-greeted threads: filling it in the background,
+handing its threads to new conversations, falling back on a miss and
+retiring expired threads.
+"""
+
+import pytest
+from datetime import datetime, timedelta, timezone
+from openai import OpenAI
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.core.metrics import metrics
+from app.core.resilience import CircuitBreaker
+from app.core.task_queue import task_queue
+from app.models.database_models import User, Conversation, PooledThread
+from app.services import chat_service as chat_service_module
+from app.services.chat_service import AssistantsEngine, ChatService
+from app.services.prompts import personal_greeting
+from app.services.thread_pool import ThreadPool
+from app.tests.fake_openai import FakeOpenAIServer
+
+def created_threads(fake) -> int:
+    return len(fake.calls("POST", "/v1/threads")) - len(fake.calls("POST", "/v1/threads/"))
+
+async def settle(key: str):
+    job = task_queue.find(key)
+    if job is not None:
+        await job.wait(2)
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        db.add(User(id="u1", email="ava@example.com", name="Ava Smith"))
+        db.add_all([Conversation(id=i, title="New Conversation", user_id="u1") for i in (1, 2)])
+        db.commit()
+    monkeypatch.setattr(chat_service_module, "SessionLocal", factory)
+    monkeypatch.setattr(chat_service_module, "openai_breaker", CircuitBreaker("openai"))
+    monkeypatch.setattr(chat_service_module, "thread_pool", ThreadPool(factory, size=1))
+    return factory
+
+def make_service(fake) -> ChatService:
+    # No app lifespan here, and an earlier test's shutdown leaves the shared queue drained
+    task_queue.start()
+    return ChatService(engine=AssistantsEngine(client=OpenAI(api_key="test", base_url=fake.base_url, max_retries=0)))
+
+@pytest.mark.asyncio
+async def test_pool_is_filled_with_greeted_threads(session_factory):
+    with FakeOpenAIServer() as fake:
+        await make_service(fake).engine.fill_thread_pool("u1")
+        await make_service(fake).engine.fill_thread_pool("u1")
+
+        with session_factory() as db:
+            [pooled] = db.query(PooledThread).all()
+        assert created_threads(fake) == 1
+        contents = [m["content"][0]["text"]["value"] for m in fake.threads[pooled.thread_id]]
+        assert contents == [personal_greeting("Ava Smith")]
+
+@pytest.mark.asyncio
+async def test_new_conversations_take_threads_from_the_pool(session_factory):
+    pool = chat_service_module.thread_pool
+    hits = metrics.get("thread_pool.hits")
+    with FakeOpenAIServer(run_polls=1) as fake:
+        service = make_service(fake)
+        await service.engine.fill_thread_pool("u1")
+        with session_factory() as db:
+            pooled = db.query(PooledThread.thread_id).scalar()
+
+        service.prepare_conversation(1)
+        await settle("thread:1")
+        with session_factory() as db:
+            assert db.get(Conversation, 1).thread_id == pooled
+        assert metrics.get("thread_pool.hits") == hits + 1
+
+        # Taking the thread refills the pool in the background
+        await settle("thread_pool:u1")
+        assert pool.missing("u1") == 0
+        assert created_threads(fake) == 2
+
+        with session_factory() as db:
+            response = await service.get_streaming_response(1, pooled, "Ramen?", db=db)
+            events = [chunk async for chunk in response.body_iterator]
+        assert events[-1] == "data: [DONE]\n\n"
+        contents = [m["content"][0]["text"]["value"] for m in fake.threads[pooled]]
+        assert contents[:2] == [personal_greeting("Ava Smith"), "Ramen?"]
+        # The message rides along with the run instead of needing its own request
+        assert fake.calls("POST", f"/v1/threads/{pooled}/messages") == []
+        assert len(fake.calls("POST", f"/v1/threads/{pooled}/runs")) == 1
+
+@pytest.mark.asyncio
+async def test_pooled_thread_is_returned_when_the_run_fails(session_factory, monkeypatch):
+    with FakeOpenAIServer(run_polls=1) as fake:
+        service = make_service(fake)
+        await service.engine.fill_thread_pool("u1")
+        with session_factory() as db:
+            pooled = db.query(PooledThread.thread_id).scalar()
+
+        async def failing_run(thread_id, message):
+            raise RuntimeError("run failed")
+        monkeypatch.setattr(service.engine, "_start_run", failing_run)
+
+        with session_factory() as db:
+            with pytest.raises(RuntimeError):
+                await service.engine._start_new_thread_run(1, "Ramen?", db=db)
+        with session_factory() as db:
+            assert db.query(PooledThread.thread_id).scalar() == pooled
+            assert db.get(Conversation, 1).thread_id is None
+
+@pytest.mark.asyncio
+async def test_a_miss_creates_the_thread_inline(session_factory):
+    misses = metrics.get("thread_pool.misses")
+    with FakeOpenAIServer(run_polls=1) as fake:
+        service = make_service(fake)
+        with session_factory() as db:
+            response = await service.get_streaming_response(2, None, "Tacos?", db=db)
+            events = [chunk async for chunk in response.body_iterator]
+        assert events[-1] == "data: [DONE]\n\n"
+        assert metrics.get("thread_pool.misses") == misses + 1
+
+        with session_factory() as db:
+            thread_id = db.get(Conversation, 2).thread_id
+        contents = [m["content"][0]["text"]["value"] for m in fake.threads[thread_id]]
+        assert contents[:2] == [personal_greeting("Ava Smith"), "Tacos?"]
+        # Thread, greeting, message and run in one request
+        assert len(fake.calls("POST", "/v1/threads/runs")) == 1
+        assert fake.calls("POST", f"/v1/threads/{thread_id}/messages") == []
+        await settle("thread_pool:u1")
+
+@pytest.mark.asyncio
+async def test_expired_threads_are_deleted_upstream(session_factory):
+    with FakeOpenAIServer() as fake:
+        service = make_service(fake)
+        await service.engine.fill_thread_pool("u1")
+        with session_factory() as db:
+            old = db.query(PooledThread).one()
+            old.created_at = datetime.now(timezone.utc) - timedelta(days=30)
+            old_id = old.thread_id
+            db.commit()
+
+        assert chat_service_module.thread_pool.take("u1") is None
+        await service.engine.fill_thread_pool("u1")
+        assert fake.calls("DELETE", f"/v1/threads/{old_id}")
+        with session_factory() as db:
+            assert [p.thread_id for p in db.query(PooledThread)] != [old_id]
+            assert db.query(PooledThread).count() == 1
@@ -0,0 +1,64 @@
+"""
+Tests for batch Yelp lookups: one combined payload or an NDJSON stream,
+with per-business failures reported inline.
+"""
+
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import yelp
+from app.core.resilience import CircuitBreaker, RetryPolicy
+from app.services import yelp_client
+from app.tests.fake_yelp import FakeYelpServer
+
+@pytest.fixture
+def fake_yelp(monkeypatch):
+    with FakeYelpServer() as fake:
+        monkeypatch.setattr(yelp_client, "YELP_API_BASE_URL", fake.base_url)
+        monkeypatch.setattr(yelp_client, "yelp_breaker", CircuitBreaker("yelp", failure_threshold=3, reset_seconds=30))
+        monkeypatch.setattr(yelp_client, "yelp_retry", RetryPolicy(attempts=1))
+        monkeypatch.setattr(yelp_client, "YELP_HEDGE_ENABLED", False)
+        monkeypatch.setattr(yelp_client, "YELP_CACHE_TTL_SECONDS", 0)
+        yield fake
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(yelp.router, prefix="/api/yelp")
+    return TestClient(app)
+
+def test_batch_returns_details_and_reviews_in_order(fake_yelp, client):
+    response = client.post("/api/yelp/businesses/batch", json={"ids": ["biz-2", "biz-1", "biz-2"]})
+
+    assert response.status_code == 200
+    items = response.json()["businesses"]
+    assert [item["id"] for item in items] == ["biz-2", "biz-1"]
+    assert items[0]["details"]["id"] == "biz-2"
+    assert items[0]["reviews"]["total"] == 1
+    # Duplicate IDs are looked up once
+    assert len(fake_yelp.requests) == 4
+
+def test_batch_streams_ndjson_with_inline_errors(fake_yelp, client, monkeypatch):
+    monkeypatch.setattr(yelp, "YELP_BATCH_CONCURRENCY", 1)
+    fake_yelp.faults = [{"status": 404}]
+
+    response = client.post(
+        "/api/yelp/businesses/batch",
+        json={"ids": ["biz-1", "biz-2"], "reviews": False},
+        headers={"Accept": "application/x-ndjson"}
+    )
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    items = {item["id"]: item for item in map(json.loads, response.text.splitlines())}
+    assert items["biz-1"]["details"] is None
+    assert items["biz-1"]["errors"]["details"]["status"] == 404
+    assert items["biz-2"]["details"]["id"] == "biz-2"
+    assert "reviews" not in items["biz-2"]
+
+def test_batch_size_is_bounded(fake_yelp, client, monkeypatch):
+    monkeypatch.setattr(yelp, "YELP_BATCH_MAX_IDS", 2)
+    assert client.post("/api/yelp/businesses/batch", json={"ids": ["a", "b", "c"]}).status_code == 400
+    assert client.post("/api/yelp/businesses/batch", json={"ids": []}).status_code == 400
+    assert fake_yelp.requests == []
@@ -0,0 +1,140 @@
+"""
+Tests for stored Yelp result snapshots: capture after a reply, inline
+serving from get_conversation, and background refresh of stale snapshots.
+"""
+
+import json
+import pytest
+from datetime import datetime, timedelta, timezone
+from fastapi import BackgroundTasks, Request
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api import messages
+from app.core.database import Base
+from app.core.resilience import CircuitBreaker
+from app.core.responses import loads
+from app.models.database_models import User, Conversation, Message, YelpSnapshot
+from app.services import yelp_client
+from app.services.yelp_snapshots import YelpSnapshotService
+from app.tests.fake_yelp import FakeYelpServer
+
+SEARCH = {"term": "ramen", "location": "Austin, TX", "k": 3}
+
+@pytest.fixture
+def fake_yelp(monkeypatch):
+    with FakeYelpServer() as fake:
+        monkeypatch.setattr(yelp_client, "YELP_API_BASE_URL", fake.base_url)
+        monkeypatch.setattr(yelp_client, "yelp_breaker", CircuitBreaker("yelp"))
+        monkeypatch.setattr(yelp_client, "YELP_CACHE_TTL_SECONDS", 0)
+        yield fake
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        db.add(User(id="u1", email="ava@example.com", name="Test User"))
+        db.add(Conversation(id=1, title="Conversation 1", user_id="u1", is_new=False))
+        message = Message(id=10, conversation_id=1, sender="bot", content="Try these ramen spots")
+        message.save_restaurant_search(SEARCH)
+        db.add(message)
+        db.commit()
+    return factory
+
+@pytest.fixture
+def snapshots(session_factory, monkeypatch):
+    service = YelpSnapshotService(session_factory=session_factory, max_age_seconds=3600)
+    monkeypatch.setattr(messages, "yelp_snapshots", service)
+    return service
+
+async def load_conversation(session_factory):
+    background_tasks = BackgroundTasks()
+    with session_factory() as db:
+        user = db.get(User, "u1")
+        request = Request({"type": "http", "headers": []})
+        response = await messages.get_conversation(1, background_tasks, request, current_user=user, db=db)
+    return loads(response.body), background_tasks
+
+@pytest.mark.asyncio
+async def test_capture_stores_compact_snapshot(fake_yelp, snapshots, session_factory):
+    businesses = await snapshots.capture(10, SEARCH)
+    assert [b["id"] for b in businesses] == ["biz-0", "biz-1", "biz-2"]
+
+    with session_factory() as db:
+        stored = json.loads(db.query(YelpSnapshot).one().businesses)
+    assert stored == businesses
+    first = stored[0]
+    assert first["name"] == "Restaurant 0" and first["rating"] == 4.5
+    assert len(first["photos"]) == 3 and first["hours"] == [{"is_open_now": True}]
+    # Fields the cards don't use are not stored
+    assert "distance" not in first and "transactions" not in first
+
+@pytest.mark.asyncio
+async def test_conversation_serves_snapshot_inline(fake_yelp, snapshots, session_factory):
+    await snapshots.capture(10, SEARCH)
+    calls = len(fake_yelp.requests)
+
+    result, background_tasks = await load_conversation(session_factory)
+    snapshot = result["messages"][0]["restaurant_snapshot"]
+    assert [b["id"] for b in snapshot["businesses"]] == ["biz-0", "biz-1", "biz-2"]
+    assert snapshot["stale"] is False
+
+    # Fresh snapshot: nothing to refresh, no Yelp calls
+    await background_tasks()
+    assert len(fake_yelp.requests) == calls
+
+@pytest.mark.asyncio
+async def test_conversation_list_serves_snapshots(fake_yelp, snapshots, session_factory):
+    await snapshots.capture(10, SEARCH)
+
+    with session_factory() as db:
+        user = db.get(User, "u1")
+        request = Request({"type": "http", "headers": []})
+        response = await messages.get_conversations(request, current_user=user, db=db)
+    [conversation] = loads(response.body)
+    snapshot = conversation["messages"][0]["restaurant_snapshot"]
+    assert [b["id"] for b in snapshot["businesses"]] == ["biz-0", "biz-1", "biz-2"]
+
+@pytest.mark.asyncio
+async def test_stale_snapshot_is_refreshed_in_background(fake_yelp, snapshots, session_factory):
+    await snapshots.capture(10, SEARCH)
+    old = datetime.now(timezone.utc) - timedelta(days=2)
+    with session_factory() as db:
+        db.query(YelpSnapshot).update({YelpSnapshot.fetched_at: old})
+        db.commit()
+
+    result, background_tasks = await load_conversation(session_factory)
+    assert result["messages"][0]["restaurant_snapshot"]["stale"] is True
+
+    await background_tasks()
+    result, _ = await load_conversation(session_factory)
+    assert result["messages"][0]["restaurant_snapshot"]["stale"] is False
+
+@pytest.mark.asyncio
+async def test_failed_refresh_keeps_previous_snapshot(fake_yelp, snapshots, session_factory):
+    await snapshots.capture(10, SEARCH)
+    fake_yelp.faults = [{"status": 400}]
+
+    assert await snapshots.capture(10, SEARCH) is None
+    with session_factory() as db:
+        assert len(json.loads(db.query(YelpSnapshot).one().businesses)) == 3
+
+@pytest.mark.asyncio
+async def test_empty_first_capture_is_not_stored(fake_yelp, snapshots, session_factory):
+    # The search fails: nothing is stored, so the next open tries again
+    fake_yelp.faults = [{"status": 400}]
+    assert await snapshots.capture(10, SEARCH) is None
+    with session_factory() as db:
+        assert db.query(YelpSnapshot).count() == 0
+
+    assert len(await snapshots.capture(10, SEARCH)) == 3
+
+def test_empty_snapshot_is_stale(snapshots):
+    snapshot = YelpSnapshot(businesses="[]", fetched_at=datetime.now(timezone.utc))
+    assert snapshots.is_stale(snapshot)
+    message = Message(sender="bot", content="Here you go")
+    message.snapshot = snapshot
+    assert snapshots.needs_refresh(message, SEARCH)
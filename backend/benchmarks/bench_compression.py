@@ -0,0 +1,60 @@
+"""
+bench_compression.py
+
+Bytes on the wire for conversation payloads.
+Compares an uncompressed response with gzip (and brotli, if installed) and
+with a 304 revalidation of an unchanged conversation. The synthetic messages
+repeat a lot, so real histories compress less than shown here.
+
+Usage (from backend/):
+    python -m benchmarks.bench_compression
+
+"""
+
+import time
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.core.compression import CompressionMiddleware, available_encodings
+from app.core.responses import conditional_json
+from benchmarks.bench_responses import make_payload
+
+SIZES = [10, 100, 1000]
+REPEATS = 20
+
+def make_app(payload) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/conversation")
+    async def conversation(request: Request):
+        return conditional_json(request, payload)
+
+    return app
+
+def wire_bytes(client: TestClient, headers: dict):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        response = client.get("/conversation", headers=headers)
+    ms = (time.perf_counter() - start) / REPEATS * 1000
+    return response.num_bytes_downloaded, ms, response
+
+def main():
+    encodings = available_encodings()
+    columns = " | ".join(f"{name + ' KB':>11} | {name + ' ms':>11}" for name in ["identity"] + encodings)
+    print(f"{'messages':>9} | {columns} | {'304 B':>6}")
+    print("-" * (21 + 28 * (len(encodings) + 1)))
+    for size in SIZES:
+        client = TestClient(make_app(make_payload(size, fragments=True)))
+        cells = []
+        etag = None
+        for encoding in ["identity"] + encodings:
+            size_bytes, ms, response = wire_bytes(client, {"Accept-Encoding": encoding})
+            etag = etag or response.headers["etag"]
+            cells.append(f"{size_bytes / 1024:>11.1f} | {ms:>11.2f}")
+        not_modified, _, response = wire_bytes(client, {"Accept-Encoding": encodings[0], "If-None-Match": etag})
+        assert response.status_code == 304
+        print(f"{size:>9} | {' | '.join(cells)} | {not_modified:>6}")
+
+if __name__ == "__main__":
+    main()
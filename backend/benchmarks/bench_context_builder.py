@@ -0,0 +1,77 @@
+"""
+bench_context_builder.py
+
+Benchmark for prompt construction time as conversations grow.
+Compares the summarizing context builder with sending the full history.
+
+Usage (from backend/):
+    python -m benchmarks.bench_context_builder
+
+"""
+
+import asyncio
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.models.database_models import User, Conversation, Message, ConversationSummary
+from app.services.context_builder import ContextBuilder, to_chat_message
+from app.services.prompts import ASSISTANT_INSTRUCTIONS
+from app.services.tokens import count_message_tokens
+
+SIZES = [10, 100, 1000]
+REPEATS = 50
+
+def make_conversation(size: int):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(id="u1", email="bench@example.com", name="Bench User"))
+    db.add(Conversation(id=1, title="Conversation 1", user_id="u1", is_new=False))
+    for i in range(size):
+        sender = "user" if i % 2 == 0 else "bot"
+        db.add(Message(conversation_id=1, sender=sender, content=f"message {i} about tacos, ramen and pizza in Austin " * 5))
+    db.commit()
+    return db
+
+async def catch_up_summary(builder: ContextBuilder, db):
+    """Fold everything outside the window into the summary, as replies would over time"""
+    while True:
+        window = builder.build(db, 1, "next question", ASSISTANT_INSTRUCTIONS)
+        before = db.get(ConversationSummary, 1)
+        through = before.summarized_through_id if before else 0
+        if not window.needs_summary or window.oldest_kept_id is None:
+            return
+        await builder.update_summary(db, 1, window.oldest_kept_id)
+        if db.get(ConversationSummary, 1).summarized_through_id == through:
+            return
+
+def full_history_prompt(db):
+    rows = db.query(Message).filter(Message.conversation_id == 1).order_by(Message.id).all()
+    return [{"role": "system", "content": ASSISTANT_INSTRUCTIONS}] + [to_chat_message(r) for r in rows]
+
+def timed(fn, repeats: int = REPEATS):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = fn()
+    return (time.perf_counter() - start) / repeats * 1000, result
+
+def main():
+    print(f"{'messages':>9} | {'builder ms':>10} | {'builder tokens':>14} | {'full ms':>8} | {'full tokens':>11}")
+    print("-" * 65)
+    for size in SIZES:
+        db = make_conversation(size)
+        builder = ContextBuilder()
+        asyncio.run(catch_up_summary(builder, db))
+
+        builder_ms, window = timed(lambda: builder.build(db, 1, "next question", ASSISTANT_INSTRUCTIONS))
+        full_ms, full = timed(lambda: full_history_prompt(db))
+        full_tokens = sum(count_message_tokens(m) for m in full)
+
+        print(f"{size:>9} | {builder_ms:>10.2f} | {window.token_count:>14} | {full_ms:>8.2f} | {full_tokens:>11}")
+        db.close()
+
+if __name__ == "__main__":
+    main()
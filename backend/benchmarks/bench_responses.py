@@ -0,0 +1,81 @@
+"""
+bench_responses.py
+
+Microbenchmark for serializing conversation payloads.
+Compares FastAPI's default path (jsonable_encoder + JSONResponse) with
+FastJSONResponse, with and without stored snapshots as fragments, and with
+the stdlib fallback encoder.
+
+Usage (from backend/):
+    python -m benchmarks.bench_responses
+
+"""
+
+import json
+import time
+from datetime import datetime, timedelta
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.core import responses
+from app.core.responses import FastJSONResponse, Fragment
+from app.tests.fake_yelp import make_business
+
+SIZES = [10, 100, 1000]
+REPEATS = 50
+
+def make_payload(size: int, fragments: bool):
+    started = datetime(2024, 5, 1, 12, 0)
+    snapshot = json.dumps([make_business(i) for i in range(5)], separators=(",", ":"))
+    messages = []
+    for i in range(size):
+        bot = i % 2 == 1
+        messages.append({
+            "id": i,
+            "content": f"message {i} about tacos, ramen and pizza in Austin " * 5,
+            "sender": "bot" if bot else "user",
+            "timestamp": started + timedelta(seconds=i),
+            "is_edited": False,
+            "conversation_id": 1,
+            "restaurant_search": {"term": "ramen", "location": "Austin, TX", "k": 5} if bot else None,
+            "restaurant_snapshot": {
+                "businesses": Fragment(snapshot) if fragments else json.loads(snapshot),
+                "fetched_at": started.isoformat(),
+                "stale": False,
+            } if bot else None,
+        })
+    return {
+        "id": 1, "title": "Conversation 1", "created_at": started, "updated_at": started,
+        "is_active": True, "is_new": False, "user_id": "u1", "messages": messages,
+    }
+
+def timed(fn, repeats: int = REPEATS):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        body = fn()
+    return (time.perf_counter() - start) / repeats * 1000, len(body)
+
+def main():
+    print(f"{'messages':>9} | {'default ms':>10} | {'fast ms':>8} | {'fragments ms':>12} | {'stdlib ms':>9} | {'speedup':>7} | {'KB':>7}")
+    print("-" * 82)
+    orjson = responses.orjson
+    for size in SIZES:
+        plain = make_payload(size, fragments=False)
+        spliced = make_payload(size, fragments=True)
+
+        default_ms, size_bytes = timed(lambda: JSONResponse(jsonable_encoder(plain)).body)
+        fast_ms, _ = timed(lambda: FastJSONResponse(plain).body)
+        fragments_ms, _ = timed(lambda: FastJSONResponse(spliced).body)
+        responses.orjson = None
+        try:
+            stdlib_ms, _ = timed(lambda: FastJSONResponse(spliced).body)
+        finally:
+            responses.orjson = orjson
+
+        print(
+            f"{size:>9} | {default_ms:>10.2f} | {fast_ms:>8.2f} | {fragments_ms:>12.2f} | {stdlib_ms:>9.2f}"
+            f" | {default_ms / fragments_ms:>6.1f}x | {size_bytes / 1024:>7.1f}"
+        )
+
+if __name__ == "__main__":
+    main()
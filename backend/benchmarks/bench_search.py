@@ -0,0 +1,75 @@
+"""
+bench_search.py
+
+Benchmark for full-text search latency as a user's history grows.
+Compares the FTS5 index with a LIKE scan over message content.
+
+Usage (from backend/):
+    python -m benchmarks.bench_search
+
+"""
+
+import random
+import time
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.models.database_models import User, Conversation, Message
+from app.services.search import install_search_index, search_messages
+
+SIZES = [1_000, 10_000, 100_000]
+REPEATS = 20
+WORDS = "tacos ramen pizza sushi burgers pho curry dumplings bbq brunch vegan coffee bakery steak".split()
+CITIES = ["Austin", "Atlanta", "Boston", "Denver", "Seattle", "Chicago"]
+
+def make_history(size: int):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    install_search_index(engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(id="u1", email="bench@example.com", name="Bench User"))
+    for c in range(size // 100):
+        db.add(Conversation(id=c + 1, title=f"Conversation {c + 1}", user_id="u1", is_new=False))
+    rng = random.Random(1)
+    db.add_all([
+        Message(
+            conversation_id=i // 100 + 1,
+            sender="user" if i % 2 == 0 else "bot",
+            content=f"Where can I get {rng.choice(WORDS)} and {rng.choice(WORDS)} in {rng.choice(CITIES)}? " * 3
+            + f"Maybe Kitchen{rng.randrange(size)} again."
+        )
+        for i in range(size)
+    ])
+    db.commit()
+    return db
+
+def timed(fn, repeats: int = REPEATS):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = fn()
+    return (time.perf_counter() - start) / repeats * 1000, result
+
+def like_scan(db, term: str):
+    # Total matches are needed for pagination, so the scan cannot stop early
+    return db.execute(
+        text("SELECT count(*) FROM messages m JOIN conversations c ON c.id = m.conversation_id "
+             "WHERE c.user_id = 'u1' AND m.content LIKE :pattern"),
+        {"pattern": f"%{term}%"}
+    ).scalar()
+
+def main():
+    print(f"{'messages':>9} | {'query':>16} | {'fts ms':>7} | {'matches':>8} | {'like ms':>8}")
+    print("-" * 61)
+    for size in SIZES:
+        db = make_history(size)
+        # A common pair of words and a rare restaurant name
+        for query, pattern in (("ramen seattle", "ramen%seattle"), ("kitchen42", "kitchen42 ")):
+            fts_ms, result = timed(lambda: search_messages(db, "u1", query, limit=20))
+            like_ms, _ = timed(lambda: like_scan(db, pattern))
+            print(f"{size:>9} | {query:>16} | {fts_ms:>7.2f} | {result['total']:>8} | {like_ms:>8.2f}")
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+load_test.py
+
+End-to-end load test of the API over real HTTP.
+Starts the app under uvicorn against local fakes for OpenAI, Yelp and
+Google's certificate endpoint, then has simulated users sign in, load the
+sidebar, start a conversation, stream a reply, reopen the conversation and
+fetch a restaurant card and its image. Reports p50/p95/p99 latency, requests
+per second and database queries per request for each step, and saves the
+results as JSON so runs can be compared.
+
+Usage (from backend/):
+    python -m benchmarks.load_test --users 20 --iterations 5 --output before.json
+    python -m benchmarks.load_test --users 20 --iterations 5 --compare before.json
+
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+import httpx
+
+from app.core.query_profiler import track_queries
+from app.tests.fake_google import FakeGoogleCertsServer
+from app.tests.fake_openai import FakeOpenAIServer
+from app.tests.fake_yelp import FakeYelpServer
+
+CLIENT_ID = "bench-client.apps.googleusercontent.com"
+STEPS = ["login", "sidebar", "new_conversation", "stream_reply", "open_conversation", "card", "image"]
+
+class StepQueryCounter:
+    """ASGI middleware adding each request's query count to its step (X-Bench-Step header)"""
+
+    def __init__(self, app, totals):
+        self.app = app
+        self.totals = totals
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        step = dict(scope["headers"]).get(b"x-bench-step", b"").decode() or None
+        with track_queries() as stats:
+            await self.app(scope, receive, send)
+        if step:
+            self.totals[step] += stats.count
+
+def configure_environment(workdir: str, openai, yelp, google):
+    """Point the app at the fakes; must run before the app is imported"""
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": openai.base_url,
+        "OPENAI_ASSISTANT_ID": "asst_bench",
+        "YELP_API_KEY": "bench",
+        "YELP_API_BASE_URL": yelp.base_url,
+        "GOOGLE_CLIENT_ID": CLIENT_ID,
+        "GOOGLE_CERTS_URL": google.certs_url,
+        "RETENTION_DAYS": "0",
+        "RETENTION_ARCHIVE_DIR": os.path.join(workdir, "archive"),
+    })
+
+def start_server(app):
+    import uvicorn
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("Server failed to start")
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.first_byte = []
+        self.errors = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, step: str, method: str, url: str, **kwargs):
+        headers = {**kwargs.pop("headers", {}), "X-Bench-Step": step}
+        start = time.perf_counter()
+        response = await client.request(method, url, headers=headers, **kwargs)
+        self.samples[step].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[step] += 1
+        return response
+
+    async def stream(self, client: httpx.AsyncClient, step: str, url: str, **kwargs):
+        headers = {**kwargs.pop("headers", {}), "X-Bench-Step": step}
+        start = time.perf_counter()
+        first = None
+        async with client.stream("POST", url, headers=headers, **kwargs) as response:
+            async for _ in response.aiter_bytes():
+                if first is None:
+                    first = time.perf_counter() - start
+        self.samples[step].append(time.perf_counter() - start)
+        if first is not None:
+            self.first_byte.append(first)
+        if response.status_code >= 400:
+            self.errors[step] += 1
+
+async def simulate_user(client: httpx.AsyncClient, recorder: Recorder, google, yelp, n: int, iterations: int):
+    token = google.make_token(CLIENT_ID, f"bench-{n}", f"user{n}@example.com", f"Bench User {n}")
+    auth = {"Authorization": f"Bearer {token}"}
+    await recorder.request(client, "login", "POST", "/api/auth/google-login", json={"token": token})
+
+    for i in range(iterations):
+        await recorder.request(client, "sidebar", "GET", "/api/messages/conversations", headers=auth)
+        created = await recorder.request(client, "new_conversation", "POST", "/api/messages/new-conversation", headers=auth)
+        if created.status_code != 200:
+            continue
+        conversation_id = created.json()["id"]
+        await recorder.stream(
+            client, "stream_reply", "/api/messages/stream", headers=auth,
+            json={"content": f"Ramen near Austin for user {n}, round {i}?", "conversation_id": conversation_id}
+        )
+        await recorder.request(client, "open_conversation", "GET", f"/api/messages/conversations/{conversation_id}", headers=auth)
+        await recorder.request(client, "card", "GET", f"/api/yelp/businesses/biz-{i}", headers=auth)
+        image_url = yelp.base_url.replace("/v3", f"/images/biz-{i}.jpg")
+        await recorder.request(client, "image", "GET", f"/api/yelp/images/{quote(image_url, safe='')}", headers=auth)
+
+async def run_load(base_url: str, google, yelp, users: int, iterations: int):
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(simulate_user(client, recorder, google, yelp, n, iterations) for n in range(users)))
+        elapsed = time.perf_counter() - start
+    return recorder, elapsed
+
+def percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+def latency_summary(samples) -> dict:
+    return {f"p{int(q * 100)}_ms": round(percentile(samples, q) * 1000, 2) for q in (0.5, 0.95, 0.99)}
+
+def summarize(recorder: Recorder, query_totals: dict, elapsed: float) -> dict:
+    endpoints = {}
+    for step in STEPS:
+        samples = recorder.samples.get(step)
+        if not samples:
+            continue
+        endpoints[step] = {
+            "requests": len(samples),
+            "errors": recorder.errors[step],
+            **latency_summary(samples),
+            "rps": round(len(samples) / elapsed, 2),
+            "queries_per_request": round(query_totals[step] / len(samples), 2),
+        }
+    if recorder.first_byte and "stream_reply" in endpoints:
+        endpoints["stream_reply"]["first_byte"] = latency_summary(recorder.first_byte)
+
+    all_samples = [s for samples in recorder.samples.values() for s in samples]
+    total = {
+        "requests": len(all_samples),
+        "errors": sum(recorder.errors.values()),
+        **latency_summary(all_samples),
+        "rps": round(len(all_samples) / elapsed, 2),
+        "queries": sum(query_totals.values()),
+    }
+    return {"duration_seconds": round(elapsed, 3), "endpoints": endpoints, "total": total}
+
+def print_report(results: dict, previous: dict = None):
+    print(f"{'step':>18} | {'reqs':>5} | {'errs':>4} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8} | {'rps':>7} | {'queries':>7}")
+    print("-" * 90)
+    rows = list(results["endpoints"].items()) + [("total", results["total"])]
+    for step, row in rows:
+        queries = row.get("queries_per_request", row.get("queries"))
+        line = (f"{step:>18} | {row['requests']:>5} | {row['errors']:>4} | {row['p50_ms']:>8.2f} | "
+                f"{row['p95_ms']:>8.2f} | {row['p99_ms']:>8.2f} | {row['rps']:>7.2f} | {queries:>7}")
+        if previous:
+            before = previous["endpoints"].get(step) if step != "total" else previous.get("total")
+            if before and before["p95_ms"]:
+                change = (row["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+                line += f" | p95 {change:+.1f}%"
+        print(line)
+    first_byte = results["endpoints"].get("stream_reply", {}).get("first_byte")
+    if first_byte:
+        print(f"\nstream_reply first byte: p50 {first_byte['p50_ms']} ms, p95 {first_byte['p95_ms']} ms, p99 {first_byte['p99_ms']} ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the backend against local fake upstreams")
+    parser.add_argument("--users", type=int, default=10, help="concurrent simulated users")
+    parser.add_argument("--iterations", type=int, default=3, help="conversations each user goes through")
+    parser.add_argument("--run-polls", type=int, default=2, help="polls before a fake OpenAI run completes")
+    parser.add_argument("--output", default="load_test_results.json", help="where to save the results")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    with ExitStack() as stack:
+        workdir = stack.enter_context(tempfile.TemporaryDirectory())
+        openai = stack.enter_context(FakeOpenAIServer(run_polls=args.run_polls))
+        yelp = stack.enter_context(FakeYelpServer())
+        google = stack.enter_context(FakeGoogleCertsServer())
+        configure_environment(workdir, openai, yelp, google)
+
+        from app.main import app
+
+        query_totals = defaultdict(int)
+        app.add_middleware(StepQueryCounter, totals=query_totals)
+        server, thread, base_url = start_server(app)
+        try:
+            recorder, elapsed = asyncio.run(run_load(base_url, google, yelp, args.users, args.iterations))
+        finally:
+            server.should_exit = True
+            thread.join(timeout=30)
+
+    results = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "config": {"users": args.users, "iterations": args.iterations, "run_polls": args.run_polls},
+        "python": sys.version.split()[0],
+        **summarize(recorder, query_totals, elapsed),
+    }
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_report(results, previous)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved results to {args.output}")
+
+if __name__ == "__main__":
+    main()
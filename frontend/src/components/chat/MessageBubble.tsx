@@ -15,7 +15,7 @@
 
 import React, { useState } from 'react';
 import Markdown from 'react-markdown';
-import type { YelpSearchParams } from '../../services/yelp';
+import type { YelpSearchParams, YelpSnapshot } from '../../services/yelp';
 import RestaurantMessageContent from './RestaurantMessageContent';
 
 interface MessageBubbleProps {
@@ -27,6 +27,7 @@ interface MessageBubbleProps {
   onDelete?: () => void;
   isFullscreen?: boolean;
   restaurant_search?: YelpSearchParams & { k?: number };
+  restaurant_snapshot?: YelpSnapshot | null;
 }
 
 export const MessageBubble = ({
@@ -37,7 +38,8 @@ export const MessageBubble = ({
   onEdit,
   onDelete,
   isFullscreen,
-  restaurant_search
+  restaurant_search,
+  restaurant_snapshot
 }: MessageBubbleProps) => {
   const [isEditing, setIsEditing] = useState(false);
   const [editContent, setEditContent] = useState(content);
@@ -132,6 +134,7 @@ export const MessageBubble = ({
                   <div className="mt-3">
                     <RestaurantMessageContent 
                       searchParams={restaurant_search}
+                      snapshot={restaurant_snapshot?.businesses}
                       isFullscreen={isFullscreen}
                       key={JSON.stringify(restaurant_search)}
                     />
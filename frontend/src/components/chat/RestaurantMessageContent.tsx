@@ -11,6 +11,8 @@
  * - Error handling for API failures
  * - Responsive layout for different screen sizes
  * - Integration with Yelp business data
+ * - Stored snapshots from the backend skip the Yelp requests
+ * - Details for all cards fetched in one batch request
  */
 
 import { useEffect, useState, useRef } from 'react';
@@ -20,11 +22,13 @@ import RestaurantList from '../restaurant/RestaurantList';
 
 interface RestaurantMessageContentProps {
   searchParams: YelpSearchParams;
+  snapshot?: YelpBusiness[];
   isFullscreen?: boolean;
 }
 
 const RestaurantMessageContent = ({ 
   searchParams,
+  snapshot,
   isFullscreen
 }: RestaurantMessageContentProps) => {
   const [businesses, setBusinesses] = useState<YelpBusiness[]>([]);
@@ -42,6 +46,12 @@ const RestaurantMessageContent = ({
         return;
       }
 
+      if (snapshot?.length) {
+        setBusinesses(snapshot);
+        setIsLoading(false);
+        return;
+      }
+
       try {
         fetchingRef.current = true;
         setIsLoading(true);
@@ -62,20 +72,25 @@ const RestaurantMessageContent = ({
           throw new Error('Invalid response from Yelp API');
         }
 
-        const businessesWithDetails = await Promise.all(
-          searchResponse.businesses.map(async (business) => {
-            try {
-              const details = await yelpService.getBusinessDetails(business.id);
-              return {
-                ...business,
-                photos: details.photos?.slice(0, 3) || [business.image_url],
-                hours: details.hours
-              };
-            } catch (error) {
-              return business;
-            }
-          })
-        );
+        let detailsById = new Map<string, YelpBusiness>();
+        try {
+          const batch = await yelpService.getBusinessesBatch(searchResponse.businesses.map((business) => business.id));
+          detailsById = new Map(
+            batch.filter((item) => item.details).map((item) => [item.id, item.details as YelpBusiness])
+          );
+        } catch (error) {
+          // Cards still render from the search results alone
+        }
+
+        const businessesWithDetails = searchResponse.businesses.map((business) => {
+          const details = detailsById.get(business.id);
+          if (!details) return business;
+          return {
+            ...business,
+            photos: details.photos?.slice(0, 3) || [business.image_url],
+            hours: details.hours
+          };
+        });
         
         sessionStorage.setItem(cacheKey, JSON.stringify(businessesWithDetails));
         setBusinesses(businessesWithDetails);
@@ -95,7 +110,7 @@ const RestaurantMessageContent = ({
     return () => {
       fetchingRef.current = false;
     };
-  }, [searchParams]);
+  }, [searchParams, snapshot]);
 
   return (
     <div className="w-full">
@@ -10,6 +10,7 @@
  * - Real-time message streaming with OpenAI
  * - Restaurant search result handling
  * - Authentication state integration
+ * - Live sidebar updates from the conversation event channel
  * 
  * State Management:
  * - Current conversation tracking
@@ -20,7 +21,7 @@
 
 import { useState, useEffect } from 'react';
 import { useAuth } from '../../context/AuthContext';
-import { YelpSearchParams } from '../../services/yelp';
+import { YelpSearchParams, YelpSnapshot } from '../../services/yelp';
 
 export interface Message {
     id: number;
@@ -30,6 +31,7 @@ export interface Message {
     isEdited: boolean;
     conversation_id?: number;
     restaurant_search?: YelpSearchParams & { k?: number };
+    restaurant_snapshot?: YelpSnapshot | null;
 }
 
 export interface Conversation {
@@ -89,6 +91,18 @@ export function useChatState() {
     };
   };
 
+  // The full conversation, including archived messages and Yelp snapshots the list may not carry
+  const fetchConversation = async (id: number): Promise<Conversation> => {
+    const response = await fetch(`http://localhost:8000/api/messages/conversations/${id}`, {
+      headers: getAuthHeaders()
+    });
+    if (!response.ok) throw new Error('Failed to load conversation');
+
+    const rawConversation: RawConversation = await response.json();
+    console.log('Loaded conversation data:', rawConversation);
+    return processConversation(rawConversation);
+  };
+
   const getCanCreateNewChat = (currentMessages: Message[], conversations: Conversation[]): boolean => {
     // Check for any existing new conversation first
     const hasNewConversation = conversations.some(conv => conv.is_new);
@@ -113,15 +127,7 @@ export function useChatState() {
         headers: getAuthHeaders()
       });
 
-      const response = await fetch(`http://localhost:8000/api/messages/conversations/${id}`, {
-        headers: getAuthHeaders()
-      });
-      if (!response.ok) throw new Error('Failed to load conversation');
-      
-      const rawConversation: RawConversation = await response.json();
-      console.log('Loaded conversation data:', rawConversation);
-      
-      const processedConversation = processConversation(rawConversation);
+      const processedConversation = await fetchConversation(id);
       console.log('Processed conversation:', processedConversation);
       
       setCurrentConversationId(id);
@@ -226,9 +232,11 @@ export function useChatState() {
         const activeConversation = processedConversations.find(c => c.is_active);
         if (activeConversation) {
           console.log('Setting active conversation:', activeConversation);
+          // Loaded on its own: the list leaves out messages that were moved to the archive
+          const loadedConversation = await fetchConversation(activeConversation.id);
           setCurrentConversationId(activeConversation.id);
-          console.log('Setting messages:', activeConversation.messages);
-          setMessages(activeConversation.messages || []);
+          console.log('Setting messages:', loadedConversation.messages);
+          setMessages(loadedConversation.messages || []);
         } else if (processedConversations.length > 0) {
           await handleSelectConversation(processedConversations[0].id);
         } else {
@@ -249,6 +257,73 @@ export function useChatState() {
     loadInitialData();
   }, [isAuthenticated]);
 
+  // Conversation deltas pushed by the server (other tabs and devices included)
+  const applyConversationEvent = (event: string, data: Partial<Conversation> & { id: number }) => {
+    setArchivedConversations(prev => {
+      switch (event) {
+        case 'created':
+          if (prev.some(conv => conv.id === data.id)) return prev;
+          return [
+            { messages: [], ...data } as Conversation,
+            ...prev.map(conv => (data.is_active ? { ...conv, is_active: false } : conv))
+          ];
+        case 'updated':
+          return prev.map(conv => (conv.id === data.id ? { ...conv, ...data } : conv));
+        case 'activated':
+          return prev.map(conv => ({ ...conv, is_active: conv.id === data.id }));
+        case 'deleted':
+          return prev.filter(conv => conv.id !== data.id);
+        default:
+          return prev;
+      }
+    });
+  };
+
+  useEffect(() => {
+    if (!isAuthenticated) return;
+    const controller = new AbortController();
+
+    const listen = async () => {
+      while (!controller.signal.aborted) {
+        try {
+          const response = await fetch('http://localhost:8000/api/messages/events', {
+            headers: getAuthHeaders(),
+            signal: controller.signal
+          });
+          if (!response.ok || !response.body) throw new Error('Failed to open conversation events');
+
+          const reader = response.body.getReader();
+          const decoder = new TextDecoder();
+          let buffer = '';
+          while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const events = buffer.split('\n\n');
+            buffer = events.pop() || '';
+            for (const raw of events) {
+              let name = 'message';
+              let data = '';
+              for (const line of raw.split('\n')) {
+                if (line.startsWith('event: ')) name = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+              }
+              if (data && name !== 'ready') applyConversationEvent(name, JSON.parse(data));
+            }
+          }
+        } catch (err) {
+          if (controller.signal.aborted) return;
+          console.error('Conversation events error:', err);
+        }
+        // Reconnect after the server's retry delay
+        await new Promise(resolve => setTimeout(resolve, 3000));
+      }
+    };
+
+    listen();
+    return () => controller.abort();
+  }, [isAuthenticated]);
+
   const handleSendMessage = async (content: string) => {
     if (!currentConversationId) {
       setError('No active conversation');
@@ -49,6 +49,21 @@ interface YelpSearchParams {
     total: number;
     businesses: YelpBusiness[];
   }
+
+  // One business from a batch lookup; a part that failed is null, with the reason in errors
+  interface YelpBatchItem {
+    id: string;
+    details: YelpBusiness | null;
+    reviews?: { reviews: Array<{ id: string; rating: number; text: string }>; total: number } | null;
+    errors?: Record<string, { status: number; detail: string }>;
+  }
+
+  // Businesses stored with a bot message by the backend
+  interface YelpSnapshot {
+    businesses: YelpBusiness[];
+    fetched_at: string;
+    stale: boolean;
+  }
   
   class YelpService {
     private baseUrl = 'http://localhost:8000/api/yelp';
@@ -126,6 +141,35 @@ interface YelpSearchParams {
       }
     }
   
+    async getBusinessesBatch(businessIds: string[], reviews = false): Promise<YelpBatchItem[]> {
+      console.log('Fetching details for businesses:', businessIds);
+      const url = `${this.baseUrl}/businesses/batch`;
+
+      try {
+        const response = await fetch(url, {
+          method: 'POST',
+          headers: {
+            'Accept': 'application/json',
+            'Content-Type': 'application/json',
+          },
+          body: JSON.stringify({ ids: businessIds, reviews }),
+        });
+
+        if (!response.ok) {
+          const errorText = await response.text();
+          console.error('Yelp API error response:', errorText);
+          throw new Error(`Yelp API error: ${response.status} ${response.statusText}`);
+        }
+
+        const data = await response.json();
+        console.log('Business batch response:', data);
+        return data.businesses;
+      } catch (error) {
+        console.error('Error in getBusinessesBatch:', error);
+        throw error;
+      }
+    }
+  
     getStarImage(rating: number): string {
       // Round to nearest half
       const roundedRating = Math.round(rating * 2) / 2;
@@ -163,5 +207,5 @@ interface YelpSearchParams {
     }
   }
   
-  export type { YelpBusiness, YelpSearchParams, YelpBusinessHours, YelpSearchResponse };
+  export type { YelpBusiness, YelpSearchParams, YelpBusinessHours, YelpSearchResponse, YelpSnapshot, YelpBatchItem };
   export const yelpService = new YelpService();
\ No newline at end of file